@@ -0,0 +1,187 @@
+import os
+from pathlib import Path
+from typing import Any
+
+from app.db import connect
+from app.jobs import job_target_bytes
+from app.utils import ensure_dir, link_or_copy, utcnow
+
+
+def get_cached_output(
+    sqlite_path: str, content_hash: str, profile: str
+) -> dict[str, Any] | None:
+    now = utcnow()
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            """
+            UPDATE output_cache
+            SET last_used_at = ?
+            WHERE content_hash = ? AND profile = ?
+            RETURNING *
+            """,
+            (now, content_hash, profile),
+        ).fetchone()
+        if not row:
+            return None
+        return dict(row)
+
+
+def put_cached_output(
+    sqlite_path: str,
+    *,
+    content_hash: str,
+    profile: str,
+    output_path: str,
+    output_bytes: int,
+    duration_seconds: int,
+) -> None:
+    now = utcnow()
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            """
+            INSERT INTO output_cache (
+                content_hash, profile, output_path, output_bytes,
+                duration_seconds, created_at, last_used_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(content_hash, profile) DO UPDATE SET
+                output_path = excluded.output_path,
+                output_bytes = excluded.output_bytes,
+                duration_seconds = excluded.duration_seconds,
+                last_used_at = excluded.last_used_at
+            """,
+            (
+                content_hash,
+                profile,
+                output_path,
+                output_bytes,
+                duration_seconds,
+                now,
+                now,
+            ),
+        )
+
+
+def delete_cached_output(sqlite_path: str, content_hash: str, profile: str) -> None:
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            "DELETE FROM output_cache WHERE content_hash = ? AND profile = ?",
+            (content_hash, profile),
+        )
+
+
+def evict_cached_outputs(sqlite_path: str, max_bytes: int) -> list[str]:
+    removed = []
+    with connect(sqlite_path) as conn:
+        total = conn.execute(
+            "SELECT COALESCE(SUM(output_bytes), 0) AS total FROM output_cache"
+        ).fetchone()["total"]
+        if total <= max_bytes:
+            return removed
+        rows = conn.execute(
+            """
+            SELECT content_hash, profile, output_path, output_bytes
+            FROM output_cache
+            ORDER BY last_used_at
+            """
+        ).fetchall()
+        for row in rows:
+            if total <= max_bytes:
+                break
+            conn.execute(
+                "DELETE FROM output_cache WHERE content_hash = ? AND profile = ?",
+                (row["content_hash"], row["profile"]),
+            )
+            total -= row["output_bytes"]
+            removed.append(row["output_path"])
+
+    for path in removed:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    return removed
+
+
+def _cache_profile(job: dict[str, Any], settings) -> str:
+    profile = job.get("profile", "balanced")
+    target_bytes = job_target_bytes(job, settings)
+    return f"{profile}-{target_bytes}" if target_bytes else profile
+
+
+def restore_job_output(
+    job: dict[str, Any], settings, output_path: str
+) -> dict[str, Any] | None:
+    content_hash = job.get("input_sha256")
+    if not content_hash or settings.cache_max_mb <= 0:
+        return None
+    profile = _cache_profile(job, settings)
+    cached = get_cached_output(settings.sqlite_path, content_hash, profile)
+    if not cached:
+        return None
+    try:
+        link_or_copy(cached["output_path"], output_path)
+    except OSError:
+        delete_cached_output(settings.sqlite_path, content_hash, profile)
+        return None
+    return cached
+
+
+def store_job_output(
+    job: dict[str, Any], settings, output_path: str, output_bytes: int, duration: int
+) -> None:
+    content_hash = job.get("input_sha256")
+    if not content_hash or settings.cache_max_mb <= 0:
+        return
+    profile = _cache_profile(job, settings)
+    cache_dir = Path(settings.storage_path) / "cache"
+    ensure_dir(cache_dir)
+    cache_path = str(cache_dir / f"{content_hash}-{profile}.mp4")
+    link_or_copy(output_path, cache_path)
+    put_cached_output(
+        settings.sqlite_path,
+        content_hash=content_hash,
+        profile=profile,
+        output_path=cache_path,
+        output_bytes=output_bytes,
+        duration_seconds=duration,
+    )
+    evict_cached_outputs(settings.sqlite_path, settings.cache_max_mb * 1024 * 1024)
+
+
+def _profile_job(job: dict[str, Any], profile: str) -> dict[str, Any]:
+    return {**job, "profile": profile, "profiles": None, "target_bytes": None}
+
+
+def restore_job_outputs(
+    job: dict[str, Any], settings, outputs: dict[str, str]
+) -> int | None:
+    if len(outputs) == 1:
+        cached = restore_job_output(job, settings, next(iter(outputs.values())))
+        return cached["duration_seconds"] if cached else None
+    # A ladder is served from the cache only when every profile is cached;
+    # otherwise the single-decode encode is cheaper than mixing.
+    restored = []
+    for profile, output_path in outputs.items():
+        if not restore_job_output(_profile_job(job, profile), settings, output_path):
+            for path in restored:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            return None
+        restored.append(output_path)
+    return job["duration_seconds"]
+
+
+def store_job_outputs(
+    job: dict[str, Any], settings, outputs: list[dict[str, Any]], duration: int
+) -> None:
+    for output in outputs:
+        store_job_output(
+            job if len(outputs) == 1 else _profile_job(job, output["profile"]),
+            settings,
+            output["output_path"],
+            output["output_bytes"],
+            duration,
+        )
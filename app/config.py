@@ -9,6 +9,23 @@ def _get_int(name: str, default: int) -> int:
     return int(value)
 
 
+def _get_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _get_int_list(name: str, default: str) -> tuple[int, ...]:
+    value = _get_str(name, default)
+    return tuple(int(item) for item in value.split(",") if item.strip())
+
+
+def _get_list(name: str, default: str) -> tuple[str, ...]:
+    value = _get_str(name, default)
+    return tuple(item.strip() for item in value.split(",") if item.strip())
+
+
 def _get_str(name: str, default: str) -> str:
     value = os.getenv(name)
     if value is None or value == "":
@@ -23,35 +40,124 @@ class Settings:
     telegram_api_base_url: str | None
     telegram_file_base_url: str | None
     telegram_webhook_secret: str | None
+    telegram_local_mode: bool
+    telegram_local_ingest: str
+    telegram_local_max_mb: int
     base_url: str
+    download_accel_prefix: str
     sqlite_path: str
     storage_path: str
+    progress_path: str
+    doorbell_path: str
     max_upload_mb: int
+    upload_chunk_mb: int
+    upload_session_ttl_seconds: int
+    delete_inputs_on_completion: bool
+    output_ttl_hours: int
+    web_job_abandon_minutes: int
+    min_free_disk_mb: int
+    early_probe_mb: int
     max_duration_seconds: int
     max_telegram_send_mb: int
+    delivery_concurrency: int
+    delivery_max_attempts: int
+    delivery_backoff_seconds: int
+    delivery_poll_seconds: int
     rate_limit_per_min: int
+    rate_limit_backend: str
+    rate_limit_sqlite_path: str
     web_host: str
     web_port: int
     bot_listen_host: str
     bot_listen_port: int
+    bot_concurrent_updates: int
+    bot_fast_lane_concurrency: int
+    bot_max_downloads: int
+    scheduler_policy: str
+    scheduler_max_delay_seconds: int
+    queue_wait_slo_seconds: int
+    encoder_presets: tuple[str, ...]
+    preset_queue_depths: tuple[int, ...]
+    preset_wait_seconds: tuple[int, ...]
+    worker_slots: int
+    worker_cpu_budget: int
+    worker_cpu_affinity: bool
+    worker_shutdown_grace_seconds: int
+    worker_poll_max_seconds: int
+    job_lease_seconds: int
+    job_max_attempts: int
+    worker_api_token: str | None
+    worker_api_url: str | None
+    worker_metrics_host: str
+    worker_metrics_port: int
+    chunk_min_duration_seconds: int
+    chunk_target_seconds: int
+    chunk_parallelism: int
+    chunk_retries: int
+    cache_max_mb: int
 
 
 def load_settings() -> Settings:
+    storage_path = _get_str("STORAGE_PATH", "storage")
     return Settings(
         telegram_bot_token=os.getenv("TELEGRAM_BOT_TOKEN"),
         telegram_webhook_url=os.getenv("TELEGRAM_WEBHOOK_URL"),
         telegram_api_base_url=os.getenv("TELEGRAM_API_BASE_URL"),
         telegram_file_base_url=os.getenv("TELEGRAM_FILE_BASE_URL"),
         telegram_webhook_secret=os.getenv("TELEGRAM_WEBHOOK_SECRET"),
+        telegram_local_mode=_get_bool("TELEGRAM_LOCAL_MODE", False),
+        telegram_local_ingest=_get_str("TELEGRAM_LOCAL_INGEST", "link"),
+        telegram_local_max_mb=_get_int("TELEGRAM_LOCAL_MAX_MB", 2000),
         base_url=_get_str("BASE_URL", "http://localhost:8000"),
+        download_accel_prefix=_get_str("DOWNLOAD_ACCEL_PREFIX", ""),
         sqlite_path=_get_str("SQLITE_PATH", "db/jobs.sqlite"),
-        storage_path=_get_str("STORAGE_PATH", "storage"),
+        storage_path=storage_path,
+        progress_path=_get_str("PROGRESS_PATH", os.path.join(storage_path, "progress")),
+        doorbell_path=_get_str("DOORBELL_PATH", os.path.join(storage_path, "doorbell")),
         max_upload_mb=_get_int("MAX_UPLOAD_MB", 200),
+        upload_chunk_mb=_get_int("UPLOAD_CHUNK_MB", 8),
+        upload_session_ttl_seconds=_get_int("UPLOAD_SESSION_TTL_SECONDS", 86400),
+        delete_inputs_on_completion=_get_bool("DELETE_INPUTS_ON_COMPLETION", True),
+        output_ttl_hours=_get_int("OUTPUT_TTL_HOURS", 72),
+        web_job_abandon_minutes=_get_int("WEB_JOB_ABANDON_MINUTES", 0),
+        min_free_disk_mb=_get_int("MIN_FREE_DISK_MB", 1024),
+        early_probe_mb=_get_int("EARLY_PROBE_MB", 4),
         max_duration_seconds=_get_int("MAX_DURATION_SECONDS", 900),
         max_telegram_send_mb=_get_int("MAX_TELEGRAM_SEND_MB", 45),
+        delivery_concurrency=_get_int("DELIVERY_CONCURRENCY", 4),
+        delivery_max_attempts=_get_int("DELIVERY_MAX_ATTEMPTS", 5),
+        delivery_backoff_seconds=_get_int("DELIVERY_BACKOFF_SECONDS", 2),
+        delivery_poll_seconds=_get_int("DELIVERY_POLL_SECONDS", 5),
         rate_limit_per_min=_get_int("RATE_LIMIT_PER_MIN", 30),
+        rate_limit_backend=_get_str("RATE_LIMIT_BACKEND", "memory"),
+        rate_limit_sqlite_path=_get_str("RATE_LIMIT_SQLITE_PATH", "db/ratelimit.sqlite"),
         web_host=_get_str("WEB_HOST", "0.0.0.0"),
         web_port=_get_int("WEB_PORT", 8000),
         bot_listen_host=_get_str("BOT_LISTEN_HOST", "0.0.0.0"),
         bot_listen_port=_get_int("BOT_LISTEN_PORT", 8080),
+        bot_concurrent_updates=_get_int("BOT_CONCURRENT_UPDATES", 16),
+        bot_fast_lane_concurrency=_get_int("BOT_FAST_LANE_CONCURRENCY", 32),
+        bot_max_downloads=_get_int("BOT_MAX_DOWNLOADS", 4),
+        scheduler_policy=_get_str("SCHEDULER_POLICY", "fair_sjf"),
+        scheduler_max_delay_seconds=_get_int("SCHEDULER_MAX_DELAY_SECONDS", 7200),
+        queue_wait_slo_seconds=_get_int("QUEUE_WAIT_SLO_SECONDS", 0),
+        encoder_presets=_get_list("ENCODER_PRESETS", "slow,medium,fast,veryfast"),
+        preset_queue_depths=_get_int_list("PRESET_QUEUE_DEPTHS", "0,4,16"),
+        preset_wait_seconds=_get_int_list("PRESET_WAIT_SECONDS", "60,300,900"),
+        worker_slots=_get_int("WORKER_SLOTS", 1),
+        worker_cpu_budget=_get_int("WORKER_CPU_BUDGET", os.cpu_count() or 1),
+        worker_cpu_affinity=_get_bool("WORKER_CPU_AFFINITY", False),
+        worker_shutdown_grace_seconds=_get_int("WORKER_SHUTDOWN_GRACE_SECONDS", 600),
+        worker_poll_max_seconds=_get_int("WORKER_POLL_MAX_SECONDS", 10),
+        job_lease_seconds=_get_int("JOB_LEASE_SECONDS", 60),
+        job_max_attempts=_get_int("JOB_MAX_ATTEMPTS", 3),
+        worker_api_token=os.getenv("WORKER_API_TOKEN"),
+        worker_api_url=os.getenv("WORKER_API_URL"),
+        worker_metrics_host=_get_str("WORKER_METRICS_HOST", "0.0.0.0"),
+        worker_metrics_port=_get_int("WORKER_METRICS_PORT", 0),
+        chunk_min_duration_seconds=_get_int("CHUNK_MIN_DURATION_SECONDS", 300),
+        chunk_target_seconds=_get_int("CHUNK_TARGET_SECONDS", 60),
+        chunk_parallelism=_get_int("CHUNK_PARALLELISM", 4),
+        chunk_retries=_get_int("CHUNK_RETRIES", 1),
+        cache_max_mb=_get_int("CACHE_MAX_MB", 2048),
     )
@@ -1,19 +1,66 @@
+import os
 import sqlite3
+import threading
 from contextlib import contextmanager
 
+_local = threading.local()
+
 
 def get_connection(sqlite_path: str) -> sqlite3.Connection:
-    conn = sqlite3.connect(sqlite_path, timeout=30, check_same_thread=False)
+    conn = sqlite3.connect(
+        sqlite_path, timeout=30, check_same_thread=False, cached_statements=256
+    )
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA journal_mode=WAL")
     conn.execute("PRAGMA foreign_keys=ON")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-16000")
+    conn.execute("PRAGMA mmap_size=268435456")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def _pooled_connections() -> dict[str, sqlite3.Connection]:
+    pool = getattr(_local, "pool", None)
+    if pool is None or _local.pid != os.getpid():
+        pool = {}
+        _local.pool = pool
+        _local.pid = os.getpid()
+    return pool
+
+
+def get_pooled_connection(sqlite_path: str) -> sqlite3.Connection:
+    pool = _pooled_connections()
+    conn = pool.get(sqlite_path)
+    if conn is None:
+        conn = get_connection(sqlite_path)
+        pool[sqlite_path] = conn
     return conn
 
 
+def close_pooled_connections() -> None:
+    pool = _pooled_connections()
+    for conn in pool.values():
+        conn.close()
+    pool.clear()
+
+
 @contextmanager
 def connect(sqlite_path: str):
-    conn = get_connection(sqlite_path)
+    conn = get_pooled_connection(sqlite_path)
     try:
         yield conn
-    finally:
-        conn.close()
\ No newline at end of file
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def ensure_columns(conn: sqlite3.Connection, table: str, columns: dict[str, str]) -> None:
+    existing = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if not existing:
+        return
+    for name, definition in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+    conn.commit()
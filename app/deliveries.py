@@ -0,0 +1,143 @@
+import logging
+import os
+import time
+from typing import Any
+
+from app.db import connect
+from app.doorbell import ring
+from app.jobs import job_profiles
+from app.utils import utcnow
+
+logger = logging.getLogger("delivery")
+
+
+def delivery_doorbell_path(doorbell_path: str) -> str:
+    return os.path.join(doorbell_path, "delivery")
+
+
+def enqueue_delivery(sqlite_path: str, job_id: str, chat_id: str, kind: str) -> int:
+    now = utcnow()
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            """
+            INSERT INTO deliveries (
+                job_id, chat_id, kind, status, attempts, next_attempt_at,
+                created_at, updated_at
+            )
+            VALUES (?, ?, ?, 'pending', 0, ?, ?, ?)
+            RETURNING id
+            """,
+            (job_id, chat_id, kind, time.time(), now, now),
+        ).fetchone()
+        conn.execute(
+            "UPDATE jobs SET delivery_status = 'pending' WHERE id = ?", (job_id,)
+        )
+        return row["id"]
+
+
+def claim_deliveries(
+    sqlite_path: str, limit: int, lease_seconds: float
+) -> list[dict[str, Any]]:
+    now = time.time()
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            UPDATE deliveries
+            SET status = 'sending', attempts = attempts + 1,
+                next_attempt_at = ?, updated_at = ?
+            WHERE id IN (
+                SELECT id FROM deliveries
+                WHERE status IN ('pending', 'sending') AND next_attempt_at <= ?
+                ORDER BY next_attempt_at
+                LIMIT ?
+            )
+            RETURNING *
+            """,
+            (now + lease_seconds, utcnow(), now, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def retry_delivery(
+    sqlite_path: str,
+    delivery_id: int,
+    delay_seconds: float,
+    error: str,
+    kind: str | None = None,
+    count_attempt: bool = True,
+) -> None:
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            """
+            UPDATE deliveries
+            SET status = 'pending', next_attempt_at = ?, last_error = ?,
+                kind = COALESCE(?, kind),
+                attempts = CASE
+                    WHEN ? IS NOT NULL THEN 0
+                    WHEN ? THEN attempts
+                    ELSE attempts - 1
+                END,
+                updated_at = ?
+            WHERE id = ?
+            """,
+            (
+                time.time() + delay_seconds,
+                error,
+                kind,
+                kind,
+                count_attempt,
+                utcnow(),
+                delivery_id,
+            ),
+        )
+
+
+def finish_delivery(
+    sqlite_path: str,
+    delivery: dict[str, Any],
+    status: str,
+    error: str | None = None,
+) -> None:
+    now = utcnow()
+    if status == "sent":
+        job_status = "sent" if delivery["kind"] == "video" else "link_sent"
+    else:
+        job_status = status
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            """
+            UPDATE deliveries
+            SET status = ?, last_error = COALESCE(?, last_error), updated_at = ?
+            WHERE id = ?
+            """,
+            (status, error, now, delivery["id"]),
+        )
+        conn.execute(
+            "UPDATE jobs SET delivery_status = ? WHERE id = ?",
+            (job_status, delivery["job_id"]),
+        )
+
+
+def get_deliveries(sqlite_path: str, job_id: str) -> list[dict[str, Any]]:
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            "SELECT * FROM deliveries WHERE job_id = ? ORDER BY id", (job_id,)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def queue_job_delivery(job: dict[str, Any], settings, output_bytes: int) -> None:
+    if job.get("source") != "telegram" or not job.get("chat_id"):
+        return
+    if len(job_profiles(job)) > 1:
+        kind = "outputs"
+    elif output_bytes <= settings.max_telegram_send_mb * 1024 * 1024:
+        kind = "video"
+    else:
+        kind = "link"
+    try:
+        enqueue_delivery(settings.sqlite_path, job["id"], job["chat_id"], kind)
+    except Exception:
+        logger.exception("delivery_enqueue_failed", extra={"job_id": job["id"]})
+        return
+    ring(delivery_doorbell_path(settings.doorbell_path))
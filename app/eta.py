@@ -0,0 +1,222 @@
+import heapq
+import math
+import statistics
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+
+from app.db import connect
+from app.jobs import job_profiles
+from app.metrics import seconds_since
+from app.progress import read_progress
+from app.scheduling import DEFAULT_DURATION_SECONDS, PROFILE_COST
+
+# Historical encode speeds are grouped by the input height they were measured
+# on; taller inputs fall into the last class.
+HEIGHT_CLASSES = (480, 720, 1080, 1440, 2160)
+SPEED_SAMPLE_JOBS = 500
+MIN_SPEED_SAMPLES = 3
+ESTIMATE_MAX_AGE_SECONDS = 5.0
+# A job missing from the cached estimate (just created or claimed) forces a
+# refresh, but never more often than this.
+ESTIMATE_MIN_AGE_SECONDS = 1.0
+
+
+class QueueFull(RuntimeError):
+    def __init__(self, wait_seconds: float, retry_after: int) -> None:
+        super().__init__("The queue is full, try again later")
+        self.wait_seconds = wait_seconds
+        self.retry_after = retry_after
+
+
+def height_class(height: int | None) -> int | None:
+    if not height:
+        return None
+    for limit in HEIGHT_CLASSES:
+        if height <= limit:
+            return limit
+    return HEIGHT_CLASSES[-1]
+
+
+def encode_speeds(
+    sqlite_path: str, limit: int = SPEED_SAMPLE_JOBS
+) -> dict[tuple[str, int | None], float]:
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            SELECT
+                profile,
+                json_extract(probe_json, '$.height') AS height,
+                json_extract(metrics_json, '$.encode_speed') AS speed
+            FROM jobs
+            WHERE status IN ('done', 'expired')
+              AND metrics_json IS NOT NULL
+              AND encode_mode = 'encode'
+              AND profiles IS NULL
+            ORDER BY updated_at DESC
+            LIMIT ?
+            """,
+            (limit,),
+        ).fetchall()
+
+    samples: dict[tuple[str, int | None], list[float]] = {}
+    for row in rows:
+        if not row["speed"] or row["speed"] <= 0:
+            continue
+        profile = row["profile"]
+        for key in ((profile, height_class(row["height"])), (profile, None)):
+            samples.setdefault(key, []).append(float(row["speed"]))
+    return {
+        key: statistics.median(values)
+        for key, values in samples.items()
+        if len(values) >= MIN_SPEED_SAMPLES
+    }
+
+
+def encode_seconds(
+    speeds: dict[tuple[str, int | None], float],
+    profile: str,
+    duration_seconds: float | None,
+    height: int | None,
+) -> float:
+    duration = duration_seconds if duration_seconds and duration_seconds > 0 else None
+    if duration is None:
+        duration = DEFAULT_DURATION_SECONDS
+    speed = speeds.get((profile, height_class(height))) or speeds.get((profile, None))
+    if speed:
+        return duration / speed
+    # Until a profile has history, its scheduling cost stands in for wall
+    # seconds per media second.
+    return duration * PROFILE_COST.get(profile, 1.0)
+
+
+def announce_worker(
+    sqlite_path: str, worker_id: str, slots: int, ttl_seconds: float
+) -> None:
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            """
+            INSERT INTO workers (id, slots, expires_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(id) DO UPDATE SET
+                slots = excluded.slots,
+                expires_at = excluded.expires_at
+            """,
+            (worker_id, slots, time.time() + ttl_seconds),
+        )
+
+
+def active_slots(sqlite_path: str) -> int:
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            "SELECT COALESCE(SUM(slots), 0) AS slots FROM workers WHERE expires_at > ?",
+            (time.time(),),
+        ).fetchone()
+    return row["slots"]
+
+
+@dataclass(frozen=True)
+class QueueEstimate:
+    computed_at: float
+    slots: int
+    # Seconds until a job added now at the back of the queue would start.
+    wait_seconds: float
+    # Start and finish of every queued or running job, relative to computed_at.
+    jobs: dict[str, tuple[float, float]]
+
+    def job_times(self, job_id: str) -> tuple[float, float] | None:
+        offsets = self.jobs.get(job_id)
+        if offsets is None:
+            return None
+        return self.computed_at + offsets[0], self.computed_at + offsets[1]
+
+
+def _job_seconds(speeds: dict[tuple[str, int | None], float], job: dict) -> float:
+    # Ladder outputs share the decode, so their encodes are simply summed.
+    return sum(
+        encode_seconds(speeds, profile, job["duration_seconds"], job["height"])
+        for profile in job_profiles(job)
+    )
+
+
+def _remaining_seconds(
+    job: dict[str, Any], cost: float, progress_path: str | None
+) -> tuple[float, float]:
+    elapsed = seconds_since(job["updated_at"]) or 0.0
+    live = read_progress(progress_path, job["id"]) if progress_path else None
+    if live and live.get("eta_seconds") is not None:
+        remaining = live["eta_seconds"] - (time.time() - live.get("ts", time.time()))
+    else:
+        remaining = cost - elapsed
+    return elapsed, max(remaining, 0.0)
+
+
+def estimate_queue(sqlite_path: str, progress_path: str | None = None) -> QueueEstimate:
+    computed_at = time.time()
+    speeds = encode_speeds(sqlite_path)
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            SELECT
+                id, status, profile, profiles, duration_seconds, updated_at,
+                json_extract(probe_json, '$.height') AS height
+            FROM jobs
+            WHERE status IN ('queued', 'processing')
+            ORDER BY status = 'queued', sched_key
+            """
+        ).fetchall()
+    running = [dict(row) for row in rows if row["status"] == "processing"]
+    queued = [dict(row) for row in rows if row["status"] == "queued"]
+    slots = max(active_slots(sqlite_path), len(running), 1)
+
+    jobs: dict[str, tuple[float, float]] = {}
+    free_at = [0.0] * (slots - len(running))
+    for job in running:
+        cost = _job_seconds(speeds, job)
+        elapsed, remaining = _remaining_seconds(job, cost, progress_path)
+        jobs[job["id"]] = (-elapsed, remaining)
+        free_at.append(remaining)
+    heapq.heapify(free_at)
+
+    # Queued jobs start in sched_key order on whichever slot frees up first.
+    for job in queued:
+        cost = _job_seconds(speeds, job)
+        start = heapq.heappop(free_at)
+        jobs[job["id"]] = (start, start + cost)
+        heapq.heappush(free_at, start + cost)
+
+    return QueueEstimate(
+        computed_at=computed_at, slots=slots, wait_seconds=free_at[0], jobs=jobs
+    )
+
+
+class EtaEstimator:
+    def __init__(self, sqlite_path: str, progress_path: str | None = None) -> None:
+        self.sqlite_path = sqlite_path
+        self.progress_path = progress_path
+        self._estimate: QueueEstimate | None = None
+        self._lock = threading.Lock()
+
+    def current(self, max_age: float = ESTIMATE_MAX_AGE_SECONDS) -> QueueEstimate:
+        with self._lock:
+            estimate = self._estimate
+            if estimate is None or time.time() - estimate.computed_at > max_age:
+                estimate = estimate_queue(self.sqlite_path, self.progress_path)
+                self._estimate = estimate
+            return estimate
+
+    def job_times(
+        self, job_id: str, refresh_after: float = ESTIMATE_MIN_AGE_SECONDS
+    ) -> tuple[float, float] | None:
+        times = self.current().job_times(job_id)
+        if times is None:
+            times = self.current(refresh_after).job_times(job_id)
+        return times
+
+    def check_admission(self, slo_seconds: int) -> None:
+        if slo_seconds <= 0:
+            return
+        wait_seconds = self.current().wait_seconds
+        if wait_seconds > slo_seconds:
+            raise QueueFull(wait_seconds, math.ceil(wait_seconds - slo_seconds))
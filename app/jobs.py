@@ -1,9 +1,59 @@
+import json
+import os
 import secrets
+import time
+from pathlib import Path
 from typing import Any
 
 from app.db import connect
+from app.scheduling import SchedulingPolicy, estimate_cost, get_policy
 from app.utils import generate_uuid, utcnow
 
+# Profiles that can share one decode in a multi-output job. Target-size
+# encodes need their own bitrate search, so fit stays single-output.
+LADDER_PROFILES = ("small", "balanced", "hq")
+
+
+def parse_profiles(value: str, known: set[str]) -> list[str]:
+    items = [item.strip() for item in value.split(",") if item.strip()]
+    profiles = list(dict.fromkeys(items))
+    if not profiles or any(profile not in known for profile in profiles):
+        raise ValueError("Invalid profile")
+    if len(profiles) > 1 and not set(profiles) <= set(LADDER_PROFILES):
+        raise ValueError(f"Only {', '.join(LADDER_PROFILES)} can be combined")
+    return profiles
+
+
+def job_profiles(job: dict[str, Any]) -> list[str]:
+    if job.get("profiles"):
+        return job["profiles"].split(",")
+    return [job.get("profile") or "balanced"]
+
+
+def metrics_profile(job: dict[str, Any]) -> str:
+    return "+".join(job_profiles(job))
+
+
+def job_output_paths(output_dir: str | Path, job: dict[str, Any]) -> dict[str, str]:
+    profiles = job_profiles(job)
+    if len(profiles) == 1:
+        return {profiles[0]: str(Path(output_dir) / f"{job['id']}.mp4")}
+    return {
+        profile: str(Path(output_dir) / f"{job['id']}-{profile}.mp4")
+        for profile in profiles
+    }
+
+
+def measure_outputs(outputs: dict[str, str]) -> list[dict[str, Any]]:
+    return [
+        {
+            "profile": profile,
+            "output_path": output_path,
+            "output_bytes": os.path.getsize(output_path),
+        }
+        for profile, output_path in outputs.items()
+    ]
+
 
 def create_job(
     sqlite_path: str,
@@ -14,20 +64,32 @@ def create_job(
     input_path: str,
     profile: str,
     input_bytes: int | None,
+    input_sha256: str | None = None,
+    probe: dict[str, Any] | None = None,
+    policy: SchedulingPolicy | None = None,
+    target_bytes: int | None = None,
+    profiles: list[str] | None = None,
+    input_owned: bool = True,
 ) -> dict[str, Any]:
     job_id = generate_uuid()
     token = secrets.token_urlsafe(24)
     now = utcnow()
+    policy = policy or get_policy("fifo")
+    profiles = profiles or [profile]
+    duration = probe["duration"] if probe else None
+    cost = sum(estimate_cost(duration, item) for item in profiles)
     with connect(sqlite_path) as conn:
+        sched_key = _schedule(conn, policy, user_id, cost)
         conn.execute(
             """
             INSERT INTO jobs (
                 id, source, user_id, chat_id, input_path, output_path,
                 status, profile, progress, input_bytes, output_bytes,
                 duration_seconds, created_at, updated_at, error_message,
-                download_token
+                download_token, input_sha256, probe_json, sched_key, target_bytes,
+                profiles, input_owned
             )
-            VALUES (?, ?, ?, ?, ?, NULL, ?, ?, 0, ?, 0, 0, ?, ?, '', ?)
+            VALUES (?, ?, ?, ?, ?, NULL, ?, ?, 0, ?, 0, ?, ?, ?, '', ?, ?, ?, ?, ?, ?, ?)
             """,
             (
                 job_id,
@@ -38,14 +100,47 @@ def create_job(
                 "queued",
                 profile,
                 input_bytes or 0,
+                int(probe["duration"]) if probe else 0,
                 now,
                 now,
                 token,
+                input_sha256,
+                json.dumps(probe) if probe else None,
+                sched_key,
+                target_bytes,
+                ",".join(profiles) if len(profiles) > 1 else None,
+                int(input_owned),
             ),
         )
     return {"id": job_id, "download_token": token}
 
 
+def _schedule(
+    conn, policy: SchedulingPolicy, user_id: str | None, cost: float
+) -> float:
+    arrival = time.time()
+    if not policy.fair_share or not user_id:
+        sched_key, _ = policy.schedule(arrival, cost, None)
+        return sched_key
+
+    conn.execute("BEGIN IMMEDIATE")
+    row = conn.execute(
+        "SELECT finish_tag FROM user_schedule WHERE user_id = ?", (user_id,)
+    ).fetchone()
+    sched_key, finish_tag = policy.schedule(
+        arrival, cost, row["finish_tag"] if row else None
+    )
+    conn.execute(
+        """
+        INSERT INTO user_schedule (user_id, finish_tag)
+        VALUES (?, ?)
+        ON CONFLICT(user_id) DO UPDATE SET finish_tag = excluded.finish_tag
+        """,
+        (user_id, finish_tag),
+    )
+    return sched_key
+
+
 def get_job(sqlite_path: str, job_id: str) -> dict[str, Any] | None:
     with connect(sqlite_path) as conn:
         row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
@@ -54,6 +149,38 @@ def get_job(sqlite_path: str, job_id: str) -> dict[str, Any] | None:
         return dict(row)
 
 
+def save_job_outputs(
+    sqlite_path: str, job_id: str, outputs: list[dict[str, Any]]
+) -> None:
+    with connect(sqlite_path) as conn:
+        conn.executemany(
+            """
+            INSERT INTO job_outputs (job_id, profile, output_path, output_bytes)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(job_id, profile) DO UPDATE SET
+                output_path = excluded.output_path,
+                output_bytes = excluded.output_bytes
+            """,
+            [
+                (job_id, item["profile"], item["output_path"], item["output_bytes"])
+                for item in outputs
+            ],
+        )
+
+
+def get_job_outputs(sqlite_path: str, job_id: str) -> list[dict[str, Any]]:
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            SELECT profile, output_path, output_bytes FROM job_outputs
+            WHERE job_id = ?
+            ORDER BY rowid
+            """,
+            (job_id,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
 def update_job(sqlite_path: str, job_id: str, **fields: Any) -> None:
     if not fields:
         return
@@ -65,26 +192,164 @@ def update_job(sqlite_path: str, job_id: str, **fields: Any) -> None:
         conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", values)
 
 
-def lock_next_job(sqlite_path: str) -> dict[str, Any] | None:
+def update_owned_job(
+    sqlite_path: str, job_id: str, worker_id: str, **fields: Any
+) -> bool:
+    fields["updated_at"] = utcnow()
+    assignments = ", ".join([f"{key} = ?" for key in fields.keys()])
+    values = [*fields.values(), job_id, worker_id]
+    with connect(sqlite_path) as conn:
+        cursor = conn.execute(
+            f"""
+            UPDATE jobs SET {assignments}
+            WHERE id = ? AND worker_id = ? AND status = 'processing'
+            """,
+            values,
+        )
+        return cursor.rowcount == 1
+
+
+def lock_next_job(
+    sqlite_path: str, worker_id: str = "local", lease_seconds: float = 300
+) -> dict[str, Any] | None:
     now = utcnow()
     with connect(sqlite_path) as conn:
         row = conn.execute(
             """
             UPDATE jobs
-            SET status = 'processing', progress = 0, updated_at = ?
+            SET status = 'processing', progress = 0, updated_at = ?,
+                worker_id = ?, lease_expires_at = ?, attempts = attempts + 1
             WHERE id = (
-                SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1
+                SELECT id FROM jobs WHERE status = 'queued' ORDER BY sched_key LIMIT 1
             )
             AND status = 'queued'
             RETURNING *
             """,
-            (now,),
+            (now, worker_id, time.time() + lease_seconds),
         ).fetchone()
         if not row:
             return None
         return dict(row)
 
 
+def renew_lease(
+    sqlite_path: str, job_id: str, worker_id: str, lease_seconds: float
+) -> bool:
+    with connect(sqlite_path) as conn:
+        cursor = conn.execute(
+            """
+            UPDATE jobs
+            SET lease_expires_at = ?
+            WHERE id = ? AND worker_id = ? AND status = 'processing'
+            """,
+            (time.time() + lease_seconds, job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+
+def release_job(sqlite_path: str, job_id: str, worker_id: str) -> bool:
+    with connect(sqlite_path) as conn:
+        cursor = conn.execute(
+            """
+            UPDATE jobs
+            SET status = 'queued', progress = 0, worker_id = NULL,
+                lease_expires_at = NULL, attempts = MAX(attempts - 1, 0), updated_at = ?
+            WHERE id = ? AND worker_id = ? AND status = 'processing'
+            """,
+            (utcnow(), job_id, worker_id),
+        )
+        return cursor.rowcount == 1
+
+
+def job_owned(sqlite_path: str, job_id: str, worker_id: str) -> bool:
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            """
+            SELECT 1 FROM jobs
+            WHERE id = ? AND worker_id = ? AND status = 'processing'
+            """,
+            (job_id, worker_id),
+        ).fetchone()
+        return row is not None
+
+
+def cancel_job(sqlite_path: str, job_id: str) -> dict[str, Any] | None:
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            """
+            UPDATE jobs
+            SET status = 'cancelled', error_message = 'Cancelled', progress = 0,
+                updated_at = ?
+            WHERE id = ? AND status IN ('queued', 'processing')
+            RETURNING id, worker_id, input_path, input_owned
+            """,
+            (utcnow(), job_id),
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def latest_active_job(sqlite_path: str, user_id: str) -> dict[str, Any] | None:
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            """
+            SELECT * FROM jobs
+            WHERE user_id = ? AND status IN ('queued', 'processing')
+            ORDER BY created_at DESC, rowid DESC
+            LIMIT 1
+            """,
+            (user_id,),
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def mark_polled(sqlite_path: str, job_id: str) -> None:
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET last_polled_at = ? WHERE id = ?", (utcnow(), job_id)
+        )
+
+
+def reap_expired_leases(sqlite_path: str, max_attempts: int) -> list[dict[str, Any]]:
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            UPDATE jobs
+            SET status = CASE WHEN attempts >= ? THEN 'error' ELSE 'queued' END,
+                error_message = CASE
+                    WHEN attempts >= ? THEN 'Worker lost the job too many times'
+                    ELSE error_message
+                END,
+                progress = 0, worker_id = NULL, lease_expires_at = NULL, updated_at = ?
+            WHERE status = 'processing' AND lease_expires_at < ?
+            RETURNING id, status, attempts
+            """,
+            (max_attempts, max_attempts, utcnow(), time.time()),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def job_target_bytes(job: dict[str, Any], settings) -> int | None:
+    if job.get("target_bytes"):
+        return job["target_bytes"]
+    if job.get("profile") == "fit":
+        return settings.max_telegram_send_mb * 1024 * 1024
+    return None
+
+
+def queue_stats(sqlite_path: str) -> tuple[int, float]:
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            """
+            SELECT
+                COUNT(*) AS depth,
+                (julianday('now') - julianday(MIN(created_at))) * 86400 AS oldest_wait
+            FROM jobs
+            WHERE status = 'queued'
+            """
+        ).fetchone()
+    return row["depth"], max(row["oldest_wait"] or 0.0, 0.0)
+
+
 def set_user_profile(sqlite_path: str, user_id: str, profile: str) -> None:
     now = utcnow()
     with connect(sqlite_path) as conn:
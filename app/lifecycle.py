@@ -0,0 +1,110 @@
+import os
+import shutil
+import time
+
+from app.db import connect
+from app.utils import utc_seconds_ago, utcnow
+
+
+class StorageFull(RuntimeError):
+    pass
+
+
+def remove_quietly(path: str | None) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def expire_outputs(sqlite_path: str, ttl_seconds: int) -> list[str]:
+    cutoff = utc_seconds_ago(ttl_seconds)
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            UPDATE jobs
+            SET status = 'expired', updated_at = ?
+            WHERE status = 'done' AND updated_at < ?
+            RETURNING id, input_path, input_owned, output_path
+            """,
+            (utcnow(), cutoff),
+        ).fetchall()
+
+        outputs = conn.execute(
+            f"""
+            SELECT output_path FROM job_outputs
+            WHERE job_id IN ({", ".join("?" for _ in rows)})
+            """,
+            [row["id"] for row in rows],
+        ).fetchall()
+
+    for row in [*rows, *outputs]:
+        remove_quietly(row["output_path"])
+    for row in rows:
+        if row["input_owned"]:
+            remove_quietly(row["input_path"])
+    return [row["id"] for row in rows]
+
+
+def discard_cancelled(jobs: list[dict], delete_inputs: bool) -> None:
+    # Inputs of jobs that were processing are removed by their worker, or by
+    # reap_cancelled_inputs once its lease has run out.
+    if not delete_inputs:
+        return
+    for job in jobs:
+        if not job["worker_id"] and job["input_owned"]:
+            remove_quietly(job["input_path"])
+
+
+def reap_cancelled_inputs(sqlite_path: str, delete_inputs: bool) -> list[str]:
+    # A cancelled job keeps the lease of the worker that was running it. A
+    # remote worker cannot delete the input, and a worker that died never
+    # will, so the input goes once the lease expires.
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            UPDATE jobs
+            SET lease_expires_at = NULL
+            WHERE status = 'cancelled'
+              AND worker_id IS NOT NULL
+              AND lease_expires_at < ?
+            RETURNING id, input_path, input_owned
+            """,
+            (time.time(),),
+        ).fetchall()
+    if delete_inputs:
+        for row in rows:
+            if row["input_owned"]:
+                remove_quietly(row["input_path"])
+    return [row["id"] for row in rows]
+
+
+def cancel_abandoned_jobs(sqlite_path: str, idle_seconds: int) -> list[dict]:
+    cutoff = utc_seconds_ago(idle_seconds)
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            """
+            UPDATE jobs
+            SET status = 'cancelled', error_message = 'Cancelled: abandoned',
+                progress = 0, updated_at = ?
+            WHERE source = 'web'
+              AND status IN ('queued', 'processing')
+              AND COALESCE(last_polled_at, created_at) < ?
+            RETURNING id, worker_id, input_path, input_owned
+            """,
+            (utcnow(), cutoff),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+def free_bytes(path: str) -> int:
+    return shutil.disk_usage(path).free
+
+
+def check_free_space(path: str, min_free_mb: int, incoming_bytes: int = 0) -> None:
+    if min_free_mb <= 0:
+        return
+    if free_bytes(path) - incoming_bytes < min_free_mb * 1024 * 1024:
+        raise StorageFull("Server storage is full, try again later")
@@ -1,33 +1,116 @@
 from __future__ import annotations
 
+import json
+import subprocess
+import time
 from typing import Any
 
 
-def parse_ffprobe_json(payload: dict[str, Any]) -> dict[str, int | float | bool]:
+class MediaRejected(RuntimeError):
+    pass
+
+
+def _parse_bitrate(value: Any) -> int | None:
+    try:
+        bitrate = int(value)
+    except (TypeError, ValueError):
+        return None
+    return bitrate if bitrate > 0 else None
+
+
+def parse_ffprobe_json(payload: dict[str, Any]) -> dict[str, Any]:
     streams = payload.get("streams", [])
     format_info = payload.get("format", {})
     duration_raw = format_info.get("duration")
     duration = float(duration_raw) if duration_raw else 0.0
+    start_raw = format_info.get("start_time")
+    start_time = float(start_raw) if start_raw else 0.0
 
     video_stream = None
+    audio_stream = None
     for stream in streams:
-        if stream.get("codec_type") == "video":
+        if stream.get("codec_type") == "video" and video_stream is None:
             video_stream = stream
-            break
+        elif stream.get("codec_type") == "audio" and audio_stream is None:
+            audio_stream = stream
+    audio_codec = audio_stream.get("codec_name") if audio_stream else None
+    audio_bitrate = _parse_bitrate(audio_stream.get("bit_rate")) if audio_stream else None
+    bitrate = _parse_bitrate(format_info.get("bit_rate"))
 
     if not video_stream:
-        return {"has_video": False, "duration": duration, "width": 0, "height": 0}
+        return {
+            "has_video": False,
+            "duration": duration,
+            "start_time": start_time,
+            "width": 0,
+            "height": 0,
+            "video_codec": None,
+            "video_bitrate": None,
+            "pix_fmt": None,
+            "audio_codec": audio_codec,
+            "audio_bitrate": audio_bitrate,
+            "bitrate": bitrate,
+        }
 
     width = int(video_stream.get("width") or 0)
     height = int(video_stream.get("height") or 0)
+    video_bitrate = _parse_bitrate(video_stream.get("bit_rate"))
+    if video_bitrate is None and bitrate:
+        video_bitrate = _parse_bitrate(bitrate - (audio_bitrate or 0))
     return {
         "has_video": True,
         "duration": duration,
+        "start_time": start_time,
         "width": width,
         "height": height,
+        "video_codec": video_stream.get("codec_name"),
+        "video_bitrate": video_bitrate,
+        "pix_fmt": video_stream.get("pix_fmt"),
+        "audio_codec": audio_codec,
+        "audio_bitrate": audio_bitrate,
+        "bitrate": bitrate,
     }
 
 
+def run_ffprobe(input_path: str) -> dict:
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-print_format",
+        "json",
+        "-show_format",
+        "-show_streams",
+        input_path,
+    ]
+    started = time.monotonic()
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        detail = result.stderr.strip() or result.stdout.strip()
+        raise RuntimeError(f"ffprobe failed: {detail}")
+    payload = json.loads(result.stdout)
+    parsed = parse_ffprobe_json(payload)
+    parsed["probe_seconds"] = round(time.monotonic() - started, 3)
+    if not parsed["has_video"]:
+        raise MediaRejected("No video stream detected")
+    return parsed
+
+
+def probe_upload(input_path: str, max_duration_seconds: int) -> dict[str, Any]:
+    parsed = run_ffprobe(input_path)
+    check_probe(parsed, max_duration_seconds)
+    return parsed
+
+
+def check_probe(parsed: dict[str, Any], max_duration_seconds: int) -> None:
+    if not parsed["has_video"]:
+        raise MediaRejected("No video stream detected")
+    if parsed["duration"] <= 0:
+        raise MediaRejected("Unable to determine duration")
+    if parsed["duration"] > max_duration_seconds:
+        raise MediaRejected("Duration exceeds limit")
+
+
 def parse_timecode(value: str) -> float:
     parts = value.split(":")
     if len(parts) != 3:
@@ -35,4 +118,39 @@ def parse_timecode(value: str) -> float:
     hours = float(parts[0])
     minutes = float(parts[1])
     seconds = float(parts[2])
-    return hours * 3600 + minutes * 60 + seconds
\ No newline at end of file
+    return hours * 3600 + minutes * 60 + seconds
+
+
+def parse_keyframe_times(output: str, start_time: float = 0.0) -> list[float]:
+    times = set()
+    for line in output.splitlines():
+        parts = line.strip().split(",")
+        if len(parts) < 2 or "K" not in parts[1]:
+            continue
+        try:
+            value = float(parts[0]) - start_time
+        except ValueError:
+            continue
+        times.add(round(max(0.0, value), 6))
+    return sorted(times)
+
+
+def choose_split_points(
+    keyframes: list[float],
+    duration: float,
+    target_seconds: float,
+) -> list[tuple[float, float]]:
+    if duration <= 0 or target_seconds <= 0:
+        return [(0.0, duration)]
+
+    segments = []
+    start = 0.0
+    for keyframe in keyframes:
+        if keyframe - start < target_seconds:
+            continue
+        if duration - keyframe < target_seconds / 2:
+            break
+        segments.append((start, keyframe))
+        start = keyframe
+    segments.append((start, duration))
+    return segments
@@ -0,0 +1,220 @@
+import bisect
+import json
+import math
+import threading
+from datetime import datetime
+from typing import Any, Iterable
+
+from app.db import connect
+from app.jobs import queue_stats
+
+PREFIX = "size_reducer"
+
+# Per-profile histograms shared by every process through SQLite. Buckets are
+# upper bounds; +Inf is added when rendering.
+HISTOGRAMS = {
+    "queue_wait_seconds": (
+        "Time from job creation to a worker claiming it",
+        (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+    ),
+    "probe_seconds": (
+        "FFprobe run time for the job input",
+        (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10),
+    ),
+    "encode_seconds": (
+        "Wall time of the ffmpeg encode",
+        (5, 15, 30, 60, 120, 300, 600, 1200, 2400),
+    ),
+    "encode_speed": (
+        "Media seconds encoded per wall second",
+        (0.25, 0.5, 1, 1.5, 2, 3, 5, 10, 20),
+    ),
+    "encode_fps": (
+        "Frames per second reported by ffmpeg",
+        (5, 10, 25, 50, 100, 200, 400, 800),
+    ),
+    "encode_bitrate_kbps": (
+        "Output bitrate reported by ffmpeg",
+        (250, 500, 1000, 2000, 4000, 8000),
+    ),
+    "notify_seconds": (
+        "Time from job completion to the Telegram delivery",
+        (0.5, 1, 2, 5, 10, 30, 60, 300),
+    ),
+}
+ENCODE_METRICS = {
+    "encode_seconds",
+    "encode_speed",
+    "encode_fps",
+    "encode_bitrate_kbps",
+    "output_total_size",
+}
+
+
+def _parse_time(value: str) -> datetime:
+    return datetime.fromisoformat(value.rstrip("Z"))
+
+
+def queue_wait_seconds(job: dict[str, Any]) -> float | None:
+    # lock_next_job stamps updated_at with the claim time.
+    try:
+        waited = _parse_time(job["updated_at"]) - _parse_time(job["created_at"])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return max(waited.total_seconds(), 0.0)
+
+
+def seconds_since(value: str) -> float | None:
+    try:
+        elapsed = datetime.utcnow() - _parse_time(value)
+    except (TypeError, ValueError):
+        return None
+    return max(elapsed.total_seconds(), 0.0)
+
+
+def _bucket(name: str, value: float) -> float:
+    buckets = HISTOGRAMS[name][1]
+    index = bisect.bisect_left(buckets, value)
+    return float(buckets[index]) if index < len(buckets) else math.inf
+
+
+def record_job_metrics(
+    sqlite_path: str, job_id: str, profile: str, values: dict[str, Any]
+) -> None:
+    values = {key: value for key, value in values.items() if value is not None}
+    if not values:
+        return
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            """
+            UPDATE jobs
+            SET metrics_json = json_patch(COALESCE(metrics_json, '{}'), ?)
+            WHERE id = ?
+            """,
+            (json.dumps(values), job_id),
+        )
+        for name, value in values.items():
+            if name not in HISTOGRAMS:
+                continue
+            conn.execute(
+                """
+                INSERT INTO metric_histograms (name, profile, le, count, total)
+                VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(name, profile, le) DO UPDATE SET
+                    count = count + 1,
+                    total = total + excluded.total
+                """,
+                (name, profile, _bucket(name, value), float(value)),
+            )
+
+
+def histogram_rows(sqlite_path: str) -> list[dict[str, Any]]:
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            "SELECT name, profile, le, count, total FROM metric_histograms"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class Histogram:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._rows: dict[tuple[str, float], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, profile: str, value: float) -> None:
+        key = (profile, _bucket(self.name, value))
+        with self._lock:
+            row = self._rows.setdefault(key, [0, 0.0])
+            row[0] += 1
+            row[1] += value
+
+    def rows(self) -> list[dict[str, Any]]:
+        with self._lock:
+            return [
+                {
+                    "name": self.name,
+                    "profile": profile,
+                    "le": le,
+                    "count": count,
+                    "total": total,
+                }
+                for (profile, le), (count, total) in self._rows.items()
+            ]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict[str, Any]) -> str:
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render_histograms(rows: Iterable[dict[str, Any]], prefix: str = PREFIX) -> list[str]:
+    grouped: dict[str, dict[str, dict[float, tuple[int, float]]]] = {}
+    for row in rows:
+        profiles = grouped.setdefault(row["name"], {})
+        profiles.setdefault(row["profile"], {})[row["le"]] = (row["count"], row["total"])
+
+    lines = []
+    for name, profiles in sorted(grouped.items()):
+        metric = f"{prefix}_{name}"
+        lines.append(f"# HELP {metric} {HISTOGRAMS[name][0]}")
+        lines.append(f"# TYPE {metric} histogram")
+        for profile, observed in sorted(profiles.items()):
+            cumulative = 0
+            total = 0.0
+            for le in [*HISTOGRAMS[name][1], math.inf]:
+                count, subtotal = observed.get(float(le), (0, 0.0))
+                cumulative += count
+                total += subtotal
+                labels = _labels({"profile": profile, "le": _number(float(le))})
+                lines.append(f"{metric}_bucket{labels} {cumulative}")
+            labels = _labels({"profile": profile})
+            lines.append(f"{metric}_sum{labels} {_number(total)}")
+            lines.append(f"{metric}_count{labels} {cumulative}")
+    return lines
+
+
+def render_metric(
+    name: str, kind: str, help_text: str, samples: Iterable[tuple[dict[str, Any], float]]
+) -> list[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_labels(labels)} {_number(value)}")
+    return lines
+
+
+def render_service_metrics(sqlite_path: str) -> str:
+    with connect(sqlite_path) as conn:
+        statuses = conn.execute(
+            "SELECT status, COUNT(*) AS count FROM jobs GROUP BY status ORDER BY status"
+        ).fetchall()
+    depth, oldest_wait = queue_stats(sqlite_path)
+    lines = render_metric(
+        f"{PREFIX}_jobs",
+        "gauge",
+        "Jobs by status",
+        [({"status": row["status"]}, row["count"]) for row in statuses],
+    )
+    lines += render_metric(
+        f"{PREFIX}_queue_depth", "gauge", "Queued jobs", [({}, depth)]
+    )
+    lines += render_metric(
+        f"{PREFIX}_queue_oldest_wait_seconds",
+        "gauge",
+        "Age of the oldest queued job",
+        [({}, round(oldest_wait, 3))],
+    )
+    lines += render_histograms(histogram_rows(sqlite_path))
+    return "\n".join(lines) + "\n"
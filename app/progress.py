@@ -0,0 +1,32 @@
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+
+def _progress_file(progress_path: str, job_id: str) -> Path:
+    return Path(progress_path) / f"{job_id}.json"
+
+
+def publish_progress(progress_path: str, job_id: str, **values: Any) -> None:
+    values["ts"] = time.time()
+    path = _progress_file(progress_path, job_id)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(values), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def read_progress(progress_path: str, job_id: str) -> dict[str, Any] | None:
+    try:
+        return json.loads(_progress_file(progress_path, job_id).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def clear_progress(progress_path: str, job_id: str) -> None:
+    try:
+        _progress_file(progress_path, job_id).unlink()
+    except OSError:
+        pass
@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+
+PROFILE_COST = {"small": 0.5, "balanced": 0.7, "hq": 1.5, "fit": 0.7}
+DEFAULT_DURATION_SECONDS = 300.0
+
+
+def estimate_cost(duration_seconds: float | None, profile: str) -> float:
+    duration = duration_seconds if duration_seconds and duration_seconds > 0 else None
+    if duration is None:
+        duration = DEFAULT_DURATION_SECONDS
+    return duration * PROFILE_COST.get(profile, 1.0)
+
+
+@dataclass(frozen=True)
+class SchedulingPolicy:
+    name: str
+    fair_share: bool = False
+    sjf_weight: float = 0.0
+    max_delay_seconds: float = 7200.0
+
+    def schedule(
+        self, arrival: float, cost: float, user_finish: float | None
+    ) -> tuple[float, float | None]:
+        key = arrival
+        finish = None
+        if self.fair_share:
+            key = max(arrival, user_finish or arrival)
+            finish = key + cost
+        if self.sjf_weight:
+            key += cost * self.sjf_weight
+        return min(key, arrival + self.max_delay_seconds), finish
+
+
+def choose_preset(
+    presets: tuple[str, ...],
+    depth_thresholds: tuple[int, ...],
+    wait_thresholds: tuple[int, ...],
+    queue_depth: int,
+    oldest_wait_seconds: float,
+) -> str:
+    level = max(
+        sum(1 for threshold in depth_thresholds if queue_depth > threshold),
+        sum(1 for threshold in wait_thresholds if oldest_wait_seconds > threshold),
+    )
+    return presets[min(level, len(presets) - 1)]
+
+
+POLICIES = {
+    "fifo": SchedulingPolicy("fifo"),
+    "sjf": SchedulingPolicy("sjf", sjf_weight=1.0),
+    "fair": SchedulingPolicy("fair", fair_share=True),
+    "fair_sjf": SchedulingPolicy("fair_sjf", fair_share=True, sjf_weight=0.5),
+}
+
+
+def get_policy(name: str, max_delay_seconds: float | None = None) -> SchedulingPolicy:
+    if name not in POLICIES:
+        raise ValueError(f"Unknown scheduling policy: {name}")
+    policy = POLICIES[name]
+    if max_delay_seconds is None:
+        return policy
+    return SchedulingPolicy(
+        policy.name, policy.fair_share, policy.sjf_weight, max_delay_seconds
+    )
@@ -0,0 +1,108 @@
+import os
+from typing import Any
+
+from app.db import connect
+from app.utils import generate_uuid, utc_seconds_ago, utcnow
+
+
+def create_upload_session(
+    sqlite_path: str,
+    *,
+    client_id: str | None,
+    filename: str | None,
+    input_path: str,
+    profile: str,
+    size: int,
+    target_bytes: int | None = None,
+) -> dict[str, Any]:
+    upload_id = generate_uuid()
+    now = utcnow()
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            """
+            INSERT INTO upload_sessions (
+                id, client_id, filename, input_path, profile, size, target_bytes,
+                received, created_at, updated_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+            RETURNING *
+            """,
+            (
+                upload_id,
+                client_id,
+                filename,
+                input_path,
+                profile,
+                size,
+                target_bytes,
+                now,
+                now,
+            ),
+        ).fetchone()
+        return dict(row)
+
+
+def get_upload_session(sqlite_path: str, upload_id: str) -> dict[str, Any] | None:
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            "SELECT * FROM upload_sessions WHERE id = ?", (upload_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(row)
+
+
+def advance_upload_session(
+    sqlite_path: str, upload_id: str, expected: int, received: int
+) -> bool:
+    with connect(sqlite_path) as conn:
+        cursor = conn.execute(
+            """
+            UPDATE upload_sessions
+            SET received = ?, updated_at = ?
+            WHERE id = ? AND received = ?
+            """,
+            (received, utcnow(), upload_id, expected),
+        )
+        return cursor.rowcount == 1
+
+
+def finish_upload_session(sqlite_path: str, upload_id: str) -> dict[str, Any] | None:
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            """
+            DELETE FROM upload_sessions
+            WHERE id = ? AND received = size
+            RETURNING *
+            """,
+            (upload_id,),
+        ).fetchone()
+        if not row:
+            return None
+        return dict(row)
+
+
+def delete_upload_session(sqlite_path: str, upload_id: str) -> dict[str, Any] | None:
+    with connect(sqlite_path) as conn:
+        row = conn.execute(
+            "DELETE FROM upload_sessions WHERE id = ? RETURNING *", (upload_id,)
+        ).fetchone()
+        if not row:
+            return None
+        return dict(row)
+
+
+def reap_upload_sessions(sqlite_path: str, max_age_seconds: int) -> list[str]:
+    cutoff = utc_seconds_ago(max_age_seconds)
+    with connect(sqlite_path) as conn:
+        rows = conn.execute(
+            "DELETE FROM upload_sessions WHERE updated_at < ? RETURNING id, input_path",
+            (cutoff,),
+        ).fetchall()
+
+    for row in rows:
+        try:
+            os.remove(row["input_path"])
+        except OSError:
+            pass
+    return [row["id"] for row in rows]
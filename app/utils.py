@@ -1,7 +1,9 @@
+import hashlib
 import os
 import re
+import shutil
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from urllib.parse import urljoin
 
@@ -12,6 +14,16 @@ def utcnow() -> str:
     return datetime.utcnow().isoformat(timespec="seconds") + "Z"
 
 
+def utc_seconds_ago(seconds: float) -> str:
+    moment = datetime.utcnow() - timedelta(seconds=seconds)
+    return moment.isoformat(timespec="seconds") + "Z"
+
+
+def utc_from_timestamp(timestamp: float) -> str:
+    moment = datetime.utcfromtimestamp(timestamp)
+    return moment.isoformat(timespec="seconds") + "Z"
+
+
 def ensure_dir(path: str | Path) -> None:
     Path(path).mkdir(parents=True, exist_ok=True)
 
@@ -40,7 +52,50 @@ def is_probable_video(filename: str | None, content_type: str | None) -> bool:
     return False
 
 
-def build_download_url(base_url: str, job_id: str, token: str) -> str:
+def build_download_url(
+    base_url: str, job_id: str, token: str, profile: str | None = None
+) -> str:
     base = base_url.rstrip("/") + "/"
     path = f"api/download/{job_id}?token={token}"
-    return urljoin(base, path)
\ No newline at end of file
+    if profile:
+        path += f"&profile={profile}"
+    return urljoin(base, path)
+
+
+def format_size(size_bytes: int) -> str:
+    return f"{size_bytes / (1024 * 1024):.1f} MB"
+
+
+def sha256_file(path: str | Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src: str | Path, dst: str | Path) -> None:
+    tmp = f"{dst}.tmp-{uuid.uuid4().hex}"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+LOCAL_INGEST_MODES = {"link", "move", "reference"}
+
+
+def adopt_local_file(src: str | Path, dst: str | Path, mode: str) -> str:
+    if mode == "reference":
+        return str(src)
+    if mode == "move":
+        shutil.move(str(src), str(dst))
+        return str(dst)
+    if mode == "link":
+        link_or_copy(src, dst)
+        return str(dst)
+    raise ValueError(f"Unknown local ingest mode: {mode}")
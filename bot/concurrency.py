@@ -0,0 +1,57 @@
+import asyncio
+from typing import Any, Awaitable
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+# Upper bound on updates held by the application at once; the real limits are
+# the per-lane semaphores below.
+MAX_PENDING_UPDATES = 4096
+
+
+def is_fast_lane(update: object) -> bool:
+    if not isinstance(update, Update):
+        return False
+    if update.callback_query is not None:
+        return True
+    message = update.message
+    return bool(message and message.text and message.text.startswith("/"))
+
+
+class ChatUpdateProcessor(BaseUpdateProcessor):
+    def __init__(self, max_concurrent_updates: int, fast_lane_concurrency: int) -> None:
+        super().__init__(MAX_PENDING_UPDATES)
+        self.slow_lane = asyncio.Semaphore(max_concurrent_updates)
+        self.fast_lane = asyncio.Semaphore(fast_lane_concurrency)
+        self._chat_locks: dict[Any, asyncio.Lock] = {}
+        self._chat_waiters: dict[Any, int] = {}
+
+    async def do_process_update(self, update: object, coroutine: Awaitable[Any]) -> None:
+        if is_fast_lane(update):
+            async with self.fast_lane:
+                await coroutine
+            return
+
+        chat = getattr(update, "effective_chat", None)
+        if chat is None:
+            async with self.slow_lane:
+                await coroutine
+            return
+
+        lock = self._chat_locks.setdefault(chat.id, asyncio.Lock())
+        self._chat_waiters[chat.id] = self._chat_waiters.get(chat.id, 0) + 1
+        try:
+            async with lock:
+                async with self.slow_lane:
+                    await coroutine
+        finally:
+            self._chat_waiters[chat.id] -= 1
+            if not self._chat_waiters[chat.id]:
+                del self._chat_waiters[chat.id]
+                del self._chat_locks[chat.id]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
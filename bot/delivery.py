@@ -0,0 +1,309 @@
+import asyncio
+import logging
+import os
+import secrets
+import socket
+from typing import AsyncIterator
+
+import httpx
+
+from app.deliveries import (
+    claim_deliveries,
+    delivery_doorbell_path,
+    finish_delivery,
+    retry_delivery,
+)
+from app.doorbell import Doorbell
+from app.jobs import get_job, get_job_outputs, metrics_profile
+from app.metrics import record_job_metrics, seconds_since
+from app.utils import build_download_url, format_size
+
+logger = logging.getLogger("delivery")
+
+DEFAULT_API_BASE_URL = "https://api.telegram.org/bot"
+LEASE_SECONDS = 600
+MAX_BACKOFF_SECONDS = 300
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+
+class TelegramError(RuntimeError):
+    def __init__(
+        self, message: str, status_code: int, retry_after: float | None = None
+    ) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def permanent(self) -> bool:
+        return 400 <= self.status_code < 500 and self.status_code != 429
+
+
+async def _read_file(path: str) -> AsyncIterator[bytes]:
+    handle = await asyncio.to_thread(open, path, "rb")
+    try:
+        while chunk := await asyncio.to_thread(handle.read, UPLOAD_CHUNK_BYTES):
+            yield chunk
+    finally:
+        await asyncio.to_thread(handle.close)
+
+
+async def _multipart(
+    data: dict, files: dict[str, tuple[str, str, str]]
+) -> tuple[dict, AsyncIterator[bytes]]:
+    # The body is streamed from disk through a thread, so a slow volume never
+    # blocks the event loop; its length is known up front from the file sizes.
+    boundary = secrets.token_hex(16)
+    fields = b"".join(
+        f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+        f"{value}\r\n".encode()
+        for name, value in data.items()
+    )
+    parts = []
+    length = len(fields)
+    for name, (filename, path, content_type) in files.items():
+        header = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+            f'filename="{filename}"\r\nContent-Type: {content_type}\r\n\r\n'
+        ).encode()
+        size = (await asyncio.to_thread(os.stat, path)).st_size
+        parts.append((header, path))
+        length += len(header) + size + 2
+    closing = f"--{boundary}--\r\n".encode()
+    length += len(closing)
+
+    async def body() -> AsyncIterator[bytes]:
+        yield fields
+        for header, path in parts:
+            yield header
+            async for chunk in _read_file(path):
+                yield chunk
+            yield b"\r\n"
+        yield closing
+
+    headers = {
+        "Content-Type": f"multipart/form-data; boundary={boundary}",
+        "Content-Length": str(length),
+    }
+    return headers, body()
+
+
+class DeliverySender:
+    def __init__(self, settings, client: httpx.AsyncClient | None = None) -> None:
+        self.settings = settings
+        base_url = settings.telegram_api_base_url or DEFAULT_API_BASE_URL
+        self.api_url = f"{base_url}{settings.telegram_bot_token}"
+        self.client = client or httpx.AsyncClient(
+            timeout=httpx.Timeout(30.0, write=300.0),
+            limits=httpx.Limits(
+                max_connections=settings.delivery_concurrency,
+                max_keepalive_connections=settings.delivery_concurrency,
+            ),
+        )
+        self.inflight: set[asyncio.Task] = set()
+        self._stop = asyncio.Event()
+        self._doorbell: Doorbell | None = None
+
+    async def call(
+        self,
+        method: str,
+        data: dict,
+        files: dict[str, tuple[str, str, str]] | None = None,
+    ) -> dict:
+        url = f"{self.api_url}/{method}"
+        if files:
+            headers, body = await _multipart(data, files)
+            response = await self.client.post(url, headers=headers, content=body)
+        else:
+            response = await self.client.post(url, data=data)
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        if response.status_code == 200 and payload.get("ok"):
+            return payload.get("result") or {}
+        parameters = payload.get("parameters") or {}
+        raise TelegramError(
+            payload.get("description") or f"HTTP {response.status_code}",
+            payload.get("error_code") or response.status_code,
+            parameters.get("retry_after"),
+        )
+
+    async def send(self, delivery: dict, job: dict) -> None:
+        if delivery["kind"] == "video":
+            await self.call(
+                "sendVideo",
+                {
+                    "chat_id": delivery["chat_id"],
+                    "supports_streaming": "true",
+                    "caption": f"Job {job['id']} complete.",
+                },
+                files={"video": (f"{job['id']}.mp4", job["output_path"], "video/mp4")},
+            )
+            return
+
+        if delivery["kind"] == "outputs":
+            outputs = await asyncio.to_thread(
+                get_job_outputs, self.settings.sqlite_path, job["id"]
+            )
+            lines = [
+                f"{output['profile']} ({format_size(output['output_bytes'])}): "
+                + build_download_url(
+                    self.settings.base_url,
+                    job["id"],
+                    job["download_token"],
+                    output["profile"],
+                )
+                for output in outputs
+            ]
+            await self.call(
+                "sendMessage",
+                {
+                    "chat_id": delivery["chat_id"],
+                    "text": "Your videos are ready:\n" + "\n".join(lines),
+                },
+            )
+            return
+
+        download_url = build_download_url(
+            self.settings.base_url, job["id"], job["download_token"]
+        )
+        await self.call(
+            "sendMessage",
+            {"chat_id": delivery["chat_id"], "text": f"Your video is ready: {download_url}"},
+        )
+
+    async def deliver(self, delivery: dict) -> None:
+        sqlite_path = self.settings.sqlite_path
+        job = await asyncio.to_thread(get_job, sqlite_path, delivery["job_id"])
+        if not job or job["status"] != "done":
+            await asyncio.to_thread(
+                finish_delivery, sqlite_path, delivery, "failed", "Job output unavailable"
+            )
+            return
+
+        try:
+            await self.send(delivery, job)
+        except TelegramError as exc:
+            if exc.retry_after is not None:
+                logger.warning(
+                    f"delivery_rate_limited retry_after={exc.retry_after}",
+                    extra={"job_id": job["id"]},
+                )
+                await asyncio.to_thread(
+                    retry_delivery,
+                    sqlite_path,
+                    delivery["id"],
+                    float(exc.retry_after),
+                    str(exc),
+                    count_attempt=False,
+                )
+            elif exc.permanent:
+                await self._give_up(delivery, str(exc))
+            else:
+                await self._retry(delivery, str(exc))
+        except (httpx.HTTPError, OSError) as exc:
+            await self._retry(delivery, str(exc) or type(exc).__name__)
+        else:
+            await asyncio.to_thread(finish_delivery, sqlite_path, delivery, "sent")
+            logger.info(
+                f"delivery_sent kind={delivery['kind']}", extra={"job_id": job["id"]}
+            )
+            await self._record_notify(job)
+
+    async def _record_notify(self, job: dict) -> None:
+        # Delivery updates leave jobs.updated_at at the completion time.
+        try:
+            await asyncio.to_thread(
+                record_job_metrics,
+                self.settings.sqlite_path,
+                job["id"],
+                metrics_profile(job),
+                {"notify_seconds": seconds_since(job["updated_at"])},
+            )
+        except Exception:
+            logger.warning("metrics_record_failed", extra={"job_id": job["id"]})
+
+    async def _retry(self, delivery: dict, error: str) -> None:
+        if delivery["attempts"] >= self.settings.delivery_max_attempts:
+            await self._give_up(delivery, error)
+            return
+        delay = min(
+            self.settings.delivery_backoff_seconds * 2 ** (delivery["attempts"] - 1),
+            MAX_BACKOFF_SECONDS,
+        )
+        logger.warning(
+            f"delivery_retry attempt={delivery['attempts']} delay={delay} error={error}",
+            extra={"job_id": delivery["job_id"]},
+        )
+        await asyncio.to_thread(
+            retry_delivery, self.settings.sqlite_path, delivery["id"], delay, error
+        )
+
+    async def _give_up(self, delivery: dict, error: str) -> None:
+        if delivery["kind"] == "video":
+            logger.warning(
+                f"delivery_video_failed error={error}", extra={"job_id": delivery["job_id"]}
+            )
+            await asyncio.to_thread(
+                retry_delivery,
+                self.settings.sqlite_path,
+                delivery["id"],
+                0,
+                error,
+                kind="link",
+            )
+            return
+        logger.warning(
+            f"delivery_failed error={error}", extra={"job_id": delivery["job_id"]}
+        )
+        await asyncio.to_thread(
+            finish_delivery, self.settings.sqlite_path, delivery, "failed", error
+        )
+
+    async def _deliver_safely(self, delivery: dict) -> None:
+        try:
+            await self.deliver(delivery)
+        except Exception:
+            logger.exception("delivery_crashed", extra={"job_id": delivery["job_id"]})
+
+    async def run_once(self) -> int:
+        free = self.settings.delivery_concurrency - len(self.inflight)
+        if free <= 0:
+            return 0
+        deliveries = await asyncio.to_thread(
+            claim_deliveries, self.settings.sqlite_path, free, LEASE_SECONDS
+        )
+        for delivery in deliveries:
+            task = asyncio.create_task(self._deliver_safely(delivery))
+            self.inflight.add(task)
+            task.add_done_callback(self.inflight.discard)
+        return len(deliveries)
+
+    async def run(self) -> None:
+        self._doorbell = Doorbell(
+            delivery_doorbell_path(self.settings.doorbell_path),
+            f"delivery-{socket.gethostname()}-{os.getpid()}",
+        )
+        try:
+            while not self._stop.is_set():
+                claimed = await self.run_once()
+                if len(self.inflight) >= self.settings.delivery_concurrency:
+                    await asyncio.wait(self.inflight, return_when=asyncio.FIRST_COMPLETED)
+                elif not claimed:
+                    await asyncio.to_thread(
+                        self._doorbell.wait, self.settings.delivery_poll_seconds
+                    )
+            if self.inflight:
+                await asyncio.gather(*self.inflight, return_exceptions=True)
+        finally:
+            self._doorbell.close()
+            self._doorbell = None
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._doorbell is not None:
+            self._doorbell.wake()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
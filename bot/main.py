@@ -1,5 +1,7 @@
 import asyncio
 import logging
+import os
+import time
 from pathlib import Path
 from urllib.parse import urlparse
 
@@ -14,13 +16,36 @@ from telegram.ext import (
 )
 
 from app.config import load_settings
-from app.jobs import create_job, get_user_profile, set_user_profile
+from app.doorbell import ring
+from app.eta import EtaEstimator, QueueFull
+from app.jobs import (
+    cancel_job,
+    create_job,
+    get_job,
+    get_user_profile,
+    latest_active_job,
+    parse_profiles,
+    set_user_profile,
+)
+from app.lifecycle import StorageFull, check_free_space, discard_cancelled
 from app.logging import setup_logging
-from app.utils import ensure_dir, generate_uuid, is_probable_video, safe_extension
+from app.media import MediaRejected, probe_upload
+from app.scheduling import get_policy
+from app.utils import (
+    LOCAL_INGEST_MODES,
+    adopt_local_file,
+    ensure_dir,
+    generate_uuid,
+    is_probable_video,
+    safe_extension,
+    sha256_file,
+)
+from bot.concurrency import ChatUpdateProcessor
+from bot.delivery import DeliverySender
 
 logger = logging.getLogger("bot")
 
-PROFILES = {"small", "balanced", "hq"}
+PROFILES = {"small", "balanced", "hq", "fit"}
 
 
 def build_settings_keyboard() -> InlineKeyboardMarkup:
@@ -28,26 +53,68 @@ def build_settings_keyboard() -> InlineKeyboardMarkup:
         [InlineKeyboardButton("Small", callback_data="profile:small")],
         [InlineKeyboardButton("Balanced", callback_data="profile:balanced")],
         [InlineKeyboardButton("HQ", callback_data="profile:hq")],
+        [InlineKeyboardButton("Fit for Telegram", callback_data="profile:fit")],
+        [
+            InlineKeyboardButton(
+                "Compare small, balanced and HQ",
+                callback_data="profile:small,balanced,hq",
+            )
+        ],
     ]
     return InlineKeyboardMarkup(buttons)
 
 
+def format_wait(seconds: float) -> str:
+    minutes = round(seconds / 60)
+    if minutes < 1:
+        return "under a minute"
+    if minutes < 60:
+        return f"about {minutes} min"
+    return f"about {minutes // 60} h {minutes % 60} min"
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     settings = context.application.bot_data["settings"]
     text = (
         "Send me a video or document and I will compress it.\n"
         f"Max upload size: {settings.max_upload_mb} MB.\n"
-        "Use /settings to pick a profile (small, balanced, hq)."
+        "Use /settings to pick a profile (small, balanced, hq, fit) "
+        "or compare small, balanced and hq in one job.\n"
+        "Use /cancel to stop your latest job."
     )
     await update.message.reply_text(text)
 
 
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(
-        "Upload a video and I will compress it. Use /settings to pick a profile."
+        "Upload a video and I will compress it. Use /settings to pick a profile "
+        "and /cancel [job id] to stop a queued or running job."
     )
 
 
+async def cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    settings = context.application.bot_data["settings"]
+    user_id = str(update.effective_user.id)
+    if context.args:
+        job = await asyncio.to_thread(get_job, settings.sqlite_path, context.args[0])
+        if not job or job["user_id"] != user_id:
+            await update.message.reply_text("Job not found.")
+            return
+    else:
+        job = await asyncio.to_thread(latest_active_job, settings.sqlite_path, user_id)
+        if not job:
+            await update.message.reply_text("You have no queued or running jobs.")
+            return
+
+    cancelled = await asyncio.to_thread(cancel_job, settings.sqlite_path, job["id"])
+    if not cancelled:
+        await update.message.reply_text(f"Job {job['id']} is already {job['status']}.")
+        return
+    discard_cancelled([cancelled], settings.delete_inputs_on_completion)
+    logger.info("job_cancelled", extra={"job_id": job["id"]})
+    await update.message.reply_text(f"Job {job['id']} cancelled.")
+
+
 async def settings_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(
         "Choose a compression profile:", reply_markup=build_settings_keyboard()
@@ -58,7 +125,9 @@ async def profile_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     query = update.callback_query
     await query.answer()
     _, profile = query.data.split(":", 1)
-    if profile not in PROFILES:
+    try:
+        profile = ",".join(parse_profiles(profile, PROFILES))
+    except ValueError:
         await query.edit_message_text("Unknown profile.")
         return
 
@@ -66,7 +135,7 @@ async def profile_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -
     await asyncio.to_thread(
         set_user_profile, settings.sqlite_path, str(query.from_user.id), profile
     )
-    await query.edit_message_text(f"Profile set to {profile}.")
+    await query.edit_message_text(f"Profile set to {profile.replace(',', ', ')}.")
 
 
 async def handle_media(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -87,21 +156,86 @@ async def handle_media(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     settings = context.application.bot_data["settings"]
     uploads_dir = context.application.bot_data["uploads_dir"]
 
-    if media.file_size and media.file_size > settings.max_upload_mb * 1024 * 1024:
+    max_upload_mb = (
+        settings.telegram_local_max_mb
+        if settings.telegram_local_mode
+        else settings.max_upload_mb
+    )
+    if media.file_size and media.file_size > max_upload_mb * 1024 * 1024:
         await message.reply_text("File too large for this bot.")
         return
 
-    file = await context.bot.get_file(media.file_id)
+    if message.video and message.video.duration > settings.max_duration_seconds:
+        await message.reply_text("Video is too long for this bot.")
+        return
+
+    try:
+        await asyncio.to_thread(
+            check_free_space,
+            settings.storage_path,
+            settings.min_free_disk_mb,
+            0
+            if settings.telegram_local_mode
+            else media.file_size or max_upload_mb * 1024 * 1024,
+        )
+    except StorageFull:
+        await message.reply_text("The server is out of storage. Please try again later.")
+        return
+
+    try:
+        await asyncio.to_thread(
+            context.application.bot_data["eta_estimator"].check_admission,
+            settings.queue_wait_slo_seconds,
+        )
+    except QueueFull as exc:
+        await message.reply_text(
+            "The queue is full right now. "
+            f"Please try again in {format_wait(exc.retry_after)}."
+        )
+        return
+
     ext = safe_extension(getattr(media, "file_name", None)) or ".bin"
     input_path = uploads_dir / f"{generate_uuid()}{ext}"
+    input_owned = True
+
+    async with context.application.bot_data["download_semaphore"]:
+        file = await context.bot.get_file(media.file_id)
+        local_path = file.file_path if settings.telegram_local_mode else None
+        if local_path and os.path.isabs(local_path) and os.path.exists(local_path):
+            input_path = Path(
+                await asyncio.to_thread(
+                    adopt_local_file,
+                    local_path,
+                    input_path,
+                    settings.telegram_local_ingest,
+                )
+            )
+            input_owned = settings.telegram_local_ingest != "reference"
+        else:
+            await file.download_to_drive(custom_path=str(input_path))
+
+    try:
+        probe = await asyncio.to_thread(
+            probe_upload, str(input_path), settings.max_duration_seconds
+        )
+    except Exception as exc:
+        if input_owned:
+            input_path.unlink(missing_ok=True)
+        if isinstance(exc, MediaRejected):
+            await message.reply_text(f"Cannot process this file: {exc}.")
+        else:
+            await message.reply_text("Cannot read this video file.")
+        return
 
-    await file.download_to_drive(custom_path=str(input_path))
+    input_sha256 = await asyncio.to_thread(sha256_file, input_path)
 
     profile = await asyncio.to_thread(
         get_user_profile, settings.sqlite_path, str(message.from_user.id)
     )
-    if profile not in PROFILES:
-        profile = "balanced"
+    try:
+        profiles = parse_profiles(profile or "balanced", PROFILES)
+    except ValueError:
+        profiles = ["balanced"]
 
     job = await asyncio.to_thread(
         create_job,
@@ -110,26 +244,65 @@ async def handle_media(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
         user_id=str(message.from_user.id),
         chat_id=str(message.chat_id),
         input_path=str(input_path),
-        profile=profile,
+        input_owned=input_owned,
+        profile=profiles[0],
         input_bytes=media.file_size or 0,
+        input_sha256=input_sha256,
+        probe=probe,
+        policy=context.application.bot_data["scheduling_policy"],
+        profiles=profiles,
     )
 
+    await asyncio.to_thread(ring, settings.doorbell_path)
     logger.info("job_created", extra={"job_id": job["id"]})
-    await message.reply_text(
-        f"Job {job['id']} queued. Processing started.",
+    times = await asyncio.to_thread(
+        context.application.bot_data["eta_estimator"].job_times, job["id"], 0
     )
+    text = f"Job {job['id']} queued."
+    if times:
+        now = time.time()
+        text += (
+            f" Estimated start in {format_wait(times[0] - now)}, "
+            f"finish in {format_wait(times[1] - now)}."
+        )
+    await message.reply_text(text)
+
+
+async def start_delivery(application: Application) -> None:
+    sender = DeliverySender(application.bot_data["settings"])
+    application.bot_data["delivery_sender"] = sender
+    application.bot_data["delivery_task"] = asyncio.create_task(sender.run())
+
+
+async def stop_delivery(application: Application) -> None:
+    sender = application.bot_data.pop("delivery_sender", None)
+    task = application.bot_data.pop("delivery_task", None)
+    if sender is None:
+        return
+    sender.stop()
+    if task is not None:
+        await task
+    await sender.aclose()
 
 
-def main() -> None:
-    settings = load_settings()
-    if not settings.telegram_bot_token:
-        raise RuntimeError("TELEGRAM_BOT_TOKEN is required")
-
-    setup_logging()
+def build_application(settings) -> Application:
+    if settings.telegram_local_ingest not in LOCAL_INGEST_MODES:
+        raise RuntimeError(f"Unknown TELEGRAM_LOCAL_INGEST: {settings.telegram_local_ingest}")
     uploads_dir = Path(settings.storage_path) / "uploads"
     ensure_dir(uploads_dir)
 
-    builder = Application.builder().token(settings.telegram_bot_token)
+    builder = (
+        Application.builder()
+        .token(settings.telegram_bot_token)
+        .local_mode(settings.telegram_local_mode)
+        .concurrent_updates(
+            ChatUpdateProcessor(
+                settings.bot_concurrent_updates, settings.bot_fast_lane_concurrency
+            )
+        )
+        .post_init(start_delivery)
+        .post_shutdown(stop_delivery)
+    )
     if settings.telegram_api_base_url:
         builder = builder.base_url(settings.telegram_api_base_url)
     if settings.telegram_file_base_url:
@@ -137,14 +310,34 @@ def main() -> None:
     application = builder.build()
     application.bot_data["settings"] = settings
     application.bot_data["uploads_dir"] = uploads_dir
+    application.bot_data["scheduling_policy"] = get_policy(
+        settings.scheduler_policy, settings.scheduler_max_delay_seconds
+    )
+    application.bot_data["eta_estimator"] = EtaEstimator(
+        settings.sqlite_path, settings.progress_path
+    )
+    application.bot_data["download_semaphore"] = asyncio.Semaphore(
+        settings.bot_max_downloads
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("settings", settings_command))
+    application.add_handler(CommandHandler("cancel", cancel_command))
     application.add_handler(CallbackQueryHandler(profile_callback, pattern=r"^profile:"))
     application.add_handler(
         MessageHandler(filters.VIDEO | filters.Document.ALL, handle_media)
     )
+    return application
+
+
+def main() -> None:
+    settings = load_settings()
+    if not settings.telegram_bot_token:
+        raise RuntimeError("TELEGRAM_BOT_TOKEN is required")
+
+    setup_logging()
+    application = build_application(settings)
 
     if not settings.telegram_webhook_url:
         raise RuntimeError("TELEGRAM_WEBHOOK_URL is required for webhook mode")
@@ -0,0 +1,89 @@
+import argparse
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from app.db import connect, get_connection
+from app.jobs import create_job, get_job
+
+
+@contextmanager
+def _connect_per_call(sqlite_path: str):
+    conn = sqlite3.connect(sqlite_path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA foreign_keys=ON")
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _get_job(connector, sqlite_path: str, job_id: str) -> None:
+    with connector(sqlite_path) as conn:
+        conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def _update_job(connector, sqlite_path: str, job_id: str, value: int) -> None:
+    with connector(sqlite_path) as conn:
+        conn.execute("UPDATE jobs SET progress = ? WHERE id = ?", (value, job_id))
+
+
+def _measure(label: str, iterations: int, func) -> None:
+    start = time.perf_counter()
+    for index in range(iterations):
+        func(index)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {elapsed / iterations * 1_000_000:9.1f} us/op")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Connection-open overhead benchmark")
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite_path = str(Path(tmp) / "bench.sqlite")
+        sql = Path(__file__).with_name("init_db.sql").read_text(encoding="utf-8")
+        conn = get_connection(sqlite_path)
+        conn.executescript(sql)
+        conn.close()
+
+        job_id = create_job(
+            sqlite_path,
+            source="web",
+            user_id="bench",
+            chat_id=None,
+            input_path="/tmp/bench.mp4",
+            profile="balanced",
+            input_bytes=0,
+        )["id"]
+        assert get_job(sqlite_path, job_id)
+
+        _measure(
+            "get_job (connect per call)",
+            args.iterations,
+            lambda _: _get_job(_connect_per_call, sqlite_path, job_id),
+        )
+        _measure(
+            "get_job (pooled)",
+            args.iterations,
+            lambda _: _get_job(connect, sqlite_path, job_id),
+        )
+        _measure(
+            "update_job (connect per call)",
+            args.iterations,
+            lambda index: _update_job(_connect_per_call, sqlite_path, job_id, index % 100),
+        )
+        _measure(
+            "update_job (pooled)",
+            args.iterations,
+            lambda index: _update_job(connect, sqlite_path, job_id, index % 100),
+        )
+
+
+if __name__ == "__main__":
+    main()
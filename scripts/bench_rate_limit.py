@@ -0,0 +1,84 @@
+import argparse
+import tempfile
+import time
+import tracemalloc
+from collections import deque
+from pathlib import Path
+
+from webapi.rate_limit import RateLimiter, SQLiteRateLimiter
+
+
+class DequeRateLimiter:
+    def __init__(self, max_requests: int, window_seconds: int) -> None:
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self._events: dict[str, deque[float]] = {}
+
+    def allow(self, key: str) -> bool:
+        now = time.time()
+        bucket = self._events.setdefault(key, deque())
+        cutoff = now - self.window_seconds
+        while bucket and bucket[0] < cutoff:
+            bucket.popleft()
+        if len(bucket) >= self.max_requests:
+            return False
+        bucket.append(now)
+        return True
+
+
+def _keys(count: int) -> list[str]:
+    return [f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}" for index in range(count)]
+
+
+def _run(label: str, factory, keys: list[str], rounds: int) -> None:
+    limiter = factory()
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for key in keys:
+            limiter.allow(key)
+    elapsed = time.perf_counter() - start
+    calls = rounds * len(keys)
+
+    tracemalloc.start()
+    limiter = factory()
+    for key in keys:
+        limiter.allow(key)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(
+        f"{label:<14} {calls / elapsed:12,.0f} ops/s  "
+        f"{elapsed / calls * 1_000_000:7.2f} us/op  "
+        f"{retained / len(keys):7.0f} B/key in process"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rate limiter benchmark")
+    parser.add_argument("--keys", type=int, default=100_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=30)
+    args = parser.parse_args()
+
+    keys = _keys(args.keys)
+    print(f"{args.keys:,} distinct keys x {args.rounds} rounds, limit {args.limit}/min")
+    _run("deque (old)", lambda: DequeRateLimiter(args.limit, 60), keys, args.rounds)
+    _run(
+        "gcra memory",
+        lambda: RateLimiter(args.limit, 60, max_keys=args.keys * 2),
+        keys,
+        args.rounds,
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = iter(range(2))
+        _run(
+            "gcra sqlite",
+            lambda: SQLiteRateLimiter(
+                str(Path(tmp) / f"ratelimit-{next(paths)}.sqlite"), args.limit, 60
+            ),
+            keys,
+            args.rounds,
+        )
+
+
+if __name__ == "__main__":
+    main()
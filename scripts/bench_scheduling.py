@@ -0,0 +1,96 @@
+import argparse
+import heapq
+import random
+from dataclasses import dataclass
+
+from app.scheduling import POLICIES, SchedulingPolicy, estimate_cost, get_policy
+
+
+@dataclass
+class SimJob:
+    arrival: float
+    user: str
+    profile: str
+    duration: float
+    heavy: bool
+
+
+def build_trace(seed: int, hours: float, rate_per_min: float, dumps: int) -> list[SimJob]:
+    rng = random.Random(seed)
+    jobs = []
+    now = 0.0
+    end = hours * 3600
+    while now < end:
+        now += rng.expovariate(rate_per_min / 60)
+        profile = rng.choices(["small", "balanced", "hq"], weights=[3, 5, 2])[0]
+        duration = min(900.0, rng.lognormvariate(4.0, 1.0))
+        jobs.append(SimJob(now, f"user-{rng.randrange(500)}", profile, duration, False))
+    for dump in range(dumps):
+        start = rng.uniform(0, end * 0.5)
+        for index in range(50):
+            jobs.append(SimJob(start + index, f"heavy-{dump}", "hq", 900.0, True))
+    jobs.sort(key=lambda job: job.arrival)
+    return jobs
+
+
+def simulate(policy: SchedulingPolicy, jobs: list[SimJob], workers: int, speed: float) -> list[tuple[float, bool]]:
+    user_finish: dict[str, float] = {}
+    ready: list[tuple[float, int, SimJob]] = []
+    free_at = [0.0] * workers
+    heapq.heapify(free_at)
+    waits = []
+    index = 0
+    while index < len(jobs) or ready:
+        worker_free = heapq.heappop(free_at)
+        while index < len(jobs) and (jobs[index].arrival <= worker_free or not ready):
+            job = jobs[index]
+            cost = estimate_cost(job.duration, job.profile)
+            key, finish = policy.schedule(job.arrival, cost, user_finish.get(job.user))
+            if finish is not None:
+                user_finish[job.user] = finish
+            heapq.heappush(ready, (key, index, job))
+            index += 1
+        _, _, job = heapq.heappop(ready)
+        start = max(worker_free, job.arrival)
+        waits.append((start - job.arrival, job.heavy))
+        heapq.heappush(free_at, start + estimate_cost(job.duration, job.profile) / speed)
+    return waits
+
+
+def percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Queue wait simulation per scheduling policy")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--hours", type=float, default=8)
+    parser.add_argument("--rate", type=float, default=2.0, help="light-user jobs per minute")
+    parser.add_argument("--dumps", type=int, default=3, help="users dumping 50 long HQ jobs")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--speed", type=float, default=1.0, help="encode speed factor")
+    parser.add_argument("--max-delay", type=float, default=None, help="aging bound in seconds")
+    args = parser.parse_args()
+
+    jobs = build_trace(args.seed, args.hours, args.rate, args.dumps)
+    print(
+        f"{len(jobs)} jobs, {args.workers} workers, {args.dumps} bulk uploaders; "
+        "queue wait in seconds"
+    )
+    print(f"{'policy':<10} {'p50':>8} {'p99':>8} {'light p50':>10} {'light p99':>10} {'max':>8}")
+    for name in POLICIES:
+        policy = get_policy(name, args.max_delay)
+        waits = simulate(policy, jobs, args.workers, args.speed)
+        everything = [wait for wait, _ in waits]
+        light = [wait for wait, heavy in waits if not heavy]
+        print(
+            f"{name:<10} {percentile(everything, 50):8.0f} {percentile(everything, 99):8.0f} "
+            f"{percentile(light, 50):10.0f} {percentile(light, 99):10.0f} {max(everything):8.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,42 @@
 from pathlib import Path
 
 from app.config import load_settings
-from app.db import get_connection
+from app.db import ensure_columns, get_connection
+
+COLUMNS = {
+    "jobs": {
+        "input_sha256": "TEXT",
+        "probe_json": "TEXT",
+        "sched_key": "REAL",
+        "encoder_preset": "TEXT",
+        "encode_mode": "TEXT",
+        "target_bytes": "INTEGER",
+        "delivery_status": "TEXT",
+        "worker_id": "TEXT",
+        "lease_expires_at": "REAL",
+        "attempts": "INTEGER NOT NULL DEFAULT 0",
+        "metrics_json": "TEXT",
+        "last_polled_at": "TEXT",
+        "profiles": "TEXT",
+        "input_owned": "INTEGER NOT NULL DEFAULT 1",
+    },
+    "upload_sessions": {
+        "target_bytes": "INTEGER",
+    },
+}
+
+BACKFILL = [
+    """
+    UPDATE jobs
+    SET sched_key = CAST(strftime('%s', substr(created_at, 1, 19)) AS REAL)
+    WHERE sched_key IS NULL
+    """,
+    """
+    UPDATE jobs
+    SET lease_expires_at = 0
+    WHERE status = 'processing' AND lease_expires_at IS NULL
+    """,
+]
 
 
 def main() -> None:
@@ -13,7 +48,12 @@ def main() -> None:
     sql = sql_path.read_text(encoding="utf-8")
 
     conn = get_connection(str(sqlite_path))
+    for table, columns in COLUMNS.items():
+        ensure_columns(conn, table, columns)
     conn.executescript(sql)
+    for statement in BACKFILL:
+        conn.execute(statement)
+    conn.commit()
     conn.close()
     print(f"Initialized database at {sqlite_path}")
 
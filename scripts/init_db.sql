@@ -14,15 +14,105 @@ CREATE TABLE IF NOT EXISTS jobs (
     created_at TEXT NOT NULL,
     updated_at TEXT NOT NULL,
     error_message TEXT,
-    download_token TEXT NOT NULL
+    download_token TEXT NOT NULL,
+    input_sha256 TEXT,
+    probe_json TEXT,
+    sched_key REAL,
+    encoder_preset TEXT,
+    encode_mode TEXT,
+    target_bytes INTEGER,
+    delivery_status TEXT,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    metrics_json TEXT,
+    last_polled_at TEXT,
+    profiles TEXT,
+    -- 0 when input_path belongs to someone else (a referenced Bot API file)
+    -- and must never be deleted.
+    input_owned INTEGER NOT NULL DEFAULT 1
 );
 
 CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at);
 CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs(user_id);
 CREATE INDEX IF NOT EXISTS idx_jobs_download_token ON jobs(download_token);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_sched ON jobs(status, sched_key);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs(status, updated_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_lease ON jobs(status, lease_expires_at);
+
+CREATE TABLE IF NOT EXISTS job_outputs (
+    job_id TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    output_bytes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (job_id, profile)
+);
+
+CREATE TABLE IF NOT EXISTS user_schedule (
+    user_id TEXT PRIMARY KEY,
+    finish_tag REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS output_cache (
+    content_hash TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    output_path TEXT NOT NULL,
+    output_bytes INTEGER NOT NULL DEFAULT 0,
+    duration_seconds INTEGER DEFAULT 0,
+    created_at TEXT NOT NULL,
+    last_used_at TEXT NOT NULL,
+    PRIMARY KEY (content_hash, profile)
+);
+
+CREATE INDEX IF NOT EXISTS idx_output_cache_last_used ON output_cache(last_used_at);
 
 CREATE TABLE IF NOT EXISTS user_settings (
     user_id TEXT PRIMARY KEY,
     profile TEXT NOT NULL,
     updated_at TEXT NOT NULL
-);
\ No newline at end of file
+);
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id TEXT PRIMARY KEY,
+    client_id TEXT,
+    filename TEXT,
+    input_path TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    target_bytes INTEGER,
+    received INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_upload_sessions_updated ON upload_sessions(updated_at);
+
+CREATE TABLE IF NOT EXISTS deliveries (
+    id INTEGER PRIMARY KEY,
+    job_id TEXT NOT NULL,
+    chat_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_deliveries_due ON deliveries(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_deliveries_job ON deliveries(job_id);
+
+CREATE TABLE IF NOT EXISTS metric_histograms (
+    name TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    le REAL NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    total REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (name, profile, le)
+);
+
+CREATE TABLE IF NOT EXISTS workers (
+    id TEXT PRIMARY KEY,
+    slots INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
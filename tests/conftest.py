@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+
+import pytest
+
+from app.db import get_connection
+
+
+@pytest.fixture
+def sqlite_path(tmp_path: Path) -> str:
+    root = Path(__file__).resolve().parents[1]
+    sql = (root / "scripts" / "init_db.sql").read_text(encoding="utf-8")
+    path = tmp_path / "jobs.sqlite"
+    conn = get_connection(str(path))
+    conn.executescript(sql)
+    conn.close()
+    return str(path)
+
+
+def _fake_result(api: "FakeBotApi", method: str, params: dict) -> dict:
+    if method == "getMe":
+        return {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+    if method == "getFile":
+        file_id = params.get("file_id", "file")
+        return {
+            "file_id": file_id,
+            "file_unique_id": file_id,
+            "file_size": 16,
+            "file_path": api.file_paths.get(file_id, f"videos/{file_id}.mp4"),
+        }
+    if method == "sendMessage":
+        return {
+            "message_id": 1,
+            "date": 0,
+            "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+            "text": params.get("text", ""),
+        }
+    return {}
+
+
+class FakeBotApi:
+    def __init__(self) -> None:
+        self.calls: list[tuple[str, bytes]] = []
+        self.messages: list[tuple[str, str, float]] = []
+        self.downloads: dict[str, tuple[float, float]] = {}
+        self.file_paths: dict[str, str] = {}
+        self.responses: dict[str, list[tuple[int, dict]]] = {}
+        self.delay = 0.0
+        self.file_delay = 0.0
+        self.active = 0
+        self.max_active = 0
+        self.active_downloads = 0
+        self.max_active_downloads = 0
+        self.lock = threading.Lock()
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self) -> None:
+                started = time.monotonic()
+                with api.lock:
+                    api.active_downloads += 1
+                    api.max_active_downloads = max(
+                        api.max_active_downloads, api.active_downloads
+                    )
+                time.sleep(api.file_delay)
+                with api.lock:
+                    api.active_downloads -= 1
+                    api.downloads[self.path.rsplit("/", 1)[-1]] = (started, time.monotonic())
+                self._reply(200, b"\x00" * 16, "video/mp4")
+
+            def do_POST(self) -> None:
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                method = self.path.rsplit("/", 1)[-1]
+                params = {}
+                if "form-urlencoded" in (self.headers.get("Content-Type") or ""):
+                    params = {
+                        key: values[0] for key, values in parse_qs(body.decode()).items()
+                    }
+                with api.lock:
+                    api.calls.append((method, body))
+                    if method == "sendMessage":
+                        api.messages.append(
+                            (params.get("chat_id"), params.get("text"), time.monotonic())
+                        )
+                    api.active += 1
+                    api.max_active = max(api.max_active, api.active)
+                    queued = api.responses.get(method) or []
+                    if queued:
+                        status, payload = queued.pop(0)
+                    else:
+                        status, payload = 200, {"ok": True, "result": _fake_result(api, method, params)}
+                time.sleep(api.delay)
+                with api.lock:
+                    api.active -= 1
+                self._reply(status, json.dumps(payload).encode(), "application/json")
+
+            def _reply(self, status: int, data: bytes, content_type: str) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        root = f"http://127.0.0.1:{self.server.server_port}"
+        self.base_url = f"{root}/bot"
+        self.file_base_url = f"{root}/file/bot"
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def bot_api():
+    api = FakeBotApi()
+    yield api
+    api.close()
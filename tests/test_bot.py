@@ -0,0 +1,209 @@
+import asyncio
+import dataclasses
+import time
+from pathlib import Path
+
+from telegram import Update
+
+from app.config import load_settings
+from app.db import connect
+from app.jobs import create_job, get_job
+from app.utils import adopt_local_file
+from bot import main as bot_main
+from bot.main import build_application
+
+
+def _settings(sqlite_path: str, tmp_path: Path, bot_api):
+    return dataclasses.replace(
+        load_settings(),
+        telegram_bot_token="TOKEN",
+        telegram_api_base_url=bot_api.base_url,
+        telegram_file_base_url=bot_api.file_base_url,
+        sqlite_path=sqlite_path,
+        storage_path=str(tmp_path / "storage"),
+        doorbell_path=str(tmp_path / "doorbell"),
+        min_free_disk_mb=0,
+        bot_concurrent_updates=16,
+        bot_fast_lane_concurrency=8,
+        bot_max_downloads=2,
+    )
+
+
+def _message(update_id: int, chat_id: int, **fields) -> dict:
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": chat_id, "is_bot": False, "first_name": "User"},
+            **fields,
+        },
+    }
+
+
+def _upload(update_id: int, chat_id: int) -> dict:
+    return _message(
+        update_id,
+        chat_id,
+        document={
+            "file_id": f"file{update_id}",
+            "file_unique_id": f"file{update_id}",
+            "file_name": "clip.mp4",
+            "mime_type": "video/mp4",
+            "file_size": 16,
+        },
+    )
+
+
+def _command(update_id: int, chat_id: int, command: str) -> dict:
+    return _message(
+        update_id,
+        chat_id,
+        text=command,
+        entities=[
+            {"type": "bot_command", "offset": 0, "length": len(command.split()[0])}
+        ],
+    )
+
+
+async def _run(settings, bot_api, payloads: list[dict], expected_replies: int) -> dict:
+    application = build_application(settings)
+    await application.initialize()
+    await application.start()
+    queued_at = {}
+    try:
+        for payload in payloads:
+            update = Update.de_json(payload, application.bot)
+            queued_at[payload["update_id"]] = time.monotonic()
+            await application.update_queue.put(update)
+        deadline = time.monotonic() + 10
+        while len(bot_api.messages) < expected_replies and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+    finally:
+        await application.stop()
+        await application.shutdown()
+    return queued_at
+
+
+def test_commands_bypass_busy_uploads(sqlite_path: str, tmp_path: Path, bot_api) -> None:
+    bot_api.file_delay = 0.4
+    settings = _settings(sqlite_path, tmp_path, bot_api)
+    uploads = [_upload(index, 100 + index) for index in range(1, 7)]
+    commands = [_command(20, 200, "/start"), _command(21, 101, "/help")]
+
+    queued_at = asyncio.run(_run(settings, bot_api, uploads + commands, 8))
+
+    replies = {chat_id: sent for chat_id, text, sent in bot_api.messages if "/settings" in text}
+    command_latency = replies["200"] - queued_at[20]
+    own_chat_latency = replies["101"] - queued_at[21]
+    assert command_latency < 0.3
+    assert own_chat_latency < 0.3
+    assert len(bot_api.messages) == 8
+    assert bot_api.max_active_downloads == 2
+
+
+def test_uploads_from_one_chat_stay_ordered(
+    sqlite_path: str, tmp_path: Path, bot_api
+) -> None:
+    bot_api.file_delay = 0.2
+    settings = _settings(sqlite_path, tmp_path, bot_api)
+    uploads = [_upload(1, 300), _upload(2, 300), _upload(3, 301)]
+
+    asyncio.run(_run(settings, bot_api, uploads, 3))
+
+    first = bot_api.downloads["file1.mp4"]
+    second = bot_api.downloads["file2.mp4"]
+    other = bot_api.downloads["file3.mp4"]
+    assert second[0] >= first[1]
+    assert other[0] < first[1]
+
+
+def test_local_mode_links_file_instead_of_downloading(
+    sqlite_path: str, tmp_path: Path, bot_api, monkeypatch
+) -> None:
+    server_dir = tmp_path / "bot-api" / "videos"
+    server_dir.mkdir(parents=True)
+    server_file = server_dir / "file1.mp4"
+    server_file.write_bytes(b"\x00" * 64)
+    bot_api.file_paths["file1"] = str(server_file)
+    settings = dataclasses.replace(
+        _settings(sqlite_path, tmp_path, bot_api), telegram_local_mode=True
+    )
+    monkeypatch.setattr(
+        bot_main,
+        "probe_upload",
+        lambda path, max_duration: {"has_video": True, "duration": 5.0},
+    )
+
+    asyncio.run(_run(settings, bot_api, [_upload(1, 400)], 1))
+
+    assert bot_api.downloads == {}
+    with connect(sqlite_path) as conn:
+        job = conn.execute("SELECT input_path FROM jobs").fetchone()
+    input_path = Path(job["input_path"])
+    assert input_path.parent == Path(settings.storage_path) / "uploads"
+    assert input_path.stat().st_ino == server_file.stat().st_ino
+
+
+def test_adopt_local_file_modes(tmp_path: Path) -> None:
+    src = tmp_path / "src.mp4"
+    src.write_bytes(b"data")
+    assert adopt_local_file(src, tmp_path / "ref.mp4", "reference") == str(src)
+    assert adopt_local_file(src, tmp_path / "link.mp4", "link") == str(tmp_path / "link.mp4")
+    assert src.exists()
+    assert adopt_local_file(src, tmp_path / "moved.mp4", "move") == str(tmp_path / "moved.mp4")
+    assert not src.exists()
+    assert (tmp_path / "moved.mp4").read_bytes() == b"data"
+
+
+def test_cancel_command_cancels_latest_job(
+    sqlite_path: str, tmp_path: Path, bot_api
+) -> None:
+    settings = _settings(sqlite_path, tmp_path, bot_api)
+    job_ids = [
+        create_job(
+            sqlite_path,
+            source="telegram",
+            user_id="500",
+            chat_id="500",
+            input_path=str(tmp_path / f"in{index}.mp4"),
+            profile="balanced",
+            input_bytes=1,
+        )["id"]
+        for index in range(2)
+    ]
+    commands = [_command(1, 500, "/cancel"), _command(2, 501, f"/cancel {job_ids[0]}")]
+
+    asyncio.run(_run(settings, bot_api, commands, 2))
+
+    replies = {chat_id: text for chat_id, text, _ in bot_api.messages}
+    assert replies["500"] == f"Job {job_ids[1]} cancelled."
+    assert replies["501"] == "Job not found."
+    assert get_job(sqlite_path, job_ids[0])["status"] == "queued"
+    assert get_job(sqlite_path, job_ids[1])["status"] == "cancelled"
+
+
+def test_upload_reply_reports_eta_and_rejects_over_slo(
+    sqlite_path: str, tmp_path: Path, bot_api, monkeypatch
+) -> None:
+    settings = dataclasses.replace(
+        _settings(sqlite_path, tmp_path, bot_api), queue_wait_slo_seconds=600
+    )
+    monkeypatch.setattr(
+        bot_main,
+        "probe_upload",
+        lambda path, max_duration: {"has_video": True, "duration": 1000.0},
+    )
+
+    asyncio.run(_run(settings, bot_api, [_upload(1, 600)], 1))
+    asyncio.run(_run(settings, bot_api, [_upload(2, 601)], 2))
+
+    replies = {chat_id: text for chat_id, text, _ in bot_api.messages}
+    assert replies["600"].endswith(
+        "queued. Estimated start in under a minute, finish in about 12 min."
+    )
+    assert replies["601"] == (
+        "The queue is full right now. Please try again in about 2 min."
+    )
+    assert list(bot_api.downloads) == ["file1.mp4"]
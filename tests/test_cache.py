@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from app.cache import evict_cached_outputs, get_cached_output, put_cached_output
+from app.db import connect
+
+
+def _put(sqlite_path: str, tmp_path: Path, content_hash: str, size: int) -> Path:
+    path = tmp_path / f"{content_hash}.mp4"
+    path.write_bytes(b"x" * size)
+    put_cached_output(
+        sqlite_path,
+        content_hash=content_hash,
+        profile="balanced",
+        output_path=str(path),
+        output_bytes=size,
+        duration_seconds=10,
+    )
+    return path
+
+
+def test_cache_roundtrip(sqlite_path: str, tmp_path: Path) -> None:
+    path = _put(sqlite_path, tmp_path, "abc", 10)
+    cached = get_cached_output(sqlite_path, "abc", "balanced")
+    assert cached is not None
+    assert cached["output_path"] == str(path)
+    assert get_cached_output(sqlite_path, "abc", "hq") is None
+
+
+def test_cache_evicts_least_recently_used(sqlite_path: str, tmp_path: Path) -> None:
+    first = _put(sqlite_path, tmp_path, "first", 40)
+    second = _put(sqlite_path, tmp_path, "second", 40)
+    third = _put(sqlite_path, tmp_path, "third", 40)
+
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            "UPDATE output_cache SET last_used_at = '2000-01-01T00:00:00Z' "
+            "WHERE content_hash = 'second'"
+        )
+
+    removed = evict_cached_outputs(sqlite_path, 80)
+    assert removed == [str(second)]
+    assert not second.exists()
+    assert first.exists() and third.exists()
+    assert get_cached_output(sqlite_path, "second", "balanced") is None
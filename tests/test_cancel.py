@@ -0,0 +1,174 @@
+import dataclasses
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from app.config import load_settings
+from app.db import connect
+from app.deliveries import get_deliveries
+from app.jobs import cancel_job, create_job, get_job, lock_next_job
+from app.lifecycle import cancel_abandoned_jobs, discard_cancelled
+from worker import main as worker_main
+from worker.ffmpeg import run_ffmpeg
+from worker.slots import plan_slots, run_slots
+
+# Stands in for a long ffmpeg run: records its pid, then reports progress
+# until it is terminated.
+SLOW_FFMPEG = """
+import sys, time
+open(sys.argv[1], "w").write(str(__import__("os").getpid()))
+open(sys.argv[2], "wb").write(b"partial")
+while True:
+    print("out_time_ms=1000000\\nprogress=continue", flush=True)
+    time.sleep(0.1)
+"""
+
+
+def _settings(sqlite_path: str, tmp_path: Path):
+    storage_path = tmp_path / "storage"
+    for name in ("uploads", "outputs", "progress", "doorbell"):
+        (storage_path / name).mkdir(parents=True, exist_ok=True)
+    return dataclasses.replace(
+        load_settings(),
+        sqlite_path=sqlite_path,
+        storage_path=str(storage_path),
+        progress_path=str(storage_path / "progress"),
+        doorbell_path=str(storage_path / "doorbell"),
+        cache_max_mb=0,
+        delete_inputs_on_completion=True,
+        job_lease_seconds=30,
+        worker_poll_max_seconds=1,
+        worker_shutdown_grace_seconds=5,
+    )
+
+
+def _create_job(settings, name: str, source: str = "web") -> dict:
+    input_path = Path(settings.storage_path) / "uploads" / f"{name}.mp4"
+    input_path.write_bytes(b"input")
+    job = create_job(
+        settings.sqlite_path,
+        source=source,
+        user_id="1",
+        chat_id="1" if source == "telegram" else None,
+        input_path=str(input_path),
+        profile="balanced",
+        input_bytes=5,
+        probe={"duration": 10.0, "has_video": True, "width": 640, "height": 360},
+    )
+    return {**job, "input_path": str(input_path)}
+
+
+def test_cancel_queued_job_removes_input(sqlite_path: str, tmp_path: Path) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    job = _create_job(settings, "queued")
+
+    cancelled = cancel_job(sqlite_path, job["id"])
+    discard_cancelled([cancelled], delete_inputs=True)
+
+    assert get_job(sqlite_path, job["id"])["status"] == "cancelled"
+    assert not os.path.exists(job["input_path"])
+    assert cancel_job(sqlite_path, job["id"]) is None
+
+
+def test_cancel_abandoned_web_jobs(sqlite_path: str, tmp_path: Path) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    stale = _create_job(settings, "stale")
+    polled = _create_job(settings, "polled")
+    bot_job = _create_job(settings, "bot", source="telegram")
+    with connect(sqlite_path) as conn:
+        conn.execute("UPDATE jobs SET created_at = '2000-01-01T00:00:00Z'")
+        conn.execute(
+            "UPDATE jobs SET last_polled_at = '2999-01-01T00:00:00Z' WHERE id = ?",
+            (polled["id"],),
+        )
+
+    cancelled = cancel_abandoned_jobs(sqlite_path, 600)
+
+    assert [job["id"] for job in cancelled] == [stale["id"]]
+    assert get_job(sqlite_path, polled["id"])["status"] == "queued"
+    assert get_job(sqlite_path, bot_job["id"])["status"] == "queued"
+
+
+def test_cancel_kills_running_ffmpeg_and_frees_slot(
+    sqlite_path: str, tmp_path: Path, monkeypatch
+) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    slow = _create_job(settings, "slow")
+    fast = _create_job(settings, "fast")
+    pid_path = tmp_path / "ffmpeg.pid"
+
+    def fake_encode_job(
+        job, input_path, output_path, probe, settings, on_progress, *args, **kwargs
+    ):
+        if job["id"] == fast["id"]:
+            Path(output_path).write_bytes(b"encoded")
+            return "encode", "medium", {}
+        cmd = [sys.executable, "-c", SLOW_FFMPEG, str(pid_path), output_path]
+        return "encode", "medium", run_ffmpeg(cmd, 10.0, on_progress, kwargs["abort"])
+
+    monkeypatch.setattr(worker_main, "encode_job", fake_encode_job)
+    stop = threading.Event()
+    abort = threading.Event()
+    runner = threading.Thread(
+        target=run_slots,
+        args=(plan_slots(1, 1, False), settings, worker_main.process_job, stop, abort),
+    )
+    runner.start()
+    try:
+        deadline = time.monotonic() + 10
+        while not (pid_path.exists() and pid_path.read_text()):
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        pid = int(pid_path.read_text())
+        assert get_job(sqlite_path, slow["id"])["status"] == "processing"
+
+        cancelled_at = time.monotonic()
+        assert cancel_job(sqlite_path, slow["id"])["worker_id"]
+        while get_job(sqlite_path, fast["id"])["status"] != "done":
+            assert time.monotonic() - cancelled_at < 5
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        runner.join(10)
+
+    job = get_job(sqlite_path, slow["id"])
+    assert job["status"] == "cancelled"
+    output_path = Path(settings.storage_path) / "outputs" / f"{slow['id']}.mp4"
+    assert not output_path.exists()
+    assert not os.path.exists(slow["input_path"])
+    try:
+        os.kill(pid, 0)
+        alive = True
+    except ProcessLookupError:
+        alive = False
+    assert not alive
+
+
+def test_cancelled_job_is_not_finished_by_early_paths(
+    sqlite_path: str, tmp_path: Path, monkeypatch
+) -> None:
+    settings = dataclasses.replace(
+        _settings(sqlite_path, tmp_path), max_duration_seconds=5
+    )
+    cached = _create_job(settings, "cached", source="telegram")
+    too_long = _create_job(settings, "long")
+
+    def fake_restore(job, settings, outputs):
+        if job["id"] != cached["id"]:
+            return None
+        for output_path in outputs.values():
+            Path(output_path).write_bytes(b"cached")
+        return 10
+
+    monkeypatch.setattr(worker_main, "restore_job_outputs", fake_restore)
+    for job in (cached, too_long):
+        claimed = lock_next_job(sqlite_path, "host-1-0")
+        cancel_job(sqlite_path, job["id"])
+        worker_main.process_job(claimed, settings)
+
+        assert get_job(sqlite_path, job["id"])["status"] == "cancelled"
+        assert not os.path.exists(job["input_path"])
+    assert get_deliveries(sqlite_path, cached["id"]) == []
+    assert not any((Path(settings.storage_path) / "outputs").iterdir())
@@ -1,6 +1,8 @@
+import json
+import threading
 from pathlib import Path
 
-from app.db import get_connection
+from app.db import connect, get_connection, get_pooled_connection
 from app.jobs import create_job, get_job
 
 
@@ -29,4 +31,60 @@ def test_create_job(tmp_path: Path) -> None:
     fetched = get_job(str(sqlite_path), job["id"])
     assert fetched is not None
     assert fetched["id"] == job["id"]
-    assert fetched["status"] == "queued"
\ No newline at end of file
+    assert fetched["status"] == "queued"
+
+
+def test_create_job_stores_probe(tmp_path: Path) -> None:
+    sqlite_path = tmp_path / "jobs.sqlite"
+    init_db(sqlite_path)
+
+    probe = {"has_video": True, "duration": 61.5, "width": 1280, "height": 720}
+    job = create_job(
+        str(sqlite_path),
+        source="web",
+        user_id="127.0.0.1",
+        chat_id=None,
+        input_path="/tmp/input.mp4",
+        profile="balanced",
+        input_bytes=123,
+        probe=probe,
+    )
+
+    fetched = get_job(str(sqlite_path), job["id"])
+    assert fetched["duration_seconds"] == 61
+    assert json.loads(fetched["probe_json"]) == probe
+
+
+def test_connect_reuses_connection_per_thread(tmp_path: Path) -> None:
+    sqlite_path = str(tmp_path / "jobs.sqlite")
+    init_db(Path(sqlite_path))
+
+    with connect(sqlite_path) as first:
+        pass
+    with connect(sqlite_path) as second:
+        pass
+    assert first is second
+    assert second.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+    other: list = []
+    thread = threading.Thread(target=lambda: other.append(get_pooled_connection(sqlite_path)))
+    thread.start()
+    thread.join()
+    assert other[0] is not first
+
+
+def test_connect_rolls_back_on_error(tmp_path: Path) -> None:
+    sqlite_path = str(tmp_path / "jobs.sqlite")
+    init_db(Path(sqlite_path))
+
+    try:
+        with connect(sqlite_path) as conn:
+            conn.execute(
+                "INSERT INTO user_settings (user_id, profile, updated_at) VALUES ('u', 'hq', 'now')"
+            )
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+
+    with connect(sqlite_path) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM user_settings").fetchone()[0] == 0
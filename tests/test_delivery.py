@@ -0,0 +1,182 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import unquote_plus
+
+from app.db import connect
+from app.deliveries import delivery_doorbell_path, enqueue_delivery, get_deliveries
+from app.doorbell import ring
+from app.jobs import create_job, get_job, save_job_outputs, update_job
+from bot.delivery import DeliverySender
+
+
+def _settings(sqlite_path: str, tmp_path: Path, bot_api) -> SimpleNamespace:
+    return SimpleNamespace(
+        sqlite_path=sqlite_path,
+        doorbell_path=str(tmp_path / "doorbell"),
+        base_url="http://example.test",
+        telegram_api_base_url=bot_api.base_url,
+        telegram_bot_token="TOKEN",
+        delivery_concurrency=2,
+        delivery_max_attempts=3,
+        delivery_backoff_seconds=1,
+        delivery_poll_seconds=0.05,
+    )
+
+
+def _done_job(sqlite_path: str, tmp_path: Path, kind: str = "video") -> str:
+    output_path = tmp_path / "out.mp4"
+    output_path.write_bytes(b"\x00" * 1024)
+    job = create_job(
+        sqlite_path,
+        source="telegram",
+        user_id="1",
+        chat_id="42",
+        input_path=str(tmp_path / "in.mp4"),
+        profile="balanced",
+        input_bytes=1,
+    )
+    update_job(sqlite_path, job["id"], status="done", output_path=str(output_path))
+    enqueue_delivery(sqlite_path, job["id"], "42", kind)
+    return job["id"]
+
+
+async def _drain(sender: DeliverySender) -> None:
+    await sender.run_once()
+    await asyncio.gather(*sender.inflight)
+
+
+def test_sender_delivers_video(sqlite_path: str, tmp_path: Path, bot_api) -> None:
+    job_id = _done_job(sqlite_path, tmp_path)
+
+    async def run() -> None:
+        sender = DeliverySender(_settings(sqlite_path, tmp_path, bot_api))
+        await _drain(sender)
+        await sender.aclose()
+
+    asyncio.run(run())
+    assert [method for method, _ in bot_api.calls] == ["sendVideo"]
+    assert b'name="chat_id"' in bot_api.calls[0][1]
+    assert b"video/mp4\r\n\r\n" + b"\x00" * 1024 + b"\r\n--" in bot_api.calls[0][1]
+    job = get_job(sqlite_path, job_id)
+    assert job["delivery_status"] == "sent"
+    assert json.loads(job["metrics_json"])["notify_seconds"] >= 0
+
+
+def test_sender_respects_retry_after(sqlite_path: str, tmp_path: Path, bot_api) -> None:
+    job_id = _done_job(sqlite_path, tmp_path)
+    bot_api.responses["sendVideo"] = [
+        (429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 30}})
+    ]
+
+    async def run() -> None:
+        sender = DeliverySender(_settings(sqlite_path, tmp_path, bot_api))
+        await _drain(sender)
+        [delivery] = get_deliveries(sqlite_path, job_id)
+        assert delivery["status"] == "pending"
+        assert delivery["attempts"] == 0
+        assert delivery["next_attempt_at"] >= time.time() + 25
+        assert await sender.run_once() == 0
+
+        with connect(sqlite_path) as conn:
+            conn.execute("UPDATE deliveries SET next_attempt_at = 0")
+        await _drain(sender)
+        await sender.aclose()
+
+    asyncio.run(run())
+    assert len(bot_api.calls) == 2
+    assert get_job(sqlite_path, job_id)["delivery_status"] == "sent"
+
+
+def test_sender_falls_back_to_link(sqlite_path: str, tmp_path: Path, bot_api) -> None:
+    job_id = _done_job(sqlite_path, tmp_path)
+    bot_api.responses["sendVideo"] = [
+        (400, {"ok": False, "error_code": 400, "description": "Request Entity Too Large"})
+    ]
+
+    async def run() -> None:
+        sender = DeliverySender(_settings(sqlite_path, tmp_path, bot_api))
+        await _drain(sender)
+        await _drain(sender)
+        await sender.aclose()
+
+    asyncio.run(run())
+    assert [method for method, _ in bot_api.calls] == ["sendVideo", "sendMessage"]
+    assert f"/api/download/{job_id}" in unquote_plus(bot_api.calls[1][1].decode())
+    assert get_job(sqlite_path, job_id)["delivery_status"] == "link_sent"
+
+
+def test_link_fallback_gets_its_own_attempts(
+    sqlite_path: str, tmp_path: Path, bot_api
+) -> None:
+    job_id = _done_job(sqlite_path, tmp_path)
+    server_error = (500, {"ok": False, "error_code": 500, "description": "Internal"})
+    bot_api.responses["sendVideo"] = [server_error] * 3
+    bot_api.responses["sendMessage"] = [server_error]
+
+    async def run() -> None:
+        sender = DeliverySender(_settings(sqlite_path, tmp_path, bot_api))
+        for _ in range(5):
+            await _drain(sender)
+            with connect(sqlite_path) as conn:
+                conn.execute("UPDATE deliveries SET next_attempt_at = 0")
+        await sender.aclose()
+
+    asyncio.run(run())
+    assert [method for method, _ in bot_api.calls] == ["sendVideo"] * 3 + [
+        "sendMessage"
+    ] * 2
+    assert get_job(sqlite_path, job_id)["delivery_status"] == "link_sent"
+
+
+def test_sender_lists_ladder_outputs(sqlite_path: str, tmp_path: Path, bot_api) -> None:
+    job_id = _done_job(sqlite_path, tmp_path, kind="outputs")
+    save_job_outputs(
+        sqlite_path,
+        job_id,
+        [
+            {"profile": "small", "output_path": "s.mp4", "output_bytes": 1024 * 1024},
+            {"profile": "hq", "output_path": "h.mp4", "output_bytes": 3 * 1024 * 1024},
+        ],
+    )
+
+    async def run() -> None:
+        sender = DeliverySender(_settings(sqlite_path, tmp_path, bot_api))
+        await _drain(sender)
+        await sender.aclose()
+
+    asyncio.run(run())
+    text = unquote_plus(bot_api.calls[0][1].decode())
+    assert f"small (1.0 MB): http://example.test/api/download/{job_id}" in text
+    assert "&profile=hq" in text
+    assert get_job(sqlite_path, job_id)["delivery_status"] == "link_sent"
+
+
+def test_sender_run_bounds_concurrency(sqlite_path: str, tmp_path: Path, bot_api) -> None:
+    bot_api.delay = 0.1
+    settings = _settings(sqlite_path, tmp_path, bot_api)
+
+    async def run() -> list[str]:
+        sender = DeliverySender(settings)
+        task = asyncio.create_task(sender.run())
+        await asyncio.sleep(0.05)
+        job_ids = [_done_job(sqlite_path, tmp_path, kind="link") for _ in range(5)]
+        ring(delivery_doorbell_path(settings.doorbell_path))
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            statuses = {get_job(sqlite_path, job_id)["delivery_status"] for job_id in job_ids}
+            if statuses == {"link_sent"}:
+                break
+            await asyncio.sleep(0.02)
+        sender.stop()
+        await task
+        await sender.aclose()
+        return job_ids
+
+    job_ids = asyncio.run(run())
+    for job_id in job_ids:
+        assert get_job(sqlite_path, job_id)["delivery_status"] == "link_sent"
+    assert len(bot_api.calls) == 5
+    assert bot_api.max_active == 2
@@ -0,0 +1,45 @@
+import socket
+from pathlib import Path
+
+import pytest
+
+from app.doorbell import Doorbell, ring
+
+
+def test_ring_wakes_waiting_doorbell(tmp_path: Path) -> None:
+    doorbell = Doorbell(str(tmp_path), "worker-1")
+    try:
+        assert doorbell.wait(0.01) is False
+        assert ring(str(tmp_path)) == 1
+        assert ring(str(tmp_path)) == 1
+        assert doorbell.wait(1) is True
+        assert doorbell.wait(0.01) is False
+    finally:
+        doorbell.close()
+    assert not Path(doorbell.path).exists()
+
+
+def test_ring_removes_stale_sockets(tmp_path: Path) -> None:
+    stale = tmp_path / "worker-stale.sock"
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(str(stale))
+    sock.close()
+
+    assert ring(str(tmp_path)) == 0
+    assert not stale.exists()
+
+
+def test_doorbell_keeps_socket_of_live_listener(tmp_path: Path) -> None:
+    stale = tmp_path / "worker-stale.sock"
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(str(stale))
+    sock.close()
+    replaced = Doorbell(str(tmp_path), "worker-stale")
+
+    try:
+        with pytest.raises(OSError):
+            Doorbell(str(tmp_path), "worker-stale")
+        assert ring(str(tmp_path)) == 1
+        assert replaced.wait(1) is True
+    finally:
+        replaced.close()
@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from webapi.downloads import RangeNotSatisfiable, accel_response, file_response, parse_range
+
+
+def test_parse_range() -> None:
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=95-200", 100) == (95, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def _client(path: Path) -> TestClient:
+    app = FastAPI()
+
+    @app.api_route("/file", methods=["GET", "HEAD"])
+    async def serve(request: Request):
+        return file_response(request, str(path), "out.mp4", "video/mp4")
+
+    return TestClient(app)
+
+
+def test_file_response_ranges(tmp_path: Path) -> None:
+    path = tmp_path / "out.mp4"
+    path.write_bytes(bytes(range(200)))
+    client = _client(path)
+
+    full = client.get("/file")
+    assert full.status_code == 200
+    assert full.headers["accept-ranges"] == "bytes"
+    etag = full.headers["etag"]
+
+    partial = client.get("/file", headers={"Range": "bytes=10-19"})
+    assert partial.status_code == 206
+    assert partial.content == bytes(range(10, 20))
+    assert partial.headers["content-range"] == "bytes 10-19/200"
+    assert partial.headers["etag"] == etag
+
+    stale = client.get("/file", headers={"Range": "bytes=10-19", "If-Range": '"old"'})
+    assert stale.status_code == 200
+    assert len(stale.content) == 200
+
+    fresh = client.get("/file", headers={"Range": "bytes=10-19", "If-Range": etag})
+    assert fresh.status_code == 206
+
+    assert client.get("/file", headers={"If-None-Match": etag}).status_code == 304
+    unsatisfiable = client.get("/file", headers={"Range": "bytes=500-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == "bytes */200"
+
+
+def test_accel_response(tmp_path: Path) -> None:
+    response = accel_response(
+        str(tmp_path / "job.mp4"), tmp_path, "/protected-outputs/", "job.mp4", "video/mp4"
+    )
+    assert response.headers["x-accel-redirect"] == "/protected-outputs/job.mp4"
+    assert accel_response("/elsewhere/job.mp4", tmp_path, "/p", "job.mp4", "video/mp4") is None
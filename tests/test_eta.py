@@ -0,0 +1,91 @@
+import pytest
+
+from app.db import connect
+from app.eta import (
+    EtaEstimator,
+    QueueFull,
+    announce_worker,
+    encode_seconds,
+    encode_speeds,
+    estimate_queue,
+)
+from app.jobs import create_job, lock_next_job
+from app.metrics import record_job_metrics
+from app.progress import publish_progress
+
+
+def _create_job(sqlite_path: str, profile: str, duration: float, height: int) -> str:
+    return create_job(
+        sqlite_path,
+        source="web",
+        user_id=None,
+        chat_id=None,
+        input_path="in.mp4",
+        profile=profile,
+        input_bytes=1,
+        probe={"duration": duration, "has_video": True, "height": height},
+    )["id"]
+
+
+def test_estimate_uses_history_slots_and_live_progress(
+    sqlite_path: str, tmp_path
+) -> None:
+    # 1080p balanced encodes ran at 2x, 480p ones at 10x.
+    for speed, height in ((2.0, 1080), (2.0, 1080), (2.5, 1080), (10.0, 480)):
+        job_id = _create_job(sqlite_path, "balanced", 60, height)
+        record_job_metrics(sqlite_path, job_id, "balanced", {"encode_speed": speed})
+    with connect(sqlite_path) as conn:
+        conn.execute("UPDATE jobs SET status = 'done', encode_mode = 'encode'")
+
+    running = _create_job(sqlite_path, "balanced", 600, 1080)
+    lock_next_job(sqlite_path, "host-1-0")
+    publish_progress(str(tmp_path), running, percent=50, eta_seconds=100)
+    first = _create_job(sqlite_path, "balanced", 400, 1080)
+    second = _create_job(sqlite_path, "hq", 100, 720)
+    third = _create_job(sqlite_path, "balanced", 200, 1080)
+    announce_worker(sqlite_path, "host-1", 2, 60)
+    announce_worker(sqlite_path, "host-2", 4, -1)
+
+    estimate = estimate_queue(sqlite_path, str(tmp_path))
+
+    assert estimate.slots == 2
+    assert estimate.jobs[running][1] == pytest.approx(100, abs=1)
+    # The idle slot takes the first job (200 s at 2x); hq has no history and
+    # falls back to its scheduling cost of 1.5 wall seconds per media second.
+    assert estimate.jobs[first] == (0.0, 200.0)
+    assert estimate.jobs[second][0] == pytest.approx(100, abs=1)
+    assert estimate.jobs[second][1] == pytest.approx(250, abs=1)
+    assert estimate.jobs[third] == (200.0, 300.0)
+    assert estimate.wait_seconds == pytest.approx(250, abs=1)
+
+
+def test_speeds_ignore_remuxed_jobs(sqlite_path: str) -> None:
+    # Remuxes and audio-only re-encodes finish far faster than a real encode.
+    samples = [("encode", 2.0), ("remux", 150.0), ("copy_video", 40.0)] * 3
+    for mode, speed in samples:
+        job_id = _create_job(sqlite_path, "balanced", 60, 1080)
+        record_job_metrics(sqlite_path, job_id, "balanced", {"encode_speed": speed})
+        with connect(sqlite_path) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', encode_mode = ? WHERE id = ?",
+                (mode, job_id),
+            )
+
+    speeds = encode_speeds(sqlite_path)
+
+    assert speeds[("balanced", 1080)] == 2.0
+    assert encode_seconds(speeds, "balanced", 60, 1080) == 30.0
+
+
+def test_admission_rejects_over_slo(sqlite_path: str) -> None:
+    job_id = _create_job(sqlite_path, "balanced", 1000, 720)
+    estimator = EtaEstimator(sqlite_path)
+
+    estimator.check_admission(0)
+    estimator.check_admission(800)
+    with pytest.raises(QueueFull) as excinfo:
+        estimator.check_admission(600)
+
+    assert excinfo.value.retry_after == 100
+    start, finish = estimator.job_times(job_id)
+    assert finish - start == pytest.approx(700)
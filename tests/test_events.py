@@ -0,0 +1,48 @@
+import asyncio
+
+from webapi.events import ProgressHub
+
+
+def test_hub_fans_out_one_poller_to_all_subscribers() -> None:
+    snapshots = [
+        {"status": "queued", "progress": 0},
+        {"status": "queued", "progress": 0},
+        {"status": "processing", "progress": 40},
+        {"status": "done", "progress": 100},
+    ]
+    calls: list[str] = []
+
+    async def fetch(job_id: str):
+        calls.append(job_id)
+        return snapshots[min(len(calls), len(snapshots)) - 1]
+
+    async def run() -> tuple[list, list, int]:
+        hub = ProgressHub(fetch, interval=0.01)
+
+        async def collect() -> list:
+            return [snapshot async for snapshot in hub.subscribe("job")]
+
+        first, second = await asyncio.gather(collect(), collect())
+        return first, second, hub.subscriber_count("job")
+
+    first, second, remaining = asyncio.run(run())
+    expected = [
+        {"status": "queued", "progress": 0},
+        {"status": "processing", "progress": 40},
+        {"status": "done", "progress": 100},
+    ]
+    assert first == expected
+    assert second == expected
+    assert len(calls) == 4
+    assert remaining == 0
+
+
+def test_hub_ends_stream_for_missing_job() -> None:
+    async def fetch(job_id: str):
+        return None
+
+    async def run() -> list:
+        hub = ProgressHub(fetch, interval=0.01)
+        return [snapshot async for snapshot in hub.subscribe("missing")]
+
+    assert asyncio.run(run()) == []
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.utils import is_probable_video
+from webapi.ingest import receive_upload
+
+BOUNDARY = "----sizereducer"
+
+
+def _body(payload: bytes, filename: str = "clip.mp4") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="profile"\r\n\r\n'
+        "small\r\n"
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: video/mp4\r\n\r\n"
+    ).encode() + payload + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def _request(body: bytes, chunk_size: int = 7, sent: list[int] | None = None) -> Request:
+    chunks = [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+
+    async def receive():
+        if chunks:
+            if sent is not None:
+                sent.append(len(chunks[0]))
+            return {"type": "http.request", "body": chunks.pop(0), "more_body": bool(chunks)}
+        return {"type": "http.disconnect"}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/upload",
+        "headers": [
+            (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+        ],
+    }
+    return Request(scope, receive)
+
+
+def test_receive_upload_streams_file_to_disk(tmp_path: Path) -> None:
+    payload = bytes(range(256)) * 100
+    upload = asyncio.run(
+        receive_upload(_request(_body(payload)), tmp_path, 1024 * 1024, is_probable_video)
+    )
+    assert upload.fields == {"profile": "small"}
+    assert upload.filename == "clip.mp4"
+    assert upload.size == len(payload)
+    assert upload.sha256 == hashlib.sha256(payload).hexdigest()
+    assert upload.path.read_bytes() == payload
+    assert upload.path.suffix == ".mp4"
+
+
+def test_receive_upload_enforces_size_limit(tmp_path: Path) -> None:
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(
+            receive_upload(_request(_body(b"x" * 5000)), tmp_path, 1000, is_probable_video)
+        )
+    assert excinfo.value.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_receive_upload_rejects_non_video(tmp_path: Path) -> None:
+    body = _body(b"data", filename="notes.txt").replace(b"video/mp4", b"text/plain")
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(receive_upload(_request(body), tmp_path, 1000, is_probable_video))
+    assert excinfo.value.status_code == 400
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_receive_upload_checks_fields_before_file(tmp_path: Path) -> None:
+    sent: list[int] = []
+    request = _request(_body(b"x" * 100_000), sent=sent)
+
+    def check_fields(fields: dict[str, str]) -> None:
+        if fields.get("profile") == "small":
+            raise HTTPException(status_code=400, detail="Invalid profile")
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(
+            receive_upload(
+                request, tmp_path, 1024 * 1024, is_probable_video, check_fields=check_fields
+            )
+        )
+    assert excinfo.value.status_code == 400
+    assert sum(sent) < 200
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_receive_upload_runs_early_check(tmp_path: Path) -> None:
+    seen: list[int] = []
+
+    async def early_check(path: Path) -> None:
+        seen.append(path.stat().st_size)
+        raise HTTPException(status_code=400, detail="Duration exceeds limit")
+
+    with pytest.raises(HTTPException) as excinfo:
+        asyncio.run(
+            receive_upload(
+                _request(_body(b"x" * 5000), chunk_size=1000),
+                tmp_path,
+                1024 * 1024,
+                is_probable_video,
+                early_check=early_check,
+                early_check_bytes=2000,
+            )
+        )
+    assert excinfo.value.status_code == 400
+    assert seen and seen[0] >= 2000
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_receive_upload_caps_form_fields(tmp_path: Path) -> None:
+    def fields(count: int, size: int) -> bytes:
+        return "".join(
+            f"--{BOUNDARY}\r\n"
+            f'Content-Disposition: form-data; name="f{index}"\r\n\r\n'
+            f"{'x' * size}\r\n"
+            for index in range(count)
+        ).encode()
+
+    for body, detail in (
+        (fields(1000, 1), "Too many form fields"),
+        (fields(10, 60 * 1024), "Form fields too large"),
+    ):
+        with pytest.raises(HTTPException) as excinfo:
+            asyncio.run(
+                receive_upload(
+                    _request(body + _body(b"data"), chunk_size=4096),
+                    tmp_path,
+                    1000,
+                    is_probable_video,
+                )
+            )
+        assert excinfo.value.status_code == 400
+        assert excinfo.value.detail == detail
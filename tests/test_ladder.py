@@ -0,0 +1,88 @@
+import dataclasses
+from pathlib import Path
+
+import pytest
+
+from app.config import load_settings
+from app.deliveries import get_deliveries
+from app.jobs import (
+    create_job,
+    get_job,
+    get_job_outputs,
+    lock_next_job,
+    parse_profiles,
+)
+from app.lifecycle import expire_outputs
+from worker import main as worker_main
+
+PROFILES = {"small", "balanced", "hq", "fit"}
+
+
+def _settings(sqlite_path: str, tmp_path: Path):
+    storage_path = tmp_path / "storage"
+    for name in ("uploads", "outputs", "progress", "doorbell"):
+        (storage_path / name).mkdir(parents=True, exist_ok=True)
+    return dataclasses.replace(
+        load_settings(),
+        sqlite_path=sqlite_path,
+        storage_path=str(storage_path),
+        progress_path=str(storage_path / "progress"),
+        doorbell_path=str(storage_path / "doorbell"),
+        cache_max_mb=0,
+    )
+
+
+def test_parse_profiles() -> None:
+    assert parse_profiles("hq, small,hq", PROFILES) == ["hq", "small"]
+    assert parse_profiles("fit", PROFILES) == ["fit"]
+    with pytest.raises(ValueError, match="Invalid profile"):
+        parse_profiles("small,tiny", PROFILES)
+    with pytest.raises(ValueError, match="can be combined"):
+        parse_profiles("small,fit", PROFILES)
+
+
+def test_ladder_job_encodes_all_profiles_in_one_run(
+    sqlite_path: str, tmp_path: Path, monkeypatch
+) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    input_path = Path(settings.storage_path) / "uploads" / "in.mp4"
+    input_path.write_bytes(b"input")
+    created = create_job(
+        sqlite_path,
+        source="telegram",
+        user_id="1",
+        chat_id="1",
+        input_path=str(input_path),
+        profile="small",
+        input_bytes=5,
+        probe={"duration": 10.0, "has_video": True, "width": 1920, "height": 1080},
+        profiles=["small", "hq"],
+    )
+    commands = []
+
+    def fake_run_ffmpeg(cmd, duration, on_progress, abort=None):
+        commands.append(cmd)
+        for index, arg in enumerate(cmd):
+            if arg.endswith(".mp4") and cmd[index - 1] != "-i":
+                Path(arg).write_bytes(b"x" * (100 * len(commands) + index))
+        return {}
+
+    monkeypatch.setattr(worker_main, "run_ffmpeg", fake_run_ffmpeg)
+    job = lock_next_job(sqlite_path)
+    worker_main.process_job(job, settings)
+
+    assert len(commands) == 1
+    job = get_job(sqlite_path, created["id"])
+    assert job["status"] == "done"
+    outputs = get_job_outputs(sqlite_path, created["id"])
+    assert [output["profile"] for output in outputs] == ["small", "hq"]
+    assert job["output_path"] == outputs[0]["output_path"]
+    assert job["output_bytes"] == outputs[0]["output_bytes"]
+    for output in outputs:
+        assert Path(output["output_path"]).stat().st_size == output["output_bytes"]
+    assert [delivery["kind"] for delivery in get_deliveries(sqlite_path, job["id"])] == [
+        "outputs"
+    ]
+
+    expire_outputs(sqlite_path, -60)
+    assert not any(Path(output["output_path"]).exists() for output in outputs)
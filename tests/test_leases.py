@@ -0,0 +1,306 @@
+import dataclasses
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import httpx
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import load_settings
+from app.db import connect
+from app.jobs import (
+    cancel_job,
+    create_job,
+    get_job,
+    lock_next_job,
+    reap_expired_leases,
+    release_job,
+    renew_lease,
+    update_job,
+)
+from app.lifecycle import discard_cancelled, reap_cancelled_inputs
+from webapi.workers import build_worker_router
+from worker import remote
+from worker.remote import RemoteQueue
+from worker.slots import plan_slots, run_slots
+
+
+def _settings(sqlite_path: str, tmp_path: Path):
+    storage_path = tmp_path / "storage"
+    for name in ("uploads", "outputs", "progress", "doorbell"):
+        (storage_path / name).mkdir(parents=True, exist_ok=True)
+    return dataclasses.replace(
+        load_settings(),
+        sqlite_path=sqlite_path,
+        storage_path=str(storage_path),
+        progress_path=str(storage_path / "progress"),
+        doorbell_path=str(storage_path / "doorbell"),
+        cache_max_mb=0,
+        job_lease_seconds=1,
+        job_max_attempts=3,
+        worker_poll_max_seconds=1,
+        worker_api_token="secret",
+    )
+
+
+def _create_jobs(settings, count: int) -> list[str]:
+    job_ids = []
+    for index in range(count):
+        input_path = Path(settings.storage_path) / "uploads" / f"in{index}.mp4"
+        input_path.write_bytes(b"input-%d" % index)
+        job = create_job(
+            settings.sqlite_path,
+            source="web",
+            user_id=None,
+            chat_id=None,
+            input_path=str(input_path),
+            profile="balanced",
+            input_bytes=input_path.stat().st_size,
+            probe={"duration": 5.0, "has_video": True},
+        )
+        job_ids.append(job["id"])
+    return job_ids
+
+
+def _worker_process(settings, log_path: str, hang: bool) -> None:
+    stop = threading.Event()
+    abort = threading.Event()
+
+    def handler(job, settings, threads=None, abort=None) -> None:
+        with open(log_path, "a", encoding="utf-8") as handle:
+            handle.write(f"{job['id']} {os.getpid()}\n")
+        if hang:
+            time.sleep(3600)
+        time.sleep(0.02)
+        update_job(settings.sqlite_path, job["id"], status="done", progress=100)
+
+    def watch() -> None:
+        while not stop.wait(0.1):
+            with connect(settings.sqlite_path) as conn:
+                row = conn.execute(
+                    "SELECT COUNT(*) AS pending FROM jobs "
+                    "WHERE status IN ('queued', 'processing')"
+                ).fetchone()
+            if not row["pending"]:
+                stop.set()
+
+    threading.Thread(target=watch, daemon=True).start()
+    run_slots(plan_slots(2, 2, False), settings, handler, stop, abort)
+
+
+def _spawn(settings, log_path: Path, hang: bool = False):
+    context = multiprocessing.get_context("spawn")
+    process = context.Process(target=_worker_process, args=(settings, str(log_path), hang))
+    process.start()
+    return process
+
+
+def _claims(log_path: Path) -> list[tuple[str, str]]:
+    if not log_path.exists():
+        return []
+    lines = log_path.read_text(encoding="utf-8").splitlines()
+    return [tuple(line.split()) for line in lines]
+
+
+def test_lease_renew_release_and_reap(sqlite_path: str, tmp_path: Path) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    [job_id] = _create_jobs(settings, 1)
+
+    job = lock_next_job(sqlite_path, "worker-a", 60)
+    assert job["worker_id"] == "worker-a"
+    assert job["attempts"] == 1
+    assert not renew_lease(sqlite_path, job_id, "worker-b", 60)
+    assert renew_lease(sqlite_path, job_id, "worker-a", 60)
+    assert not release_job(sqlite_path, job_id, "worker-b")
+    assert release_job(sqlite_path, job_id, "worker-a")
+    assert get_job(sqlite_path, job_id)["attempts"] == 0
+
+    for attempt in (1, 2):
+        lock_next_job(sqlite_path, "worker-a", -1)
+        [reaped] = reap_expired_leases(sqlite_path, 2)
+        assert reaped["attempts"] == attempt
+    job = get_job(sqlite_path, job_id)
+    assert job["status"] == "error"
+    assert job["error_message"] == "Worker lost the job too many times"
+    assert job["worker_id"] is None
+
+
+def test_worker_processes_claim_each_job_once(sqlite_path: str, tmp_path: Path) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    job_ids = _create_jobs(settings, 24)
+    log_path = tmp_path / "claims.log"
+
+    processes = [_spawn(settings, log_path) for _ in range(3)]
+    for process in processes:
+        process.join(30)
+        assert process.exitcode == 0
+
+    claims = _claims(log_path)
+    assert sorted(job_id for job_id, _ in claims) == sorted(job_ids)
+    assert len({pid for _, pid in claims}) > 1
+    for job_id in job_ids:
+        job = get_job(sqlite_path, job_id)
+        assert job["status"] == "done"
+        assert job["attempts"] == 1
+
+
+def test_killed_worker_job_is_reaped_and_retried(sqlite_path: str, tmp_path: Path) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    [job_id] = _create_jobs(settings, 1)
+    log_path = tmp_path / "claims.log"
+
+    stuck = _spawn(settings, log_path, hang=True)
+    deadline = time.monotonic() + 20
+    while not _claims(log_path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(1.5)
+    assert get_job(sqlite_path, job_id)["status"] == "processing"
+    stuck.kill()
+    stuck.join()
+
+    survivor = _spawn(settings, log_path)
+    survivor.join(30)
+    assert survivor.exitcode == 0
+
+    claims = _claims(log_path)
+    assert [claimed for claimed, _ in claims] == [job_id, job_id]
+    assert claims[0][1] != claims[1][1]
+    job = get_job(sqlite_path, job_id)
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+
+
+def _api(settings) -> TestClient:
+    app = FastAPI()
+    app.include_router(build_worker_router(settings))
+    return TestClient(app, headers={"Authorization": "Bearer secret"})
+
+
+def test_worker_api_requires_token(sqlite_path: str, tmp_path: Path) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    client = _api(settings)
+    response = client.post(
+        "/api/worker/claim",
+        json={"worker_id": "w"},
+        headers={"Authorization": "Bearer wrong"},
+    )
+    assert response.status_code == 401
+    assert client.post("/api/worker/claim", json={"worker_id": "w"}).status_code == 204
+
+    disabled = _api(dataclasses.replace(settings, worker_api_token=None))
+    assert disabled.post("/api/worker/claim", json={"worker_id": "w"}).status_code == 404
+
+
+def test_remote_worker_streams_input_and_output(
+    sqlite_path: str, tmp_path: Path, monkeypatch
+) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    [job_id] = _create_jobs(settings, 1)
+    remote_settings = dataclasses.replace(settings, storage_path=str(tmp_path / "remote"))
+
+    def fake_encode_job(
+        job, input_path, output_path, probe, settings, on_progress, get_preset, **kwargs
+    ):
+        assert Path(input_path).read_bytes() == b"input-0"
+        shutil.copyfile(input_path, output_path)
+        with open(output_path, "ab") as handle:
+            handle.write(b"-encoded")
+        on_progress(50, {"fps": 30.0, "speed": 2.0})
+        return "encode", get_preset(), {"fps": 30.0, "bitrate_kbps": 800.0}
+
+    monkeypatch.setattr(remote, "encode_job", fake_encode_job)
+    client = _api(settings)
+    queue = RemoteQueue(remote_settings, client=client)
+
+    job = queue.claim("remote-1")
+    assert job["id"] == job_id
+    assert job["probe"]["duration"] == 5.0
+    assert queue.claim("remote-2") is None
+    assert queue.renew(job, "remote-1")
+    assert not queue.renew(job, "remote-2")
+    foreign = client.get(
+        f"/api/worker/jobs/{job_id}/input", params={"worker_id": "remote-2"}
+    )
+    assert foreign.status_code == 409
+
+    queue.process(job, remote_settings)
+
+    done = get_job(sqlite_path, job_id)
+    assert done["status"] == "done"
+    assert done["encode_mode"] == "encode"
+    assert done["encoder_preset"] == job["encoder_preset"]
+    assert Path(done["output_path"]).read_bytes() == b"input-0-encoded"
+    metrics = json.loads(done["metrics_json"])
+    assert metrics["encode_fps"] == 30.0
+    assert metrics["encode_bitrate_kbps"] == 800.0
+    assert metrics["queue_wait_seconds"] >= 0
+    assert not any((tmp_path / "remote" / "remote").iterdir())
+
+
+def test_cancelled_remote_job_input_removed_when_lease_expires(
+    sqlite_path: str, tmp_path: Path
+) -> None:
+    settings = _settings(sqlite_path, tmp_path)
+    [job_id] = _create_jobs(settings, 1)
+    input_path = Path(get_job(sqlite_path, job_id)["input_path"])
+    client = _api(settings)
+    assert client.post("/api/worker/claim", json={"worker_id": "remote-1"}).json()
+
+    discard_cancelled([cancel_job(sqlite_path, job_id)], delete_inputs=True)
+    response = client.post(
+        f"/api/worker/jobs/{job_id}/complete",
+        json={"worker_id": "remote-1", "status": "requeue"},
+    )
+    assert response.status_code == 409
+    assert reap_cancelled_inputs(sqlite_path, delete_inputs=True) == []
+    assert input_path.exists()
+
+    with connect(sqlite_path) as conn:
+        conn.execute("UPDATE jobs SET lease_expires_at = ?", (time.time() - 1,))
+    assert reap_cancelled_inputs(sqlite_path, delete_inputs=True) == [job_id]
+    assert not input_path.exists()
+    assert get_job(sqlite_path, job_id)["status"] == "cancelled"
+
+
+def test_remote_worker_retries_complete_and_stops_on_rejection(
+    sqlite_path: str, tmp_path: Path, monkeypatch
+) -> None:
+    settings = dataclasses.replace(_settings(sqlite_path, tmp_path), job_lease_seconds=30)
+    first, second = _create_jobs(settings, 2)
+    remote_settings = dataclasses.replace(settings, storage_path=str(tmp_path / "remote"))
+
+    def fake_encode_job(
+        job, input_path, output_path, probe, settings, on_progress, get_preset, **kwargs
+    ):
+        shutil.copyfile(input_path, output_path)
+        if job["id"] == second:
+            cancel_job(sqlite_path, second)
+        return "encode", get_preset(), {}
+
+    monkeypatch.setattr(remote, "encode_job", fake_encode_job)
+    monkeypatch.setattr(remote, "COMPLETE_RETRY_SECONDS", 0.01)
+    client = _api(settings)
+    post = client.post
+    failures = []
+
+    def flaky_post(url, **kwargs):
+        if url.endswith("/complete") and len(failures) < 2:
+            failures.append(url)
+            raise httpx.ConnectError("connection reset")
+        return post(url, **kwargs)
+
+    monkeypatch.setattr(client, "post", flaky_post)
+    queue = RemoteQueue(remote_settings, client=client)
+
+    queue.process(queue.claim("remote-1"), remote_settings)
+    assert len(failures) == 2
+    assert get_job(sqlite_path, first)["status"] == "done"
+
+    queue.process(queue.claim("remote-1"), remote_settings)
+    assert get_job(sqlite_path, second)["status"] == "cancelled"
+    assert not any((tmp_path / "remote" / "remote").iterdir())
@@ -0,0 +1,87 @@
+from pathlib import Path
+
+import pytest
+
+from app.db import connect
+from app.jobs import cancel_job, create_job, get_job, update_job
+from app.lifecycle import (
+    StorageFull,
+    check_free_space,
+    discard_cancelled,
+    expire_outputs,
+)
+
+
+def _done_job(
+    sqlite_path: str, tmp_path: Path, name: str, input_owned: bool = True
+) -> tuple[str, Path, Path]:
+    input_path = tmp_path / f"{name}.in"
+    output_path = tmp_path / f"{name}.mp4"
+    input_path.write_bytes(b"in")
+    output_path.write_bytes(b"out")
+    job = create_job(
+        sqlite_path,
+        source="web",
+        user_id="127.0.0.1",
+        chat_id=None,
+        input_path=str(input_path),
+        profile="balanced",
+        input_bytes=2,
+        input_owned=input_owned,
+    )
+    update_job(sqlite_path, job["id"], status="done", output_path=str(output_path))
+    return job["id"], input_path, output_path
+
+
+def test_expire_outputs_removes_old_files(sqlite_path: str, tmp_path: Path) -> None:
+    old_id, old_input, old_output = _done_job(sqlite_path, tmp_path, "old")
+    new_id, _, new_output = _done_job(sqlite_path, tmp_path, "new")
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET updated_at = '2000-01-01T00:00:00Z' WHERE id = ?",
+            (old_id,),
+        )
+
+    assert expire_outputs(sqlite_path, 3600) == [old_id]
+    assert get_job(sqlite_path, old_id)["status"] == "expired"
+    assert not old_output.exists()
+    assert not old_input.exists()
+    assert get_job(sqlite_path, new_id)["status"] == "done"
+    assert new_output.exists()
+
+
+def test_referenced_inputs_are_never_removed(sqlite_path: str, tmp_path: Path) -> None:
+    done_id, done_input, done_output = _done_job(
+        sqlite_path, tmp_path, "done", input_owned=False
+    )
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            "UPDATE jobs SET updated_at = '2000-01-01T00:00:00Z' WHERE id = ?",
+            (done_id,),
+        )
+    assert expire_outputs(sqlite_path, 3600) == [done_id]
+    assert not done_output.exists()
+    assert done_input.exists()
+
+    queued_input = tmp_path / "queued.in"
+    queued_input.write_bytes(b"in")
+    job = create_job(
+        sqlite_path,
+        source="telegram",
+        user_id="1",
+        chat_id="1",
+        input_path=str(queued_input),
+        profile="balanced",
+        input_bytes=2,
+        input_owned=False,
+    )
+    discard_cancelled([cancel_job(sqlite_path, job["id"])], delete_inputs=True)
+    assert get_job(sqlite_path, job["id"])["status"] == "cancelled"
+    assert queued_input.exists()
+
+
+def test_check_free_space(tmp_path: Path) -> None:
+    check_free_space(str(tmp_path), 0)
+    check_free_space(str(tmp_path), 1)
+    with pytest.raises(StorageFull):
+        check_free_space(str(tmp_path), 1, incoming_bytes=1 << 60)
@@ -1,16 +1,60 @@
-from app.media import parse_ffprobe_json
+import pytest
+
+from app.media import (
+    MediaRejected,
+    check_probe,
+    choose_split_points,
+    parse_ffprobe_json,
+    parse_keyframe_times,
+)
 
 
 def test_parse_ffprobe_json() -> None:
     payload = {
         "streams": [
-            {"codec_type": "video", "width": 1920, "height": 1080},
-            {"codec_type": "audio"},
+            {
+                "codec_type": "video",
+                "codec_name": "h264",
+                "width": 1920,
+                "height": 1080,
+                "pix_fmt": "yuv420p",
+            },
+            {"codec_type": "audio", "codec_name": "aac", "bit_rate": "128000"},
         ],
-        "format": {"duration": "12.34"},
+        "format": {"duration": "12.34", "bit_rate": "2128000"},
     }
     parsed = parse_ffprobe_json(payload)
     assert parsed["has_video"] is True
     assert parsed["duration"] == 12.34
     assert parsed["width"] == 1920
-    assert parsed["height"] == 1080
\ No newline at end of file
+    assert parsed["height"] == 1080
+    assert parsed["video_codec"] == "h264"
+    assert parsed["audio_codec"] == "aac"
+    assert parsed["pix_fmt"] == "yuv420p"
+    assert parsed["bitrate"] == 2_128_000
+    assert parsed["audio_bitrate"] == 128_000
+    assert parsed["video_bitrate"] == 2_000_000
+
+
+def test_check_probe_rejects() -> None:
+    probe = {"has_video": True, "duration": 1000.0, "width": 640, "height": 360}
+    with pytest.raises(MediaRejected, match="Duration exceeds limit"):
+        check_probe(probe, 900)
+    with pytest.raises(MediaRejected, match="No video stream"):
+        check_probe({**probe, "has_video": False}, 900)
+    check_probe({**probe, "duration": 60.0}, 900)
+
+
+def test_parse_keyframe_times() -> None:
+    output = "1.400000,K__\n1.433333,___\n0.000000,K_\n3.400000,K__\nbad,K\n"
+    assert parse_keyframe_times(output, start_time=1.4) == [0.0, 2.0]
+
+
+def test_choose_split_points() -> None:
+    keyframes = [0.0, 25.0, 50.0, 65.0, 110.0, 130.0, 190.0]
+    segments = choose_split_points(keyframes, 200.0, 60.0)
+    assert segments == [(0.0, 65.0), (65.0, 130.0), (130.0, 200.0)]
+
+
+def test_choose_split_points_short_input() -> None:
+    assert choose_split_points([0.0, 10.0], 20.0, 60.0) == [(0.0, 20.0)]
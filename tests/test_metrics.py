@@ -0,0 +1,121 @@
+import json
+import socket
+import sys
+from types import SimpleNamespace
+
+import httpx
+
+from app.jobs import create_job, get_job
+from app.metrics import record_job_metrics, render_service_metrics
+from worker.ffmpeg import run_ffmpeg
+from worker.metrics import WorkerMetrics, encode_metrics, start_metrics_server
+
+PROGRESS = """
+frame=120
+fps=48.5
+bitrate=812.4kbits/s
+total_size=204800
+out_time_ms=2000000
+speed=1.95x
+progress=continue
+frame=300
+fps=50.1
+bitrate=798.0kbits/s
+total_size=512000
+out_time_ms=5000000
+speed=2.01x
+progress=end
+"""
+
+
+def test_run_ffmpeg_parses_progress_stats() -> None:
+    cmd = [sys.executable, "-c", f"print({PROGRESS!r})"]
+    reported = []
+
+    stats = run_ffmpeg(cmd, 5.0, lambda percent, stats: reported.append((percent, stats)))
+
+    assert stats == {
+        "fps": 50.1,
+        "speed": 2.01,
+        "bitrate_kbps": 798.0,
+        "total_size": 512000,
+    }
+    assert reported[0] == (
+        40,
+        {"fps": 48.5, "speed": 1.95, "bitrate_kbps": 812.4, "total_size": 204800},
+    )
+    assert reported[-1][0] == 100
+
+
+def test_encode_metrics_falls_back_to_output_size() -> None:
+    values = encode_metrics(10.0, 4.0, {"fps": 60.0}, 1_000_000)
+    assert values["encode_speed"] == 2.5
+    assert values["encode_fps"] == 60.0
+    assert values["encode_bitrate_kbps"] == 800.0
+    assert values["output_total_size"] == 1_000_000
+
+
+def test_job_metrics_render_per_profile_histograms(sqlite_path: str) -> None:
+    job = create_job(
+        sqlite_path,
+        source="web",
+        user_id=None,
+        chat_id=None,
+        input_path="in.mp4",
+        profile="small",
+        input_bytes=1,
+    )
+    create_job(
+        sqlite_path,
+        source="web",
+        user_id=None,
+        chat_id=None,
+        input_path="in2.mp4",
+        profile="hq",
+        input_bytes=1,
+    )
+    record_job_metrics(
+        sqlite_path, job["id"], "small", {"encode_seconds": 42.0, "encode_fps": None}
+    )
+    record_job_metrics(sqlite_path, job["id"], "small", {"notify_seconds": 1.5})
+
+    metrics = json.loads(get_job(sqlite_path, job["id"])["metrics_json"])
+    assert metrics == {"encode_seconds": 42.0, "notify_seconds": 1.5}
+
+    text = render_service_metrics(sqlite_path)
+    assert 'size_reducer_jobs{status="queued"} 2' in text
+    assert "size_reducer_queue_depth 2" in text
+    assert 'size_reducer_encode_seconds_bucket{profile="small",le="30.0"} 0' in text
+    assert 'size_reducer_encode_seconds_bucket{profile="small",le="60.0"} 1' in text
+    assert 'size_reducer_encode_seconds_sum{profile="small"} 42.0' in text
+    assert 'size_reducer_notify_seconds_count{profile="small"} 1' in text
+    assert "size_reducer_encode_fps" not in text
+
+
+def test_worker_metrics_listener() -> None:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    settings = SimpleNamespace(
+        worker_metrics_host="127.0.0.1", worker_metrics_port=port, worker_slots=2
+    )
+    metrics = WorkerMetrics()
+    metrics.start("job-1", "balanced")
+    metrics.update("job-1", {"fps": 42.0, "speed": 1.5})
+    metrics.start("job-2", "hq")
+    metrics.finish("job-2", "hq", "done", {"encode_seconds": 12.0, "encode_speed": 3.0})
+
+    server = start_metrics_server(settings, metrics)
+    try:
+        response = httpx.get(f"http://127.0.0.1:{port}/metrics")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert response.status_code == 200
+    text = response.text
+    assert "size_reducer_worker_slots 2" in text
+    assert "size_reducer_worker_busy_slots 1" in text
+    assert 'size_reducer_worker_current_fps{slot="MainThread",profile="balanced"} 42.0' in text
+    assert 'size_reducer_worker_jobs_total{profile="hq",status="done"} 1' in text
+    assert 'size_reducer_worker_encode_speed_count{profile="hq"} 1' in text
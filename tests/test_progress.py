@@ -0,0 +1,19 @@
+from pathlib import Path
+
+from app.progress import clear_progress, publish_progress, read_progress
+
+
+def test_progress_roundtrip(tmp_path: Path) -> None:
+    progress_path = str(tmp_path)
+    assert read_progress(progress_path, "job") is None
+
+    publish_progress(progress_path, "job", percent=10, fps=24.0, speed=1.5, eta_seconds=30)
+    publish_progress(progress_path, "job", percent=42, fps=25.0, speed=1.6, eta_seconds=20)
+    live = read_progress(progress_path, "job")
+    assert live is not None
+    assert live["percent"] == 42
+    assert live["eta_seconds"] == 20
+    assert [path.name for path in tmp_path.iterdir()] == ["job.json"]
+
+    clear_progress(progress_path, "job")
+    assert read_progress(progress_path, "job") is None
@@ -0,0 +1,70 @@
+from pathlib import Path
+
+from webapi import rate_limit
+from webapi.rate_limit import RateLimiter, SQLiteRateLimiter
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_memory_limiter_allows_burst_then_refills(monkeypatch) -> None:
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    limiter = RateLimiter(3, 60)
+
+    assert [limiter.allow("a") for _ in range(4)] == [True, True, True, False]
+    assert limiter.allow("b") is True
+    clock.now += 20
+    assert limiter.allow("a") is True
+    assert limiter.allow("a") is False
+
+
+def test_memory_limiter_evicts_idle_keys(monkeypatch) -> None:
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    limiter = RateLimiter(30, 60)
+
+    for index in range(1000):
+        limiter.allow(f"10.0.{index // 256}.{index % 256}")
+    assert len(limiter) == 1000
+    clock.now += 61
+    limiter.allow("fresh")
+    assert len(limiter) == 1
+
+
+def test_memory_limiter_caps_live_keys(monkeypatch) -> None:
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", clock)
+    limiter = RateLimiter(3, 60, max_keys=100)
+
+    for index in range(1000):
+        assert limiter.allow(f"key-{index}") is True
+        assert len(limiter) <= 100
+    assert len(limiter) == 100
+    # The most recent keys keep their state; the oldest were evicted.
+    assert [limiter.allow("key-999") for _ in range(3)] == [True, True, False]
+    assert limiter.allow("key-0") is True
+
+
+def test_sqlite_limiter_is_shared_between_instances(tmp_path: Path, monkeypatch) -> None:
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "time", clock)
+    path = str(tmp_path / "ratelimit.sqlite")
+    first = SQLiteRateLimiter(path, 3, 60)
+    second = SQLiteRateLimiter(path, 3, 60)
+
+    assert first.allow("a") is True
+    assert second.allow("a") is True
+    assert first.allow("a") is True
+    assert second.allow("a") is False
+    clock.now += 20
+    assert first.allow("a") is True
+
+    clock.now += 120
+    assert second.allow("b") is True
+    assert len(second) == 1
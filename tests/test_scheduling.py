@@ -0,0 +1,72 @@
+from app.jobs import create_job, lock_next_job, queue_stats
+from app.scheduling import choose_preset, get_policy
+
+
+def _enqueue(sqlite_path: str, user_id: str, duration: float, policy) -> str:
+    job = create_job(
+        sqlite_path,
+        source="web",
+        user_id=user_id,
+        chat_id=None,
+        input_path=f"/tmp/{user_id}.mp4",
+        profile="balanced",
+        input_bytes=1,
+        probe={"duration": duration},
+        policy=policy,
+    )
+    return job["id"]
+
+
+def test_fifo_claims_in_arrival_order(sqlite_path: str) -> None:
+    policy = get_policy("fifo")
+    first = _enqueue(sqlite_path, "a", 3600, policy)
+    second = _enqueue(sqlite_path, "b", 10, policy)
+
+    assert lock_next_job(sqlite_path)["id"] == first
+    assert lock_next_job(sqlite_path)["id"] == second
+
+
+def test_fair_share_interleaves_users(sqlite_path: str) -> None:
+    policy = get_policy("fair")
+    heavy = [_enqueue(sqlite_path, "heavy", 600, policy) for _ in range(5)]
+    light = _enqueue(sqlite_path, "light", 600, policy)
+
+    claimed = [lock_next_job(sqlite_path)["id"] for _ in range(6)]
+    assert claimed[0] == heavy[0]
+    assert claimed.index(light) <= 2
+
+
+def test_sjf_prefers_short_jobs(sqlite_path: str) -> None:
+    policy = get_policy("sjf")
+    _enqueue(sqlite_path, "a", 3600, policy)
+    short = _enqueue(sqlite_path, "b", 30, policy)
+
+    assert lock_next_job(sqlite_path)["id"] == short
+
+
+def test_max_delay_bounds_starvation() -> None:
+    policy = get_policy("fair_sjf", max_delay_seconds=60)
+    key, finish = policy.schedule(1000.0, 10_000.0, 50_000.0)
+    assert key == 1060.0
+    assert finish is not None and finish > key
+
+
+def test_choose_preset_follows_backlog() -> None:
+    presets = ("slow", "medium", "fast", "veryfast")
+    depths = (0, 4, 16)
+    waits = (60, 300, 900)
+    assert choose_preset(presets, depths, waits, 0, 0) == "slow"
+    assert choose_preset(presets, depths, waits, 3, 10) == "medium"
+    assert choose_preset(presets, depths, waits, 3, 400) == "fast"
+    assert choose_preset(presets, depths, waits, 500, 0) == "veryfast"
+
+
+def test_queue_stats_counts_queued_jobs(sqlite_path: str) -> None:
+    assert queue_stats(sqlite_path) == (0, 0.0)
+    policy = get_policy("fifo")
+    _enqueue(sqlite_path, "a", 60, policy)
+    _enqueue(sqlite_path, "b", 60, policy)
+    lock_next_job(sqlite_path)
+    depth, oldest_wait = queue_stats(sqlite_path)
+    assert depth == 1
+    assert 0 <= oldest_wait < 60
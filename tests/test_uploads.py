@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from app.db import connect
+from app.uploads import (
+    advance_upload_session,
+    create_upload_session,
+    finish_upload_session,
+    get_upload_session,
+    reap_upload_sessions,
+)
+
+
+def _session(sqlite_path: str, input_path: Path) -> dict:
+    input_path.touch()
+    return create_upload_session(
+        sqlite_path,
+        client_id="127.0.0.1",
+        filename="clip.mp4",
+        input_path=str(input_path),
+        profile="balanced",
+        size=100,
+    )
+
+
+def test_upload_session_advances_only_from_expected_offset(
+    sqlite_path: str, tmp_path: Path
+) -> None:
+    session = _session(sqlite_path, tmp_path / "clip.mp4")
+
+    assert advance_upload_session(sqlite_path, session["id"], 0, 60) is True
+    assert advance_upload_session(sqlite_path, session["id"], 0, 60) is False
+    assert finish_upload_session(sqlite_path, session["id"]) is None
+
+    assert advance_upload_session(sqlite_path, session["id"], 60, 100) is True
+    finished = finish_upload_session(sqlite_path, session["id"])
+    assert finished is not None
+    assert finished["received"] == 100
+    assert get_upload_session(sqlite_path, session["id"]) is None
+
+
+def test_reap_upload_sessions_removes_abandoned_files(
+    sqlite_path: str, tmp_path: Path
+) -> None:
+    stale = _session(sqlite_path, tmp_path / "stale.mp4")
+    fresh = _session(sqlite_path, tmp_path / "fresh.mp4")
+    with connect(sqlite_path) as conn:
+        conn.execute(
+            "UPDATE upload_sessions SET updated_at = '2000-01-01T00:00:00Z' WHERE id = ?",
+            (stale["id"],),
+        )
+
+    assert reap_upload_sessions(sqlite_path, 3600) == [stale["id"]]
+    assert not (tmp_path / "stale.mp4").exists()
+    assert (tmp_path / "fresh.mp4").exists()
+    assert get_upload_session(sqlite_path, fresh["id"]) is not None
@@ -0,0 +1,180 @@
+from types import SimpleNamespace
+
+import pytest
+
+from worker import chunked
+from worker.ffmpeg import (
+    FIT_AUDIO_BITRATE,
+    build_copy_cmd,
+    build_ladder_cmd,
+    choose_encode_mode,
+    fit_video_bitrate,
+)
+from worker.main import build_ffmpeg_cmd
+from worker.slots import plan_slots
+
+
+def test_plan_slots_splits_cpu_budget() -> None:
+    plans = plan_slots(4, 32, True, available_cpus=list(range(32)))
+    assert [plan.threads for plan in plans] == [8, 8, 8, 8]
+    assert plans[0].cpus == tuple(range(0, 8))
+    assert plans[3].cpus == tuple(range(24, 32))
+
+
+def test_plan_slots_without_affinity() -> None:
+    plans = plan_slots(3, 2, False)
+    assert [plan.threads for plan in plans] == [1, 1, 1]
+    assert all(plan.cpus == () for plan in plans)
+
+
+def test_build_ffmpeg_cmd_threads() -> None:
+    cmd = build_ffmpeg_cmd("in.mp4", "out.mp4", "balanced", 1920, 1080, threads=6)
+    index = cmd.index("-threads")
+    assert cmd[index + 1] == "6"
+    assert cmd[-1] == "out.mp4"
+
+
+def test_encode_chunked_retries_failed_segment(tmp_path, monkeypatch) -> None:
+    settings = SimpleNamespace(chunk_parallelism=2, chunk_retries=1)
+    calls: dict[str, int] = {}
+    concatenated: list[str] = []
+
+    def fake_run_ffmpeg(cmd, duration, on_progress, abort=None) -> None:
+        start = cmd[cmd.index("-ss") + 1]
+        calls[start] = calls.get(start, 0) + 1
+        if start.startswith("60") and calls[start] == 1:
+            raise RuntimeError("ffmpeg failed")
+        on_progress(100, {"fps": 30.0, "speed": 1.0})
+
+    def fake_run_concat(list_path: str, output_path: str, audio_path=None) -> None:
+        with open(list_path, encoding="utf-8") as handle:
+            concatenated.extend(handle.read().splitlines())
+
+    monkeypatch.setattr(chunked, "run_ffmpeg", fake_run_ffmpeg)
+    monkeypatch.setattr(chunked, "run_concat", fake_run_concat)
+
+    progress: list[int] = []
+
+    def on_progress(percent: int, stats: dict) -> None:
+        progress.append(percent)
+
+    output_path = str(tmp_path / "out.mp4")
+    chunked.encode_chunked(
+        "in.mp4",
+        output_path,
+        "balanced",
+        {"width": 1280, "height": 720},
+        [(0.0, 60.0), (60.0, 120.0), (120.0, 150.0)],
+        settings,
+        on_progress,
+        threads=4,
+    )
+
+    assert calls == {"0.000000": 1, "60.000000": 2, "120.000000": 1}
+    assert [line.rsplit("/", 1)[1] for line in concatenated] == [
+        "00000.mp4'",
+        "00001.mp4'",
+        "00002.mp4'",
+    ]
+    assert progress[-1] == 100
+    assert not (tmp_path / "out.mp4.parts").exists()
+
+
+def test_encode_chunked_encodes_audio_once(tmp_path, monkeypatch) -> None:
+    settings = SimpleNamespace(chunk_parallelism=2, chunk_retries=0)
+    commands: list[list[str]] = []
+    muxed: list[str | None] = []
+
+    def fake_run_ffmpeg(cmd, duration, on_progress, abort=None) -> None:
+        commands.append(cmd)
+
+    def fake_run_concat(list_path: str, output_path: str, audio_path=None) -> None:
+        muxed.append(audio_path)
+
+    monkeypatch.setattr(chunked, "run_ffmpeg", fake_run_ffmpeg)
+    monkeypatch.setattr(chunked, "run_concat", fake_run_concat)
+
+    chunked.encode_chunked(
+        "in.mp4",
+        str(tmp_path / "out.mp4"),
+        "balanced",
+        {"width": 1280, "height": 720, "audio_codec": "mp3"},
+        [(0.0, 60.0), (60.0, 120.0)],
+        settings,
+        lambda percent, stats: None,
+    )
+
+    segments = [cmd for cmd in commands if "-ss" in cmd]
+    [audio] = [cmd for cmd in commands if "-ss" not in cmd]
+    assert len(segments) == 2
+    assert all("-an" in cmd and "-c:a" not in cmd for cmd in segments)
+    assert "-vn" in audio and audio[audio.index("-c:a") + 1] == "aac"
+    assert muxed == [audio[-1]]
+
+
+def test_build_ffmpeg_cmd_preset() -> None:
+    cmd = build_ffmpeg_cmd("in.mp4", "out.mp4", "hq", 1920, 1080)
+    assert cmd[cmd.index("-preset") + 1] == "medium"
+    cmd = build_ffmpeg_cmd("in.mp4", "out.mp4", "hq", 1920, 1080, preset="veryfast")
+    assert cmd.count("-preset") == 1
+    assert cmd[cmd.index("-preset") + 1] == "veryfast"
+    assert "-preset" not in build_ffmpeg_cmd("in.mp4", "out.mp4", "small", 640, 360)
+
+
+def test_choose_encode_mode() -> None:
+    probe = {
+        "video_codec": "h264",
+        "pix_fmt": "yuv420p",
+        "height": 720,
+        "video_bitrate": 1_500_000,
+        "audio_codec": "aac",
+        "audio_bitrate": 128_000,
+    }
+    assert choose_encode_mode(probe, "balanced") == "remux"
+    assert choose_encode_mode({**probe, "audio_codec": "opus"}, "balanced") == "copy_video"
+    assert choose_encode_mode({**probe, "audio_codec": None}, "balanced") == "remux"
+    assert choose_encode_mode({**probe, "height": 1080}, "balanced") == "encode"
+    assert choose_encode_mode({**probe, "video_codec": "hevc"}, "balanced") == "encode"
+    assert choose_encode_mode({**probe, "video_bitrate": None}, "balanced") == "encode"
+    assert choose_encode_mode(probe, "small") == "encode"
+
+
+def test_build_copy_cmd() -> None:
+    cmd = build_copy_cmd("in.mkv", "out.mp4", "balanced", copy_audio=False)
+    assert cmd[cmd.index("-c:v") + 1] == "copy"
+    assert cmd[cmd.index("-c:a") + 1] == "aac"
+    assert "+faststart" in cmd
+
+
+def test_fit_video_bitrate_fills_budget() -> None:
+    target = 45 * 1024 * 1024
+    bitrate = fit_video_bitrate(300.0, target)
+    total_bytes = (bitrate + FIT_AUDIO_BITRATE) * 300.0 / 8
+    assert total_bytes < target
+    assert total_bytes > target * 0.9
+    with pytest.raises(RuntimeError, match="too small"):
+        fit_video_bitrate(3600.0, 1024 * 1024)
+
+
+def test_build_ffmpeg_cmd_target_bitrate_scales_down() -> None:
+    cmd = build_ffmpeg_cmd("in.mp4", "out.mp4", "fit", 1920, 1080, video_bitrate=800_000)
+    assert cmd[cmd.index("-b:v") + 1] == "800000"
+    assert cmd[cmd.index("-maxrate") + 1] == "800000"
+    assert cmd[cmd.index("-vf") + 1] == "scale=-2:480"
+
+
+def test_build_ladder_cmd_decodes_and_scales_once() -> None:
+    outputs = [("small", "s.mp4"), ("balanced", "b.mp4"), ("hq", "h.mp4")]
+    cmd = build_ladder_cmd("in.mp4", outputs, 720, threads=6, preset="fast")
+
+    assert cmd.count("-i") == 1
+    assert cmd[cmd.index("-filter_complex") + 1] == (
+        "[0:v]split=2[h0][h1];[h0]null,split=2[v1][v2];[h1]scale=-2:480[v0]"
+    )
+    small = cmd[: cmd.index("s.mp4")]
+    assert small[small.index("-map") + 1] == "[v0]"
+    assert small[small.index("-b:v") + 1] == "1000k"
+    hq = cmd[cmd.index("b.mp4") : cmd.index("h.mp4")]
+    assert hq[hq.index("-map") + 1] == "[v2]"
+    assert "-crf" in hq
+    assert cmd[cmd.index("-threads") + 1] == "2"
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any
+
+logger = logging.getLogger("webapi")
+
+TERMINAL_STATUSES = {"done", "error", "expired", "cancelled"}
+
+Snapshot = dict[str, Any]
+
+
+class ProgressHub:
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Snapshot | None]],
+        interval: float = 1.0,
+    ) -> None:
+        self._fetch = fetch
+        self._interval = interval
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._latest: dict[str, Snapshot | None] = {}
+
+    def subscriber_count(self, job_id: str) -> int:
+        return len(self._subscribers.get(job_id, ()))
+
+    async def subscribe(
+        self, job_id: str, keepalive: float | None = None
+    ) -> AsyncIterator[Snapshot | None]:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=1)
+        self._subscribers.setdefault(job_id, set()).add(queue)
+        if job_id in self._latest:
+            queue.put_nowait(self._latest[job_id])
+        if job_id not in self._tasks:
+            self._tasks[job_id] = asyncio.create_task(self._poll(job_id))
+
+        try:
+            while True:
+                try:
+                    snapshot = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if snapshot is None:
+                    return
+                yield snapshot
+                if snapshot.get("status") in TERMINAL_STATUSES:
+                    return
+        finally:
+            subscribers = self._subscribers.get(job_id)
+            if subscribers is not None:
+                subscribers.discard(queue)
+                if not subscribers:
+                    del self._subscribers[job_id]
+                    task = self._tasks.pop(job_id, None)
+                    if task is not None:
+                        task.cancel()
+                    self._latest.pop(job_id, None)
+
+    def _publish(self, job_id: str, snapshot: Snapshot | None) -> None:
+        self._latest[job_id] = snapshot
+        for queue in self._subscribers.get(job_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(snapshot)
+
+    async def _poll(self, job_id: str) -> None:
+        last: Snapshot | None = None
+        first = True
+        while True:
+            try:
+                snapshot = await self._fetch(job_id)
+            except Exception:
+                logger.exception("progress_fetch_failed", extra={"job_id": job_id})
+                await asyncio.sleep(self._interval)
+                continue
+            if first or snapshot != last:
+                self._publish(job_id, snapshot)
+                last = snapshot
+                first = False
+            if snapshot is None or snapshot.get("status") in TERMINAL_STATUSES:
+                return
+            await asyncio.sleep(self._interval)
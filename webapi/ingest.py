@@ -0,0 +1,242 @@
+import asyncio
+import hashlib
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable
+
+from fastapi import HTTPException, Request
+from multipart.multipart import MultipartParser, parse_options_header
+
+from app.utils import generate_uuid, safe_extension
+
+FLUSH_BYTES = 1024 * 1024
+MAX_FIELD_BYTES = 64 * 1024
+MAX_FIELDS = 32
+MAX_FIELDS_BYTES = 256 * 1024
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+@dataclass
+class ReceivedUpload:
+    path: Path
+    filename: str | None
+    content_type: str | None
+    size: int
+    sha256: str
+    fields: dict[str, str] = field(default_factory=dict)
+
+
+class _FileSink:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self._handle = None
+
+    def open(self) -> None:
+        self._handle = open(self.path, "wb")
+
+    def write(self, data: bytes) -> None:
+        self.digest.update(data)
+        self._handle.write(data)
+
+    def flush(self) -> None:
+        self._handle.flush()
+
+    def close(self) -> None:
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+    def discard(self) -> None:
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+async def receive_upload(
+    request: Request,
+    dest_dir: Path,
+    size_limit: int,
+    accept: Callable[[str | None, str | None], bool],
+    file_field: str = "file",
+    early_check: Callable[[Path], Awaitable[None]] | None = None,
+    early_check_bytes: int = 0,
+    check_fields: Callable[[dict[str, str]], object] | None = None,
+) -> ReceivedUpload:
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=400, detail="Expected multipart/form-data")
+
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit():
+        if int(content_length) > size_limit + MULTIPART_OVERHEAD_BYTES:
+            raise HTTPException(status_code=413, detail="File too large")
+
+    events: list[tuple[str, bytes]] = []
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": lambda: events.append(("part_begin", b"")),
+            "on_header_field": lambda data, start, end: events.append(
+                ("header_field", bytes(data[start:end]))
+            ),
+            "on_header_value": lambda data, start, end: events.append(
+                ("header_value", bytes(data[start:end]))
+            ),
+            "on_header_end": lambda: events.append(("header_end", b"")),
+            "on_headers_finished": lambda: events.append(("headers_finished", b"")),
+            "on_part_data": lambda data, start, end: events.append(
+                ("part_data", bytes(data[start:end]))
+            ),
+            "on_part_end": lambda: events.append(("part_end", b"")),
+        },
+    )
+
+    sink: _FileSink | None = None
+    filename: str | None = None
+    file_content_type: str | None = None
+    fields: dict[str, str] = {}
+    headers: dict[bytes, bytes] = {}
+    header_field = b""
+    header_value = b""
+    part_name = ""
+    in_file = False
+    field_value = bytearray()
+    field_count = 0
+    field_bytes = 0
+    pending = bytearray()
+    early_checked = early_check is None or early_check_bytes <= 0
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for kind, data in events:
+                if kind == "part_begin":
+                    headers = {}
+                    header_field = b""
+                    header_value = b""
+                    field_value = bytearray()
+                    in_file = False
+                elif kind == "header_field":
+                    header_field += data
+                elif kind == "header_value":
+                    header_value += data
+                elif kind == "header_end":
+                    headers[header_field.lower()] = header_value
+                    header_field = b""
+                    header_value = b""
+                elif kind == "headers_finished":
+                    _, disposition = parse_options_header(
+                        headers.get(b"content-disposition", b"")
+                    )
+                    part_name = disposition.get(b"name", b"").decode("utf-8", "replace")
+                    raw_filename = disposition.get(b"filename")
+                    if part_name == file_field and raw_filename is not None:
+                        if sink is not None:
+                            raise HTTPException(status_code=400, detail="Only one file allowed")
+                        filename = raw_filename.decode("utf-8", "replace")
+                        part_type = headers.get(b"content-type")
+                        file_content_type = part_type.decode("latin-1") if part_type else None
+                        if not accept(filename, file_content_type):
+                            raise HTTPException(status_code=400, detail="Unsupported file type")
+                        ext = safe_extension(filename) or ".bin"
+                        sink = _FileSink(dest_dir / f"{generate_uuid()}{ext}")
+                        await asyncio.to_thread(sink.open)
+                        in_file = True
+                    else:
+                        field_count += 1
+                        if field_count > MAX_FIELDS:
+                            raise HTTPException(status_code=400, detail="Too many form fields")
+                elif kind == "part_data":
+                    if in_file:
+                        sink.size += len(data)
+                        if sink.size > size_limit:
+                            raise HTTPException(status_code=413, detail="File too large")
+                        pending += data
+                        if len(pending) >= FLUSH_BYTES:
+                            await asyncio.to_thread(sink.write, bytes(pending))
+                            pending.clear()
+                    else:
+                        field_value += data
+                        field_bytes += len(data)
+                        if len(field_value) > MAX_FIELD_BYTES:
+                            raise HTTPException(status_code=400, detail="Form field too large")
+                        if field_bytes > MAX_FIELDS_BYTES:
+                            raise HTTPException(status_code=400, detail="Form fields too large")
+                elif kind == "part_end":
+                    if in_file:
+                        if pending:
+                            await asyncio.to_thread(sink.write, bytes(pending))
+                            pending.clear()
+                        in_file = False
+                    elif part_name:
+                        fields[part_name] = field_value.decode("utf-8", "replace")
+                        # Fields that arrive before the file are checked here,
+                        # so a bad value is rejected without reading the upload.
+                        if check_fields is not None:
+                            check_fields(fields)
+            events.clear()
+            if not early_checked and sink is not None and sink.size >= early_check_bytes:
+                if pending:
+                    await asyncio.to_thread(sink.write, bytes(pending))
+                    pending.clear()
+                await asyncio.to_thread(sink.flush)
+                await early_check(sink.path)
+                early_checked = True
+        parser.finalize()
+
+        if sink is None:
+            raise HTTPException(status_code=400, detail="No file uploaded")
+        await asyncio.to_thread(sink.close)
+    except BaseException:
+        if sink is not None:
+            await asyncio.to_thread(sink.discard)
+        raise
+
+    return ReceivedUpload(
+        path=sink.path,
+        filename=filename,
+        content_type=file_content_type,
+        size=sink.size,
+        sha256=sink.digest.hexdigest(),
+        fields=fields,
+    )
+
+
+class ChunkWriter:
+    def __init__(self, path: str, offset: int) -> None:
+        self.path = path
+        self.offset = offset
+        self.written = 0
+
+    def _write(self, data: bytes) -> None:
+        fd = os.open(self.path, os.O_WRONLY)
+        try:
+            view = memoryview(data)
+            position = self.offset + self.written
+            while view:
+                count = os.pwrite(fd, view, position)
+                position += count
+                view = view[count:]
+        finally:
+            os.close(fd)
+        self.written += len(data)
+
+    async def receive(self, request: Request, max_bytes: int) -> None:
+        pending = bytearray()
+        try:
+            async for chunk in request.stream():
+                if self.written + len(pending) + len(chunk) > max_bytes:
+                    raise HTTPException(status_code=413, detail="Chunk exceeds upload size")
+                pending += chunk
+                if len(pending) >= FLUSH_BYTES:
+                    await asyncio.to_thread(self._write, bytes(pending))
+                    pending.clear()
+        finally:
+            if pending:
+                await asyncio.to_thread(self._write, bytes(pending))
@@ -1,24 +1,69 @@
 import asyncio
+import json
 import logging
 import os
+import time
 import uuid
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
-from fastapi.responses import FileResponse, RedirectResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
+from pydantic import BaseModel
+from starlette.requests import ClientDisconnect
 
 from app.config import load_settings
-from app.jobs import create_job, get_job
+from app.doorbell import ring
+from app.eta import EtaEstimator, QueueFull
+from app.jobs import (
+    cancel_job,
+    create_job,
+    get_job,
+    get_job_outputs,
+    job_profiles,
+    mark_polled,
+    parse_profiles,
+)
+from app.lifecycle import (
+    StorageFull,
+    cancel_abandoned_jobs,
+    check_free_space,
+    discard_cancelled,
+    expire_outputs,
+)
 from app.logging import set_request_id, setup_logging
+from app.media import MediaRejected, probe_upload, run_ffprobe
+from app.metrics import render_service_metrics
+from app.progress import read_progress
+from app.scheduling import get_policy
+from app.uploads import (
+    advance_upload_session,
+    create_upload_session,
+    delete_upload_session,
+    finish_upload_session,
+    get_upload_session,
+    reap_upload_sessions,
+)
 from app.utils import (
     build_download_url,
     ensure_dir,
     generate_uuid,
     is_probable_video,
     safe_extension,
+    sha256_file,
+    utc_from_timestamp,
 )
-from webapi.rate_limit import RateLimiter
+from webapi.downloads import accel_response, file_response
+from webapi.events import ProgressHub
+from webapi.ingest import ChunkWriter, receive_upload
+from webapi.rate_limit import build_rate_limiter
+from webapi.workers import build_worker_router, reap_job_leases_forever
 
 settings = load_settings()
 setup_logging()
@@ -29,9 +74,91 @@ outputs_dir = Path(settings.storage_path) / "outputs"
 ensure_dir(uploads_dir)
 ensure_dir(outputs_dir)
 
-rate_limiter = RateLimiter(settings.rate_limit_per_min, 60)
+rate_limiter = build_rate_limiter(settings)
+scheduling_policy = get_policy(
+    settings.scheduler_policy, settings.scheduler_max_delay_seconds
+)
+eta_estimator = EtaEstimator(settings.sqlite_path, settings.progress_path)
+
+PROFILES = {"small", "balanced", "hq", "fit"}
+UPLOAD_GC_INTERVAL_SECONDS = 300
+OUTPUT_GC_INTERVAL_SECONDS = 300
+ABANDON_GC_INTERVAL_SECONDS = 60
+# A status poll refreshes jobs.last_polled_at at most this often per job.
+POLL_TOUCH_SECONDS = 30
+MAX_TRACKED_POLLS = 10000
+
+polled_at: dict[str, float] = {}
+
+
+class UploadSessionRequest(BaseModel):
+    filename: str
+    size: int
+    profile: str = "balanced"
+    content_type: str | None = None
+    target_mb: int | None = None
+
+
+async def reap_upload_sessions_forever() -> None:
+    while True:
+        try:
+            reaped = await asyncio.to_thread(
+                reap_upload_sessions,
+                settings.sqlite_path,
+                settings.upload_session_ttl_seconds,
+            )
+            if reaped:
+                logger.info(f"upload_sessions_reaped count={len(reaped)}")
+        except Exception:
+            logger.exception("upload_session_gc_failed")
+        await asyncio.sleep(UPLOAD_GC_INTERVAL_SECONDS)
+
+
+async def expire_outputs_forever() -> None:
+    while True:
+        try:
+            expired = await asyncio.to_thread(
+                expire_outputs, settings.sqlite_path, settings.output_ttl_hours * 3600
+            )
+            if expired:
+                logger.info(f"outputs_expired count={len(expired)}")
+        except Exception:
+            logger.exception("output_gc_failed")
+        await asyncio.sleep(OUTPUT_GC_INTERVAL_SECONDS)
+
+
+async def cancel_abandoned_jobs_forever() -> None:
+    while True:
+        try:
+            cancelled = await asyncio.to_thread(
+                cancel_abandoned_jobs,
+                settings.sqlite_path,
+                settings.web_job_abandon_minutes * 60,
+            )
+            if cancelled:
+                discard_cancelled(cancelled, settings.delete_inputs_on_completion)
+                logger.info(f"abandoned_jobs_cancelled count={len(cancelled)}")
+        except Exception:
+            logger.exception("abandon_gc_failed")
+        await asyncio.sleep(ABANDON_GC_INTERVAL_SECONDS)
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    tasks = [asyncio.create_task(reap_upload_sessions_forever())]
+    if settings.output_ttl_hours > 0:
+        tasks.append(asyncio.create_task(expire_outputs_forever()))
+    if settings.web_job_abandon_minutes > 0:
+        tasks.append(asyncio.create_task(cancel_abandoned_jobs_forever()))
+    if settings.worker_api_token:
+        tasks.append(asyncio.create_task(reap_job_leases_forever(settings)))
+    yield
+    for task in tasks:
+        task.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
+app.include_router(build_worker_router(settings))
 
 
 @app.middleware("http")
@@ -48,104 +175,458 @@ async def root():
     return RedirectResponse(url="/web/")
 
 
-@app.post("/api/upload")
-async def upload_video(
-    request: Request,
-    file: UploadFile = File(...),
-    profile: str = Form("balanced"),
-):
-    client_ip = request.client.host if request.client else "unknown"
-    if not rate_limiter.allow(client_ip):
-        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+async def require_free_space(incoming_bytes: int = 0) -> None:
+    try:
+        await asyncio.to_thread(
+            check_free_space,
+            settings.storage_path,
+            settings.min_free_disk_mb,
+            incoming_bytes,
+        )
+    except StorageFull as exc:
+        raise HTTPException(status_code=507, detail=str(exc)) from exc
 
-    if profile not in {"small", "balanced", "hq"}:
-        raise HTTPException(status_code=400, detail="Invalid profile")
 
-    if not is_probable_video(file.filename, file.content_type):
-        raise HTTPException(status_code=400, detail="Unsupported file type")
+async def require_queue_capacity() -> None:
+    try:
+        await asyncio.to_thread(
+            eta_estimator.check_admission, settings.queue_wait_slo_seconds
+        )
+    except QueueFull as exc:
+        raise HTTPException(
+            status_code=503,
+            detail=str(exc),
+            headers={"Retry-After": str(exc.retry_after)},
+        ) from exc
 
-    ext = safe_extension(file.filename) or ".bin"
-    input_name = f"{generate_uuid()}{ext}"
-    input_path = uploads_dir / input_name
 
-    size_limit = settings.max_upload_mb * 1024 * 1024
-    written = 0
+async def early_probe(path: Path) -> None:
+    try:
+        probe = await asyncio.to_thread(run_ffprobe, str(path))
+    except MediaRejected as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    except Exception:
+        return
+    if probe["duration"] > settings.max_duration_seconds:
+        raise HTTPException(status_code=400, detail="Duration exceeds limit")
+
 
+async def probe_ingested(path: Path) -> dict:
     try:
-        with open(input_path, "wb") as handle:
-            while True:
-                chunk = await file.read(1024 * 1024)
-                if not chunk:
-                    break
-                written += len(chunk)
-                if written > size_limit:
-                    raise HTTPException(status_code=413, detail="File too large")
-                handle.write(chunk)
-    except HTTPException:
-        if input_path.exists():
-            input_path.unlink()
-        raise
+        return await asyncio.to_thread(
+            probe_upload, str(path), settings.max_duration_seconds
+        )
+    except MediaRejected as exc:
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
     except Exception as exc:
-        if input_path.exists():
-            input_path.unlink()
-        raise HTTPException(status_code=500, detail="Upload failed") from exc
-    finally:
-        await file.close()
+        path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail="Unreadable video file") from exc
+
+
+def parse_target_mb(value: str | int | None) -> int | None:
+    if value is None or value == "":
+        return None
+    try:
+        target_mb = int(value)
+    except (TypeError, ValueError) as exc:
+        raise HTTPException(status_code=400, detail="Invalid target_mb") from exc
+    if target_mb <= 0 or target_mb > settings.max_upload_mb:
+        raise HTTPException(status_code=400, detail="Invalid target_mb")
+    return target_mb * 1024 * 1024
+
+
+def parse_job_profiles(value: str, target_bytes: int | None) -> list[str]:
+    try:
+        profiles = parse_profiles(value, PROFILES)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if target_bytes and len(profiles) > 1:
+        raise HTTPException(status_code=400, detail="target_mb needs a single profile")
+    return profiles
+
+
+def parse_upload_fields(fields: dict[str, str]) -> tuple[list[str], int | None]:
+    target_bytes = parse_target_mb(fields.get("target_mb"))
+    profiles = parse_job_profiles(fields.get("profile", "balanced"), target_bytes)
+    return profiles, target_bytes
+
 
+async def enqueue_job(
+    client_ip: str | None,
+    input_path: str,
+    profiles: list[str],
+    input_bytes: int,
+    input_sha256: str,
+    probe: dict,
+    target_bytes: int | None = None,
+) -> dict:
     job = await asyncio.to_thread(
         create_job,
         settings.sqlite_path,
         source="web",
         user_id=client_ip,
         chat_id=None,
+        input_path=input_path,
+        profile=profiles[0],
+        input_bytes=input_bytes,
+        input_sha256=input_sha256,
+        probe=probe,
+        policy=scheduling_policy,
+        target_bytes=target_bytes,
+        profiles=profiles,
+    )
+    await asyncio.to_thread(ring, settings.doorbell_path)
+    logger.info("job_created", extra={"job_id": job["id"]})
+    return job
+
+
+@app.post("/api/upload")
+async def upload_video(request: Request):
+    client_ip = request.client.host if request.client else "unknown"
+    if not await asyncio.to_thread(rate_limiter.allow, client_ip):
+        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+
+    await require_queue_capacity()
+    size_limit = settings.max_upload_mb * 1024 * 1024
+    await require_free_space(size_limit)
+    try:
+        upload = await receive_upload(
+            request,
+            uploads_dir,
+            size_limit,
+            accept=is_probable_video,
+            early_check=early_probe,
+            early_check_bytes=settings.early_probe_mb * 1024 * 1024,
+            check_fields=parse_upload_fields,
+        )
+    except (HTTPException, ClientDisconnect):
+        raise
+    except Exception as exc:
+        raise HTTPException(status_code=500, detail="Upload failed") from exc
+
+    # Fields sent after the file part are only known now.
+    try:
+        profiles, target_bytes = parse_upload_fields(upload.fields)
+    except HTTPException:
+        upload.path.unlink(missing_ok=True)
+        raise
+
+    probe = await probe_ingested(upload.path)
+    job = await enqueue_job(
+        client_ip,
+        str(upload.path),
+        profiles,
+        upload.size,
+        upload.sha256,
+        probe,
+        target_bytes,
+    )
+    return {"job_id": job["id"]}
+
+
+@app.post("/api/uploads", status_code=201)
+async def create_upload(request: Request, body: UploadSessionRequest):
+    client_ip = request.client.host if request.client else "unknown"
+    if not await asyncio.to_thread(rate_limiter.allow, client_ip):
+        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    if not is_probable_video(body.filename, body.content_type):
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+    if body.size <= 0:
+        raise HTTPException(status_code=400, detail="Invalid size")
+    target_bytes = parse_target_mb(body.target_mb)
+    profiles = parse_job_profiles(body.profile, target_bytes)
+    if body.size > settings.max_upload_mb * 1024 * 1024:
+        raise HTTPException(status_code=413, detail="File too large")
+    await require_queue_capacity()
+    await require_free_space(body.size)
+
+    ext = safe_extension(body.filename) or ".bin"
+    input_path = uploads_dir / f"{generate_uuid()}{ext}"
+    await asyncio.to_thread(input_path.touch)
+    session = await asyncio.to_thread(
+        create_upload_session,
+        settings.sqlite_path,
+        client_id=client_ip,
+        filename=body.filename,
         input_path=str(input_path),
-        profile=profile,
-        input_bytes=written,
+        profile=",".join(profiles),
+        size=body.size,
+        target_bytes=target_bytes,
     )
+    return {
+        "upload_id": session["id"],
+        "offset": 0,
+        "size": session["size"],
+        "chunk_size": settings.upload_chunk_mb * 1024 * 1024,
+    }
 
-    logger.info("job_created", extra={"job_id": job["id"]})
+
+@app.get("/api/uploads/{upload_id}")
+async def upload_offset(upload_id: str):
+    session = await asyncio.to_thread(get_upload_session, settings.sqlite_path, upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return JSONResponse(
+        {"upload_id": upload_id, "offset": session["received"], "size": session["size"]},
+        headers={"Upload-Offset": str(session["received"])},
+    )
+
+
+@app.patch("/api/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request):
+    session = await asyncio.to_thread(get_upload_session, settings.sqlite_path, upload_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    raw_offset = request.headers.get("upload-offset", "")
+    if not raw_offset.isdigit():
+        raise HTTPException(status_code=400, detail="Missing Upload-Offset header")
+    offset = int(raw_offset)
+    if offset != session["received"]:
+        raise HTTPException(
+            status_code=409,
+            detail="Offset mismatch",
+            headers={"Upload-Offset": str(session["received"])},
+        )
+
+    writer = ChunkWriter(session["input_path"], offset)
+    try:
+        await writer.receive(request, session["size"] - offset)
+    finally:
+        advanced = False
+        if writer.written:
+            advanced = await asyncio.to_thread(
+                advance_upload_session,
+                settings.sqlite_path,
+                upload_id,
+                offset,
+                offset + writer.written,
+            )
+    if writer.written and not advanced:
+        raise HTTPException(status_code=409, detail="Concurrent upload to session")
+
+    new_offset = offset + writer.written
+    early_bytes = settings.early_probe_mb * 1024 * 1024
+    if early_bytes and offset < early_bytes <= new_offset:
+        try:
+            await early_probe(Path(session["input_path"]))
+        except HTTPException:
+            await asyncio.to_thread(delete_upload_session, settings.sqlite_path, upload_id)
+            Path(session["input_path"]).unlink(missing_ok=True)
+            raise
+    return JSONResponse(
+        {"upload_id": upload_id, "offset": new_offset, "size": session["size"]},
+        headers={"Upload-Offset": str(new_offset)},
+    )
+
+
+@app.post("/api/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str):
+    session = await asyncio.to_thread(
+        finish_upload_session, settings.sqlite_path, upload_id
+    )
+    if not session:
+        existing = await asyncio.to_thread(
+            get_upload_session, settings.sqlite_path, upload_id
+        )
+        if not existing:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        raise HTTPException(
+            status_code=409,
+            detail="Upload incomplete",
+            headers={"Upload-Offset": str(existing["received"])},
+        )
+
+    probe = await probe_ingested(Path(session["input_path"]))
+    input_sha256 = await asyncio.to_thread(sha256_file, session["input_path"])
+    job = await enqueue_job(
+        session["client_id"],
+        session["input_path"],
+        session["profile"].split(","),
+        session["size"],
+        input_sha256,
+        probe,
+        session["target_bytes"],
+    )
     return {"job_id": job["id"]}
 
 
-@app.get("/api/status/{job_id}")
-async def job_status(job_id: str):
+@app.delete("/api/uploads/{upload_id}", status_code=204)
+async def abort_upload(upload_id: str):
+    session = await asyncio.to_thread(
+        delete_upload_session, settings.sqlite_path, upload_id
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    Path(session["input_path"]).unlink(missing_ok=True)
+
+
+async def job_snapshot(job_id: str) -> dict | None:
     job = await asyncio.to_thread(get_job, settings.sqlite_path, job_id)
     if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
+        return None
 
     download_url = None
+    outputs = None
     if job["status"] == "done":
         download_url = build_download_url(
             settings.base_url, job["id"], job["download_token"]
         )
+        rows = await asyncio.to_thread(get_job_outputs, settings.sqlite_path, job_id)
+        if not rows:
+            rows = [{"profile": job["profile"], "output_bytes": job["output_bytes"]}]
+        outputs = [
+            {
+                "profile": row["profile"],
+                "output_bytes": row["output_bytes"],
+                "download_url": build_download_url(
+                    settings.base_url,
+                    job["id"],
+                    job["download_token"],
+                    row["profile"] if len(rows) > 1 else None,
+                ),
+            }
+            for row in rows
+        ]
+
+    progress = job["progress"]
+    live = None
+    if job["status"] == "processing":
+        live = await asyncio.to_thread(read_progress, settings.progress_path, job_id)
+        if live:
+            progress = live.get("percent", progress)
+
+    estimated_start_at = None
+    estimated_finish_at = None
+    if job["status"] in ("queued", "processing"):
+        times = await asyncio.to_thread(eta_estimator.job_times, job_id)
+        if times:
+            estimated_start_at = utc_from_timestamp(times[0])
+            estimated_finish_at = utc_from_timestamp(times[1])
 
     return {
         "status": job["status"],
-        "progress": job["progress"],
+        "progress": progress,
+        "fps": live.get("fps") if live else None,
+        "speed": live.get("speed") if live else None,
+        "eta_seconds": live.get("eta_seconds") if live else None,
+        "estimated_start_at": estimated_start_at,
+        "estimated_finish_at": estimated_finish_at,
         "error": job["error_message"],
+        "profiles": job_profiles(job),
         "output_bytes": job["output_bytes"],
         "download_url": download_url,
+        "outputs": outputs,
     }
 
 
-@app.get("/api/download/{job_id}")
-async def download_job(job_id: str, token: str):
+progress_hub = ProgressHub(job_snapshot)
+
+
+async def touch_job(job_id: str) -> None:
+    if settings.web_job_abandon_minutes <= 0:
+        return
+    now = time.monotonic()
+    if now - polled_at.get(job_id, -POLL_TOUCH_SECONDS) < POLL_TOUCH_SECONDS:
+        return
+    if len(polled_at) >= MAX_TRACKED_POLLS:
+        polled_at.clear()
+    polled_at[job_id] = now
+    await asyncio.to_thread(mark_polled, settings.sqlite_path, job_id)
+
+
+@app.get("/api/status/{job_id}")
+async def job_status(job_id: str):
+    snapshot = await job_snapshot(job_id)
+    if not snapshot:
+        raise HTTPException(status_code=404, detail="Job not found")
+    await touch_job(job_id)
+    return snapshot
+
+
+@app.delete("/api/jobs/{job_id}")
+async def delete_job(job_id: str):
+    job = await asyncio.to_thread(get_job, settings.sqlite_path, job_id)
+    if not job or job["source"] != "web":
+        raise HTTPException(status_code=404, detail="Job not found")
+    cancelled = await asyncio.to_thread(cancel_job, settings.sqlite_path, job_id)
+    if not cancelled:
+        raise HTTPException(status_code=409, detail=f"Job is already {job['status']}")
+    discard_cancelled([cancelled], settings.delete_inputs_on_completion)
+    logger.info("job_cancelled", extra={"job_id": job_id})
+    return {"status": "cancelled"}
+
+
+@app.get("/api/status/{job_id}/events")
+async def job_events(job_id: str):
+    job = await asyncio.to_thread(get_job, settings.sqlite_path, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def _stream():
+        yield "retry: 3000\n\n"
+        async for snapshot in progress_hub.subscribe(job_id, keepalive=15):
+            await touch_job(job_id)
+            if snapshot is None:
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: status\ndata: {json.dumps(snapshot)}\n\n"
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    body = await asyncio.to_thread(render_service_metrics, settings.sqlite_path)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@app.api_route("/api/download/{job_id}", methods=["GET", "HEAD"])
+async def download_job(
+    job_id: str, token: str, request: Request, profile: str | None = None
+):
     job = await asyncio.to_thread(get_job, settings.sqlite_path, job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] == "expired":
+        raise HTTPException(status_code=410, detail="Output expired")
     if job["status"] != "done":
         raise HTTPException(status_code=404, detail="Job not ready")
     if token != job["download_token"]:
         raise HTTPException(status_code=403, detail="Invalid token")
 
     output_path = job.get("output_path")
+    filename = f"{job_id}.mp4"
+    profiles = job_profiles(job)
+    if profile and profile not in profiles:
+        raise HTTPException(status_code=404, detail="Output not found")
+    if profile and len(profiles) > 1:
+        outputs = await asyncio.to_thread(get_job_outputs, settings.sqlite_path, job_id)
+        output_path = next(
+            (row["output_path"] for row in outputs if row["profile"] == profile), None
+        )
+        filename = f"{job_id}-{profile}.mp4"
     if not output_path or not os.path.exists(output_path):
         raise HTTPException(status_code=404, detail="Output missing")
 
-    return FileResponse(
-        output_path,
-        media_type="video/mp4",
-        filename=f"{job_id}.mp4",
+    if settings.download_accel_prefix:
+        response = accel_response(
+            output_path,
+            outputs_dir,
+            settings.download_accel_prefix,
+            filename,
+            "video/mp4",
+        )
+        if response is not None:
+            return response
+
+    return await asyncio.to_thread(
+        file_response, request, output_path, filename, "video/mp4"
     )
 
 
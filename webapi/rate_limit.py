@@ -1,20 +1,104 @@
+import threading
 import time
-from collections import deque
+from collections import OrderedDict
+from pathlib import Path
+
+from app.db import connect
 
 
 class RateLimiter:
-    def __init__(self, max_requests: int, window_seconds: int) -> None:
+    def __init__(
+        self, max_requests: int, window_seconds: int, max_keys: int = 100_000
+    ) -> None:
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+        self.interval = window_seconds / max(1, max_requests)
+        self.max_keys = max_keys
+        # Keys are kept in least recently allowed order, so idle ones collect
+        # at the front.
+        self._tat: OrderedDict[str, float] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def allow(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            tat = max(self._tat.get(key, now), now) + self.interval
+            if tat - now > self.window_seconds:
+                return False
+            self._tat[key] = tat
+            self._tat.move_to_end(key)
+            if len(self._tat) > self.max_keys:
+                self._tat.popitem(last=False)
+            return True
+
+    def _evict_idle(self, now: float) -> None:
+        while self._tat:
+            key, tat = next(iter(self._tat.items()))
+            if tat > now:
+                return
+            del self._tat[key]
+
+    def __len__(self) -> int:
+        return len(self._tat)
+
+
+class SQLiteRateLimiter:
+    def __init__(self, sqlite_path: str, max_requests: int, window_seconds: int) -> None:
+        self.sqlite_path = sqlite_path
         self.max_requests = max_requests
         self.window_seconds = window_seconds
-        self._events: dict[str, deque[float]] = {}
+        self.interval = window_seconds / max(1, max_requests)
+        self._next_sweep = time.time() + window_seconds
+        Path(sqlite_path).parent.mkdir(parents=True, exist_ok=True)
+        with connect(sqlite_path) as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    key TEXT PRIMARY KEY,
+                    tat REAL NOT NULL,
+                    allowed INTEGER NOT NULL DEFAULT 1
+                ) WITHOUT ROWID
+                """
+            )
 
     def allow(self, key: str) -> bool:
         now = time.time()
-        bucket = self._events.setdefault(key, deque())
-        cutoff = now - self.window_seconds
-        while bucket and bucket[0] < cutoff:
-            bucket.popleft()
-        if len(bucket) >= self.max_requests:
-            return False
-        bucket.append(now)
-        return True
\ No newline at end of file
+        params = {
+            "key": key,
+            "now": now,
+            "interval": self.interval,
+            "window": self.window_seconds,
+        }
+        with connect(self.sqlite_path) as conn:
+            if now >= self._next_sweep:
+                conn.execute("DELETE FROM rate_limits WHERE tat <= :now", params)
+                self._next_sweep = now + self.window_seconds
+            row = conn.execute(
+                """
+                INSERT INTO rate_limits (key, tat, allowed)
+                VALUES (:key, :now + :interval, 1)
+                ON CONFLICT(key) DO UPDATE SET
+                    allowed = MAX(tat, :now) + :interval - :now <= :window,
+                    tat = CASE
+                        WHEN MAX(tat, :now) + :interval - :now <= :window
+                        THEN MAX(tat, :now) + :interval
+                        ELSE tat
+                    END
+                RETURNING allowed
+                """,
+                params,
+            ).fetchone()
+        return bool(row["allowed"])
+
+    def __len__(self) -> int:
+        with connect(self.sqlite_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+
+
+def build_rate_limiter(settings) -> RateLimiter | SQLiteRateLimiter:
+    if settings.rate_limit_backend == "sqlite":
+        return SQLiteRateLimiter(
+            settings.rate_limit_sqlite_path, settings.rate_limit_per_min, 60
+        )
+    return RateLimiter(settings.rate_limit_per_min, 60)
@@ -2,9 +2,12 @@ const form = document.getElementById("upload-form");
 const statusEl = document.getElementById("status");
 const barEl = document.getElementById("bar");
 const downloadEl = document.getElementById("download");
+const outputsEl = document.getElementById("outputs");
+const cancelEl = document.getElementById("cancel");
 
 let currentJobId = null;
 let pollTimer = null;
+let eventSource = null;
 
 function setStatus(text) {
   statusEl.textContent = text;
@@ -15,6 +18,82 @@ function setProgress(value) {
   barEl.style.width = `${clamped}%`;
 }
 
+function stopTracking() {
+  cancelEl.style.display = "none";
+  if (pollTimer) {
+    clearInterval(pollTimer);
+    pollTimer = null;
+  }
+  if (eventSource) {
+    eventSource.close();
+    eventSource = null;
+  }
+}
+
+function showOutputs(outputs) {
+  outputsEl.replaceChildren(
+    ...outputs.map((output) => {
+      const link = document.createElement("a");
+      const sizeMb = (output.output_bytes / (1024 * 1024)).toFixed(1);
+      link.className = "download";
+      link.href = output.download_url;
+      link.textContent = `Download ${output.profile} (${sizeMb} MB)`;
+      return link;
+    })
+  );
+}
+
+function applyStatus(jobId, payload) {
+  setProgress(payload.progress || 0);
+
+  if (payload.status === "done" && payload.outputs && payload.outputs.length > 1) {
+    setStatus(`Done. Job ${jobId} ready in ${payload.outputs.length} profiles.`);
+    showOutputs(payload.outputs);
+    stopTracking();
+    return;
+  }
+
+  if (payload.status === "done" && payload.download_url) {
+    setStatus(`Done. Job ${jobId} ready.`);
+    downloadEl.href = payload.download_url;
+    downloadEl.style.display = "inline-flex";
+    stopTracking();
+    return;
+  }
+
+  if (payload.status === "expired") {
+    setStatus(`Job ${jobId} has expired. Upload the video again.`);
+    stopTracking();
+    return;
+  }
+
+  if (payload.status === "error") {
+    setStatus(`Error: ${payload.error || "Unknown error"}`);
+    stopTracking();
+    return;
+  }
+
+  if (payload.status === "cancelled") {
+    setStatus(`Job ${jobId} was cancelled.`);
+    stopTracking();
+    return;
+  }
+
+  if (payload.status === "processing" && payload.eta_seconds != null) {
+    setStatus(`Job ${jobId} is processing (about ${payload.eta_seconds}s left).`);
+    return;
+  }
+
+  if (payload.status === "queued" && payload.estimated_start_at) {
+    const start = new Date(payload.estimated_start_at).toLocaleTimeString();
+    const finish = new Date(payload.estimated_finish_at).toLocaleTimeString();
+    setStatus(`Job ${jobId} is queued (estimated start ${start}, finish ${finish}).`);
+    return;
+  }
+
+  setStatus(`Job ${jobId} is ${payload.status}.`);
+}
+
 async function pollStatus(jobId) {
   try {
     const response = await fetch(`/api/status/${jobId}`);
@@ -23,69 +102,165 @@ async function pollStatus(jobId) {
       return;
     }
     const payload = await response.json();
-    setProgress(payload.progress || 0);
-
-    if (payload.status === "done" && payload.download_url) {
-      setStatus(`Done. Job ${jobId} ready.`);
-      downloadEl.href = payload.download_url;
-      downloadEl.style.display = "inline-flex";
-      clearInterval(pollTimer);
-      pollTimer = null;
-      return;
+    applyStatus(jobId, payload);
+  } catch (err) {
+    setStatus("Status check failed.");
+  }
+}
+
+function startPolling(jobId) {
+  stopTracking();
+  cancelEl.style.display = "inline-flex";
+  pollStatus(jobId);
+  pollTimer = setInterval(() => pollStatus(jobId), 2000);
+}
+
+function trackJob(jobId) {
+  stopTracking();
+  cancelEl.style.display = "inline-flex";
+  if (!window.EventSource) {
+    startPolling(jobId);
+    return;
+  }
+
+  eventSource = new EventSource(`/api/status/${jobId}/events`);
+  eventSource.addEventListener("status", (event) => {
+    applyStatus(jobId, JSON.parse(event.data));
+  });
+  eventSource.onerror = () => {
+    if (eventSource) {
+      startPolling(jobId);
     }
+  };
+}
 
-    if (payload.status === "error") {
-      setStatus(`Error: ${payload.error || "Unknown error"}`);
-      clearInterval(pollTimer);
-      pollTimer = null;
-      return;
+function sleep(ms) {
+  return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+async function readError(response, fallback) {
+  const payload = await response.json().catch(() => ({}));
+  return payload.detail || fallback;
+}
+
+async function fetchOffset(uploadId) {
+  const response = await fetch(`/api/uploads/${uploadId}`);
+  if (!response.ok) {
+    throw new Error(await readError(response, "Upload session lost."));
+  }
+  const payload = await response.json();
+  return payload.offset;
+}
+
+async function uploadResumable(file, profile, targetMb) {
+  const created = await fetch("/api/uploads", {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({
+      filename: file.name,
+      size: file.size,
+      profile,
+      content_type: file.type || null,
+      target_mb: targetMb,
+    }),
+  });
+  if (!created.ok) {
+    throw new Error(await readError(created, "Upload failed."));
+  }
+  const session = await created.json();
+  const uploadId = session.upload_id;
+  const chunkSize = session.chunk_size;
+
+  let offset = session.offset;
+  let failures = 0;
+  let resync = false;
+  while (offset < file.size) {
+    try {
+      if (resync) {
+        offset = await fetchOffset(uploadId);
+        resync = false;
+        continue;
+      }
+      const chunk = file.slice(offset, Math.min(offset + chunkSize, file.size));
+      const response = await fetch(`/api/uploads/${uploadId}`, {
+        method: "PATCH",
+        headers: {
+          "Content-Type": "application/offset+octet-stream",
+          "Upload-Offset": String(offset),
+        },
+        body: chunk,
+      });
+      if (response.status === 409) {
+        resync = true;
+        continue;
+      }
+      if (response.status >= 500) {
+        throw new TypeError("Server error");
+      }
+      if (!response.ok) {
+        throw new Error(await readError(response, "Upload failed."));
+      }
+      const payload = await response.json();
+      offset = payload.offset;
+      failures = 0;
+      setStatus(`Uploading... ${Math.floor((offset / file.size) * 100)}%`);
+      setProgress((offset / file.size) * 100);
+    } catch (err) {
+      if (!(err instanceof TypeError) || failures >= 5) {
+        throw err;
+      }
+      failures += 1;
+      resync = true;
+      setStatus("Connection lost, resuming upload...");
+      await sleep(1000 * 2 ** failures);
     }
+  }
 
-    setStatus(`Job ${jobId} is ${payload.status}.`);
-  } catch (err) {
-    setStatus("Status check failed.");
+  const completed = await fetch(`/api/uploads/${uploadId}/complete`, { method: "POST" });
+  if (!completed.ok) {
+    throw new Error(await readError(completed, "Upload failed."));
   }
+  return completed.json();
 }
 
 form.addEventListener("submit", async (event) => {
   event.preventDefault();
   const fileInput = document.getElementById("file");
   const profile = document.getElementById("profile").value;
+  const targetValue = document.getElementById("target-mb").value;
+  const targetMb = targetValue ? Number.parseInt(targetValue, 10) : null;
 
   if (!fileInput.files.length) {
     setStatus("Select a file first.");
     return;
   }
 
-  const data = new FormData();
-  data.append("file", fileInput.files[0]);
-  data.append("profile", profile);
-
   setStatus("Uploading...");
   setProgress(0);
   downloadEl.style.display = "none";
+  outputsEl.replaceChildren();
+  stopTracking();
 
   try {
-    const response = await fetch("/api/upload", {
-      method: "POST",
-      body: data,
-    });
-
-    if (!response.ok) {
-      const payload = await response.json().catch(() => ({}));
-      setStatus(payload.detail || "Upload failed.");
-      return;
-    }
-
-    const payload = await response.json();
+    const payload = await uploadResumable(fileInput.files[0], profile, targetMb);
     currentJobId = payload.job_id;
+    setProgress(0);
     setStatus(`Uploaded. Job ${currentJobId} queued.`);
-
-    if (pollTimer) {
-      clearInterval(pollTimer);
-    }
-    pollTimer = setInterval(() => pollStatus(currentJobId), 2000);
+    trackJob(currentJobId);
   } catch (err) {
-    setStatus("Upload failed.");
+    setStatus(err.message || "Upload failed.");
+  }
+});
+
+cancelEl.addEventListener("click", async () => {
+  if (!currentJobId) {
+    return;
+  }
+  const response = await fetch(`/api/jobs/${currentJobId}`, { method: "DELETE" });
+  if (!response.ok) {
+    setStatus(await readError(response, "Unable to cancel the job."));
+    return;
   }
-});
\ No newline at end of file
+  setStatus(`Job ${currentJobId} was cancelled.`);
+  stopTracking();
+});
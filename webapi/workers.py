@@ -0,0 +1,384 @@
+import asyncio
+import json
+import logging
+import os
+import secrets
+from pathlib import Path
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from app.cache import restore_job_outputs, store_job_outputs
+from app.deliveries import queue_job_delivery
+from app.doorbell import ring
+from app.eta import announce_worker
+from app.jobs import (
+    get_job,
+    job_output_paths,
+    job_profiles,
+    job_target_bytes,
+    lock_next_job,
+    measure_outputs,
+    metrics_profile,
+    queue_stats,
+    reap_expired_leases,
+    release_job,
+    renew_lease,
+    save_job_outputs,
+    update_job,
+    update_owned_job,
+)
+from app.lifecycle import reap_cancelled_inputs
+from app.media import run_ffprobe
+from app.metrics import ENCODE_METRICS, queue_wait_seconds, record_job_metrics
+from app.progress import clear_progress, publish_progress
+from app.scheduling import choose_preset
+from app.utils import ensure_dir
+from webapi.downloads import file_response
+from webapi.ingest import ChunkWriter
+
+logger = logging.getLogger("webapi")
+
+# Remote outputs are normally smaller than their input; this bounds a broken or
+# hostile worker without rejecting the occasional larger encode.
+MAX_OUTPUT_FACTOR = 2
+COMPLETE_STATUSES = {"done", "error", "requeue"}
+PROGRESS_FIELDS = {"percent", "fps", "speed", "eta_seconds"}
+
+
+class ClaimRequest(BaseModel):
+    worker_id: str
+
+
+class AnnounceRequest(BaseModel):
+    worker_id: str
+    slots: int
+
+
+class HeartbeatRequest(BaseModel):
+    worker_id: str
+    progress: dict | None = None
+
+
+class CompleteRequest(BaseModel):
+    worker_id: str
+    status: str
+    error_message: str = ""
+    encode_mode: str | None = None
+    encoder_preset: str | None = None
+    metrics: dict | None = None
+
+
+def _remove_file(path: str | Path) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def reap_job_leases_forever(settings) -> None:
+    interval = max(1, settings.job_lease_seconds / 2)
+    while True:
+        try:
+            reaped = await asyncio.to_thread(
+                reap_expired_leases, settings.sqlite_path, settings.job_max_attempts
+            )
+            if reaped:
+                logger.warning(f"job_leases_reaped count={len(reaped)}")
+            if any(job["status"] == "queued" for job in reaped):
+                ring(settings.doorbell_path)
+            await asyncio.to_thread(
+                reap_cancelled_inputs,
+                settings.sqlite_path,
+                settings.delete_inputs_on_completion,
+            )
+        except Exception:
+            logger.exception("lease_reap_failed")
+        await asyncio.sleep(interval)
+
+
+def build_worker_router(settings) -> APIRouter:
+    outputs_dir = Path(settings.storage_path) / "outputs"
+
+    def require_token(request: Request) -> None:
+        if not settings.worker_api_token:
+            raise HTTPException(status_code=404, detail="Not found")
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(
+            token.encode(), settings.worker_api_token.encode()
+        ):
+            raise HTTPException(status_code=401, detail="Invalid worker token")
+
+    router = APIRouter(prefix="/api/worker", dependencies=[Depends(require_token)])
+
+    async def owned_job(job_id: str, worker_id: str) -> dict:
+        job = await asyncio.to_thread(get_job, settings.sqlite_path, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        if job["status"] != "processing" or job["worker_id"] != worker_id:
+            raise HTTPException(status_code=409, detail="Lease lost")
+        return job
+
+    def _fail(job: dict, message: str, **fields) -> bool:
+        failed = update_owned_job(
+            settings.sqlite_path,
+            job["id"],
+            job["worker_id"],
+            status="error",
+            error_message=message,
+            **fields,
+        )
+        if failed and settings.delete_inputs_on_completion and job["input_owned"]:
+            _remove_file(job["input_path"])
+        return failed
+
+    def _prepare(job: dict) -> dict | None:
+        job_id = job["id"]
+        if not os.path.exists(job["input_path"]):
+            _fail(job, "Input file missing")
+            return None
+
+        outputs = job_output_paths(outputs_dir, job)
+        output_path = next(iter(outputs.values()))
+        cached_duration = restore_job_outputs(job, settings, outputs)
+        if cached_duration is not None:
+            sizes = measure_outputs(outputs)
+            if len(sizes) > 1:
+                save_job_outputs(settings.sqlite_path, job_id, sizes)
+            output_bytes = sizes[0]["output_bytes"]
+            update_job(
+                settings.sqlite_path,
+                job_id,
+                status="done",
+                output_path=output_path,
+                output_bytes=output_bytes,
+                duration_seconds=cached_duration,
+                progress=100,
+            )
+            logger.info("job_cache_hit", extra={"job_id": job_id})
+            queue_job_delivery(job, settings, output_bytes)
+            return None
+
+        if job.get("probe_json"):
+            probe = json.loads(job["probe_json"])
+        else:
+            probe = run_ffprobe(job["input_path"])
+        if probe["duration"] <= 0:
+            _fail(job, "Unable to determine duration")
+            return None
+        if probe["duration"] > settings.max_duration_seconds:
+            _fail(job, "Duration exceeds limit", duration_seconds=int(probe["duration"]))
+            return None
+
+        queue_depth, oldest_wait = queue_stats(settings.sqlite_path)
+        preset = choose_preset(
+            settings.encoder_presets,
+            settings.preset_queue_depths,
+            settings.preset_wait_seconds,
+            queue_depth,
+            oldest_wait,
+        )
+        return {
+            "job": {
+                "id": job_id,
+                "profile": job["profile"],
+                "profiles": job["profiles"],
+                "input_bytes": job["input_bytes"],
+                "target_bytes": job_target_bytes(job, settings),
+            },
+            "probe": probe,
+            "encoder_preset": preset,
+            "lease_seconds": settings.job_lease_seconds,
+        }
+
+    def _claim(worker_id: str) -> dict | None:
+        while True:
+            job = lock_next_job(
+                settings.sqlite_path, worker_id, settings.job_lease_seconds
+            )
+            if not job:
+                return None
+            try:
+                claimed = _prepare(job)
+            except Exception as exc:
+                _fail(job, str(exc))
+                logger.exception("job_failed", extra={"job_id": job["id"]})
+                continue
+            if claimed:
+                logger.info(
+                    f"job_claimed worker_id={worker_id}", extra={"job_id": job["id"]}
+                )
+                return claimed
+
+    @router.post("/claim")
+    async def claim_job(body: ClaimRequest):
+        claimed = await asyncio.to_thread(_claim, body.worker_id)
+        if not claimed:
+            return Response(status_code=204)
+        return claimed
+
+    @router.post("/announce")
+    async def announce(body: AnnounceRequest):
+        await asyncio.to_thread(
+            announce_worker,
+            settings.sqlite_path,
+            body.worker_id,
+            max(body.slots, 0),
+            settings.job_lease_seconds,
+        )
+        return {"lease_seconds": settings.job_lease_seconds}
+
+    @router.get("/jobs/{job_id}/input")
+    async def job_input(job_id: str, worker_id: str, request: Request):
+        job = await owned_job(job_id, worker_id)
+        if not os.path.exists(job["input_path"]):
+            raise HTTPException(status_code=404, detail="Input missing")
+        return await asyncio.to_thread(
+            file_response,
+            request,
+            job["input_path"],
+            f"{job_id}.input",
+            "application/octet-stream",
+        )
+
+    @router.post("/jobs/{job_id}/heartbeat")
+    async def job_heartbeat(job_id: str, body: HeartbeatRequest):
+        renewed = await asyncio.to_thread(
+            renew_lease,
+            settings.sqlite_path,
+            job_id,
+            body.worker_id,
+            settings.job_lease_seconds,
+        )
+        if not renewed:
+            raise HTTPException(status_code=409, detail="Lease lost")
+        progress = {
+            key: value
+            for key, value in (body.progress or {}).items()
+            if key in PROGRESS_FIELDS
+        }
+        if progress:
+            await asyncio.to_thread(
+                publish_progress, settings.progress_path, job_id, **progress
+            )
+        return {"lease_seconds": settings.job_lease_seconds}
+
+    def upload_paths(job: dict) -> dict[str, str]:
+        return {
+            profile: f"{output_path}.upload"
+            for profile, output_path in job_output_paths(outputs_dir, job).items()
+        }
+
+    def _start_upload(upload_path: Path) -> None:
+        ensure_dir(outputs_dir)
+        upload_path.write_bytes(b"")
+
+    @router.put("/jobs/{job_id}/output")
+    async def job_output(
+        job_id: str, worker_id: str, request: Request, profile: str | None = None
+    ):
+        job = await owned_job(job_id, worker_id)
+        uploads = upload_paths(job)
+        if profile is not None and profile not in uploads:
+            raise HTTPException(status_code=400, detail="Unknown output profile")
+        upload_path = Path(uploads[profile or job_profiles(job)[0]])
+        await asyncio.to_thread(_start_upload, upload_path)
+        limit = max(job["input_bytes"], settings.max_upload_mb * 1024 * 1024)
+        writer = ChunkWriter(str(upload_path), 0)
+        try:
+            await writer.receive(request, limit * MAX_OUTPUT_FACTOR)
+        except BaseException:
+            _remove_file(upload_path)
+            raise
+        return {"bytes": writer.written}
+
+    def _complete(job: dict, body: CompleteRequest) -> bool:
+        job_id = job["id"]
+        outputs = job_output_paths(outputs_dir, job)
+        uploads = upload_paths(job)
+        if body.status == "requeue":
+            for upload_path in uploads.values():
+                _remove_file(upload_path)
+            if release_job(settings.sqlite_path, job_id, body.worker_id):
+                ring(settings.doorbell_path)
+                logger.warning("job_requeued", extra={"job_id": job_id})
+            return True
+
+        clear_progress(settings.progress_path, job_id)
+        if body.status == "error":
+            for upload_path in uploads.values():
+                _remove_file(upload_path)
+            if not _fail(job, body.error_message or "Remote worker failed"):
+                return False
+            logger.warning(
+                f"job_failed error={body.error_message}", extra={"job_id": job_id}
+            )
+            return True
+
+        for profile, output_path in outputs.items():
+            os.replace(uploads[profile], output_path)
+        sizes = measure_outputs(outputs)
+        if len(sizes) > 1:
+            save_job_outputs(settings.sqlite_path, job_id, sizes)
+        output_path = sizes[0]["output_path"]
+        output_bytes = sizes[0]["output_bytes"]
+        duration = job["duration_seconds"]
+        finished = update_owned_job(
+            settings.sqlite_path,
+            job_id,
+            body.worker_id,
+            status="done",
+            output_path=output_path,
+            output_bytes=output_bytes,
+            progress=100,
+            encode_mode=body.encode_mode,
+            encoder_preset=body.encoder_preset,
+        )
+        if not finished:
+            for output_path in outputs.values():
+                _remove_file(output_path)
+            return False
+        probe = json.loads(job["probe_json"]) if job.get("probe_json") else {}
+        values = {
+            key: value
+            for key, value in (body.metrics or {}).items()
+            if key in ENCODE_METRICS and isinstance(value, (int, float))
+        }
+        try:
+            record_job_metrics(
+                settings.sqlite_path,
+                job_id,
+                metrics_profile(job),
+                {
+                    "queue_wait_seconds": queue_wait_seconds(job),
+                    "probe_seconds": probe.get("probe_seconds"),
+                    **values,
+                },
+            )
+        except Exception:
+            logger.warning("metrics_record_failed", extra={"job_id": job_id})
+        try:
+            store_job_outputs(job, settings, sizes, duration)
+        except Exception:
+            logger.exception("cache_store_failed", extra={"job_id": job_id})
+        queue_job_delivery(job, settings, output_bytes)
+        if settings.delete_inputs_on_completion and job["input_owned"]:
+            _remove_file(job["input_path"])
+        logger.info(f"job_done worker_id={body.worker_id}", extra={"job_id": job_id})
+        return True
+
+    @router.post("/jobs/{job_id}/complete")
+    async def complete_job(job_id: str, body: CompleteRequest):
+        if body.status not in COMPLETE_STATUSES:
+            raise HTTPException(status_code=400, detail="Invalid status")
+        job = await owned_job(job_id, body.worker_id)
+        if body.status == "done" and not all(
+            os.path.exists(path) for path in upload_paths(job).values()
+        ):
+            raise HTTPException(status_code=400, detail="Output not uploaded")
+        if not await asyncio.to_thread(_complete, job, body):
+            raise HTTPException(status_code=409, detail="Lease lost")
+        return {"status": body.status}
+
+    return router
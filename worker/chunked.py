@@ -0,0 +1,168 @@
+import logging
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+from app.media import choose_split_points
+from worker.ffmpeg import (
+    AnyEvent,
+    JobAborted,
+    build_audio_cmd,
+    build_ffmpeg_cmd,
+    run_concat,
+    run_ffmpeg,
+    run_keyframe_probe,
+)
+
+logger = logging.getLogger("worker")
+
+
+def plan_segments(input_path: str, probe: dict, settings) -> list[tuple[float, float]]:
+    duration = probe["duration"]
+    if settings.chunk_min_duration_seconds <= 0:
+        return [(0.0, duration)]
+    if duration < settings.chunk_min_duration_seconds:
+        return [(0.0, duration)]
+    try:
+        keyframes = run_keyframe_probe(input_path, probe.get("start_time", 0.0))
+    except Exception:
+        logger.warning("keyframe_probe_failed")
+        return [(0.0, duration)]
+    return choose_split_points(keyframes, duration, settings.chunk_target_seconds)
+
+
+def encode_chunked(
+    input_path: str,
+    output_path: str,
+    profile: str,
+    probe: dict,
+    segments: list[tuple[float, float]],
+    settings,
+    on_progress: Callable[[int, dict], None],
+    threads: int | None = None,
+    abort: threading.Event | None = None,
+    preset: str | None = None,
+    video_bitrate: int | None = None,
+) -> None:
+    parallelism = max(1, min(settings.chunk_parallelism, len(segments)))
+    segment_threads = max(1, threads // parallelism) if threads else None
+    work_dir = Path(f"{output_path}.parts")
+    work_dir.mkdir(parents=True, exist_ok=True)
+    # Audio is encoded once over the whole input and muxed in at the end: AAC
+    # priming and padding at every segment boundary would leave audible gaps.
+    audio_path = str(work_dir / "audio.m4a") if probe.get("audio_codec") else None
+
+    total = sum(end - start for start, end in segments) or 1.0
+    percents = [0] * len(segments)
+    rates = [{"fps": 0.0, "speed": 0.0} for _ in segments]
+    lock = threading.Lock()
+    last_reported = [-1]
+    failed = threading.Event()
+    stop = AnyEvent(abort, failed)
+
+    def _segment_progress(index: int, percent: int, stats: dict) -> None:
+        with lock:
+            percents[index] = percent
+            rates[index] = stats if percent < 100 else {"fps": 0.0, "speed": 0.0}
+            overall = int(
+                sum(
+                    value * (end - start)
+                    for value, (start, end) in zip(percents, segments)
+                )
+                / total
+            )
+            if overall == last_reported[0]:
+                return
+            last_reported[0] = overall
+            combined = {
+                "fps": sum(rate["fps"] for rate in rates),
+                "speed": sum(rate["speed"] for rate in rates),
+            }
+        on_progress(overall, combined)
+
+    def _encode(index: int) -> str:
+        start, end = segments[index]
+        segment_path = str(work_dir / f"{index:05d}.mp4")
+        cmd = build_ffmpeg_cmd(
+            input_path,
+            segment_path,
+            profile,
+            probe["width"],
+            probe["height"],
+            threads=segment_threads,
+            input_args=["-ss", f"{start:.6f}", "-t", f"{end - start:.6f}"],
+            preset=preset,
+            video_bitrate=video_bitrate,
+            audio=False,
+        )
+        attempts = settings.chunk_retries + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                run_ffmpeg(
+                    cmd,
+                    end - start,
+                    lambda percent, stats: _segment_progress(index, percent, stats),
+                    stop,
+                )
+                _segment_progress(index, 100, {})
+                return segment_path
+            except JobAborted:
+                raise
+            except Exception:
+                if attempt >= attempts:
+                    failed.set()
+                    raise
+                logger.warning(f"segment_retry index={index} attempt={attempt}")
+                with lock:
+                    percents[index] = 0
+        raise RuntimeError("segment encode failed")
+
+    def _encode_audio() -> None:
+        cmd = build_audio_cmd(input_path, audio_path, profile, video_bitrate)
+        attempts = settings.chunk_retries + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                run_ffmpeg(cmd, total, lambda percent, stats: None, stop)
+                return
+            except JobAborted:
+                raise
+            except Exception:
+                if attempt >= attempts:
+                    failed.set()
+                    raise
+                logger.warning(f"audio_retry attempt={attempt}")
+
+    try:
+        with ThreadPoolExecutor(
+            max_workers=parallelism + (1 if audio_path else 0),
+            thread_name_prefix="segment",
+        ) as executor:
+            audio_future = executor.submit(_encode_audio) if audio_path else None
+            futures = [executor.submit(_encode, index) for index in range(len(segments))]
+            errors = []
+            paths = []
+            for future in futures:
+                try:
+                    paths.append(future.result())
+                except Exception as exc:
+                    errors.append(exc)
+            if audio_future is not None and audio_future.exception() is not None:
+                errors.append(audio_future.exception())
+
+        if abort is not None and abort.is_set():
+            raise JobAborted("ffmpeg aborted")
+        for error in errors:
+            if not isinstance(error, JobAborted):
+                raise error
+
+        list_path = work_dir / "segments.txt"
+        list_path.write_text(
+            "".join(f"file '{os.path.abspath(path)}'\n" for path in paths),
+            encoding="utf-8",
+        )
+        run_concat(str(list_path), output_path, audio_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,351 @@
+import subprocess
+import threading
+import time
+
+from app.media import parse_keyframe_times, parse_timecode
+
+
+class JobAborted(RuntimeError):
+    pass
+
+
+class AnyEvent:
+    def __init__(self, *events: threading.Event | None) -> None:
+        self._events = [event for event in events if event is not None]
+
+    def is_set(self) -> bool:
+        return any(event.is_set() for event in self._events)
+
+
+# Inputs at or under these limits would not shrink meaningfully when re-encoded
+# with the profile, so they are remuxed or only have their audio re-encoded.
+COPY_LIMITS = {
+    "small": {"max_height": 480, "video_bitrate": 1_200_000, "audio_bitrate": 96_000},
+    "balanced": {"max_height": 720, "video_bitrate": 2_000_000, "audio_bitrate": 128_000},
+    "hq": {"max_height": 1080, "video_bitrate": 5_000_000, "audio_bitrate": 160_000},
+}
+COPY_VIDEO_CODECS = {"h264"}
+COPY_PIX_FMTS = {"yuv420p", "yuvj420p"}
+COPY_AUDIO_CODECS = {"aac"}
+AUDIO_BITRATES = {"small": "96k", "balanced": "128k", "hq": "128k", "fit": "96k"}
+
+# Target-size encodes reserve a little room for the MP4 container and scale
+# down as the bitrate budget shrinks.
+FIT_AUDIO_BITRATE = 96_000
+FIT_MIN_VIDEO_BITRATE = 150_000
+FIT_OVERHEAD = 0.97
+FIT_HEIGHTS = [(2_500_000, 1080), (1_200_000, 720), (600_000, 480), (0, 360)]
+
+
+def fit_video_bitrate(duration: float, target_bytes: int) -> int:
+    if duration <= 0:
+        raise RuntimeError("Unable to determine duration")
+    total = target_bytes * 8 * FIT_OVERHEAD / duration
+    video_bitrate = int(total - FIT_AUDIO_BITRATE)
+    if video_bitrate < FIT_MIN_VIDEO_BITRATE:
+        raise RuntimeError("Target size too small for duration")
+    return video_bitrate
+
+
+def fit_height(video_bitrate: int) -> int:
+    for min_bitrate, height in FIT_HEIGHTS:
+        if video_bitrate >= min_bitrate:
+            return height
+    return FIT_HEIGHTS[-1][1]
+
+
+def run_keyframe_probe(input_path: str, start_time: float = 0.0) -> list[float]:
+    cmd = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "packet=pts_time,flags",
+        "-of",
+        "csv=p=0",
+        input_path,
+    ]
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        detail = result.stderr.strip() or result.stdout.strip()
+        raise RuntimeError(f"ffprobe failed: {detail}")
+    return parse_keyframe_times(result.stdout, start_time)
+
+
+def profile_options(
+    profile: str,
+    height: int,
+    preset: str | None = None,
+    video_bitrate: int | None = None,
+) -> tuple[int, list[str], list[str]]:
+    if video_bitrate:
+        cap = 720 if profile in ("small", "balanced", "fit") else 1080
+        target_height = min(height, cap, fit_height(video_bitrate))
+        video_opts = [
+            "-c:v",
+            "libx264",
+            "-b:v",
+            str(video_bitrate),
+            "-maxrate",
+            str(video_bitrate),
+            "-bufsize",
+            str(video_bitrate * 2),
+        ]
+        audio_opts = ["-c:a", "aac", "-b:a", str(FIT_AUDIO_BITRATE)]
+    elif profile == "small":
+        if height > 720:
+            target_height = 720
+        elif height > 480:
+            target_height = 480
+        else:
+            target_height = height
+        video_opts = ["-c:v", "libx264", "-b:v", "1000k", "-maxrate", "1200k", "-bufsize", "2000k"]
+        audio_opts = ["-c:a", "aac", "-b:a", "96k"]
+    elif profile == "balanced":
+        target_height = 720 if height > 720 else height
+        video_opts = ["-c:v", "libx264", "-b:v", "1600k", "-maxrate", "2000k", "-bufsize", "3000k"]
+        audio_opts = ["-c:a", "aac", "-b:a", "128k"]
+    else:
+        target_height = 1080 if height > 1080 else height
+        video_opts = ["-c:v", "libx264", "-crf", "23"]
+        preset = preset or "medium"
+        audio_opts = ["-c:a", "aac", "-b:a", "128k"]
+
+    if preset:
+        video_opts += ["-preset", preset]
+    return target_height, video_opts, audio_opts
+
+
+def build_ffmpeg_cmd(
+    input_path: str,
+    output_path: str,
+    profile: str,
+    width: int,
+    height: int,
+    threads: int | None = None,
+    input_args: list[str] | None = None,
+    preset: str | None = None,
+    video_bitrate: int | None = None,
+    audio: bool = True,
+) -> list[str]:
+    cmd = ["ffmpeg", "-y"] + (input_args or []) + ["-i", input_path]
+    target_height, video_opts, audio_opts = profile_options(
+        profile, height, preset, video_bitrate
+    )
+    if not audio:
+        audio_opts = ["-an"]
+    if target_height < height:
+        cmd += ["-vf", f"scale=-2:{target_height}"]
+    if threads:
+        cmd += ["-threads", str(threads)]
+
+    cmd += (
+        video_opts
+        + audio_opts
+        + ["-movflags", "+faststart", "-progress", "pipe:1", "-nostats", "-v", "error", output_path]
+    )
+    return cmd
+
+
+def build_audio_cmd(
+    input_path: str,
+    output_path: str,
+    profile: str,
+    video_bitrate: int | None = None,
+) -> list[str]:
+    _, _, audio_opts = profile_options(profile, 0, video_bitrate=video_bitrate)
+    return (
+        ["ffmpeg", "-y", "-i", input_path, "-map", "0:a:0", "-vn"]
+        + audio_opts
+        + ["-progress", "pipe:1", "-nostats", "-v", "error", output_path]
+    )
+
+
+def build_ladder_cmd(
+    input_path: str,
+    outputs: list[tuple[str, str]],
+    height: int,
+    threads: int | None = None,
+    preset: str | None = None,
+) -> list[str]:
+    # The input is decoded once; each distinct output height is scaled once
+    # and split again between the profiles that share it.
+    targets = [
+        (output_path, *profile_options(profile, height, preset))
+        for profile, output_path in outputs
+    ]
+    heights = sorted({target[1] for target in targets}, reverse=True)
+    graph = []
+    sources = ["[0:v]"]
+    if len(heights) > 1:
+        sources = [f"[h{index}]" for index in range(len(heights))]
+        graph.append(f"[0:v]split={len(heights)}{''.join(sources)}")
+    for source, target_height in zip(sources, heights):
+        users = [
+            f"[v{index}]"
+            for index, (_, output_height, _, _) in enumerate(targets)
+            if output_height == target_height
+        ]
+        scale = f"scale=-2:{target_height}" if target_height < height else "null"
+        if len(users) > 1:
+            scale += f",split={len(users)}"
+        graph.append(f"{source}{scale}{''.join(users)}")
+
+    cmd = [
+        "ffmpeg",
+        "-y",
+        "-i",
+        input_path,
+        "-filter_complex",
+        ";".join(graph),
+        "-progress",
+        "pipe:1",
+        "-nostats",
+        "-v",
+        "error",
+    ]
+    for index, (output_path, _, video_opts, audio_opts) in enumerate(targets):
+        cmd += ["-map", f"[v{index}]", "-map", "0:a:0?"]
+        if threads:
+            cmd += ["-threads", str(max(1, threads // len(targets)))]
+        cmd += video_opts + audio_opts + ["-movflags", "+faststart", output_path]
+    return cmd
+
+
+def choose_encode_mode(probe: dict, profile: str) -> str:
+    limits = COPY_LIMITS.get(profile)
+    if not limits:
+        return "encode"
+    video_bitrate = probe.get("video_bitrate")
+    if (
+        probe.get("video_codec") not in COPY_VIDEO_CODECS
+        or probe.get("pix_fmt") not in COPY_PIX_FMTS
+        or not probe.get("height")
+        or probe["height"] > limits["max_height"]
+        or not video_bitrate
+        or video_bitrate > limits["video_bitrate"]
+    ):
+        return "encode"
+
+    audio_codec = probe.get("audio_codec")
+    if audio_codec is None:
+        return "remux"
+    audio_bitrate = probe.get("audio_bitrate")
+    if audio_codec in COPY_AUDIO_CODECS and (
+        audio_bitrate is None or audio_bitrate <= limits["audio_bitrate"]
+    ):
+        return "remux"
+    return "copy_video"
+
+
+def build_copy_cmd(
+    input_path: str, output_path: str, profile: str, copy_audio: bool
+) -> list[str]:
+    if copy_audio:
+        audio_opts = ["-c:a", "copy"]
+    else:
+        audio_opts = ["-c:a", "aac", "-b:a", AUDIO_BITRATES.get(profile, "128k")]
+    return (
+        ["ffmpeg", "-y", "-i", input_path, "-map", "0:v:0", "-map", "0:a:0?", "-c:v", "copy"]
+        + audio_opts
+        + ["-movflags", "+faststart", "-progress", "pipe:1", "-nostats", "-v", "error", output_path]
+    )
+
+
+def _parse_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def run_ffmpeg(
+    cmd: list[str],
+    duration: float,
+    on_progress,
+    abort: threading.Event | None = None,
+) -> dict:
+    last_percent = -1
+    last_update = 0.0
+    out_time = 0.0
+    stats = {"fps": 0.0, "speed": 0.0, "bitrate_kbps": 0.0, "total_size": 0}
+    proc = subprocess.Popen(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+    )
+    if not proc.stdout:
+        raise RuntimeError("Failed to capture ffmpeg progress")
+
+    for line in proc.stdout:
+        if abort is not None and abort.is_set():
+            proc.terminate()
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.wait()
+            raise JobAborted("ffmpeg aborted")
+        line = line.strip()
+        if "=" not in line:
+            continue
+        key, value = line.split("=", 1)
+        if key == "out_time_ms":
+            try:
+                out_time = int(value) / 1_000_000.0
+            except ValueError:
+                pass
+        elif key == "out_time":
+            out_time = parse_timecode(value)
+        elif key == "fps":
+            stats["fps"] = _parse_float(value)
+        elif key == "speed":
+            stats["speed"] = _parse_float(value.rstrip("x"))
+        elif key == "bitrate":
+            stats["bitrate_kbps"] = _parse_float(value.removesuffix("kbits/s"))
+        elif key == "total_size":
+            stats["total_size"] = int(_parse_float(value))
+        elif key == "progress":
+            if value == "end":
+                out_time = duration
+            if duration <= 0:
+                continue
+            percent = min(100, int((out_time / duration) * 100))
+            now = time.monotonic()
+            if percent != last_percent and (now - last_update > 0.5 or value == "end"):
+                on_progress(percent, dict(stats))
+                last_percent = percent
+                last_update = now
+
+    return_code = proc.wait()
+    if return_code != 0:
+        raise RuntimeError("ffmpeg failed")
+    return stats
+
+
+def build_concat_cmd(
+    list_path: str, output_path: str, audio_path: str | None = None
+) -> list[str]:
+    cmd = ["ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path:
+        cmd += ["-i", audio_path, "-map", "0:v:0", "-map", "1:a:0"]
+    return cmd + [
+        "-c",
+        "copy",
+        "-movflags",
+        "+faststart",
+        "-v",
+        "error",
+        output_path,
+    ]
+
+
+def run_concat(list_path: str, output_path: str, audio_path: str | None = None) -> None:
+    result = subprocess.run(
+        build_concat_cmd(list_path, output_path, audio_path),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        detail = result.stderr.strip() or result.stdout.strip()
+        raise RuntimeError(f"ffmpeg concat failed: {detail}")
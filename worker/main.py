@@ -1,255 +1,442 @@
-import asyncio
 import json
 import logging
 import os
-import subprocess
+import signal
+import threading
 import time
 from pathlib import Path
+from typing import Callable
 
-from telegram import Bot
-
+from app.cache import restore_job_outputs, store_job_outputs
 from app.config import load_settings
-from app.jobs import lock_next_job, update_job
+from app.deliveries import queue_job_delivery
+from app.doorbell import ring
+from app.jobs import (
+    get_job,
+    job_output_paths,
+    job_target_bytes,
+    measure_outputs,
+    metrics_profile,
+    queue_stats,
+    release_job,
+    save_job_outputs,
+    update_owned_job,
+)
 from app.logging import setup_logging
-from app.media import parse_ffprobe_json, parse_timecode
-from app.utils import build_download_url, ensure_dir
+from app.media import run_ffprobe
+from app.metrics import queue_wait_seconds, record_job_metrics
+from app.progress import clear_progress, publish_progress
+from app.scheduling import choose_preset
+from app.utils import ensure_dir
+from worker.chunked import encode_chunked, plan_segments
+from worker.ffmpeg import (
+    JobAborted,
+    build_copy_cmd,
+    build_ffmpeg_cmd,
+    build_ladder_cmd,
+    choose_encode_mode,
+    fit_video_bitrate,
+    run_ffmpeg,
+)
+from worker.metrics import WORKER_METRICS, encode_metrics, start_metrics_server
+from worker.slots import plan_slots, run_slots
 
 logger = logging.getLogger("worker")
 
 
-def run_ffprobe(input_path: str) -> dict:
-    cmd = [
-        "ffprobe",
-        "-v",
-        "error",
-        "-print_format",
-        "json",
-        "-show_format",
-        "-show_streams",
-        input_path,
-    ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
-    if result.returncode != 0:
-        detail = result.stderr.strip() or result.stdout.strip()
-        raise RuntimeError(f"ffprobe failed: {detail}")
-    payload = json.loads(result.stdout)
-    parsed = parse_ffprobe_json(payload)
-    if not parsed["has_video"]:
-        raise RuntimeError("No video stream detected")
-    return parsed
-
-
-def build_ffmpeg_cmd(
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _remove_outputs(outputs: dict[str, str]) -> None:
+    for output_path in outputs.values():
+        _remove_file(output_path)
+
+
+def _store_cached_output(
+    job: dict, settings, outputs: list[dict], duration: int
+) -> None:
+    try:
+        store_job_outputs(job, settings, outputs, duration)
+    except Exception:
+        logger.warning("cache_store_failed", extra={"job_id": job["id"]})
+
+
+def _record_metrics(job: dict, settings, values: dict) -> None:
+    try:
+        record_job_metrics(
+            settings.sqlite_path, job["id"], metrics_profile(job), values
+        )
+    except Exception:
+        logger.warning("metrics_record_failed", extra={"job_id": job["id"]})
+
+
+def _encode(
+    job_id: str,
     input_path: str,
     output_path: str,
     profile: str,
-    width: int,
-    height: int,
-) -> list[str]:
-    cmd = ["ffmpeg", "-y", "-i", input_path]
-
-    filters = []
-    if profile == "small":
-        if height > 720:
-            target_height = 720
-        elif height > 480:
-            target_height = 480
-        else:
-            target_height = height
-        if target_height < height:
-            filters.append(f"scale=-2:{target_height}")
-        video_opts = ["-c:v", "libx264", "-b:v", "1000k", "-maxrate", "1200k", "-bufsize", "2000k"]
-        audio_opts = ["-c:a", "aac", "-b:a", "96k"]
-    elif profile == "balanced":
-        target_height = 720 if height > 720 else height
-        if target_height < height:
-            filters.append(f"scale=-2:{target_height}")
-        video_opts = ["-c:v", "libx264", "-b:v", "1600k", "-maxrate", "2000k", "-bufsize", "3000k"]
-        audio_opts = ["-c:a", "aac", "-b:a", "128k"]
-    else:
-        target_height = 1080 if height > 1080 else height
-        if target_height < height:
-            filters.append(f"scale=-2:{target_height}")
-        video_opts = ["-c:v", "libx264", "-crf", "23", "-preset", "medium"]
-        audio_opts = ["-c:a", "aac", "-b:a", "128k"]
-
-    if filters:
-        cmd += ["-vf", ",".join(filters)]
-
-    cmd += (
-        video_opts
-        + audio_opts
-        + ["-movflags", "+faststart", "-progress", "pipe:1", "-nostats", "-v", "error", output_path]
+    probe: dict,
+    settings,
+    on_progress,
+    threads: int | None,
+    abort: threading.Event | None,
+    preset: str | None,
+    video_bitrate: int | None,
+) -> dict:
+    segments = plan_segments(input_path, probe, settings)
+    if len(segments) > 1:
+        logger.info(f"job_chunked segments={len(segments)}", extra={"job_id": job_id})
+        encode_chunked(
+            input_path,
+            output_path,
+            profile,
+            probe,
+            segments,
+            settings,
+            on_progress,
+            threads=threads,
+            abort=abort,
+            preset=preset,
+            video_bitrate=video_bitrate,
+        )
+        return {}
+    cmd = build_ffmpeg_cmd(
+        input_path,
+        output_path,
+        profile,
+        probe["width"],
+        probe["height"],
+        threads=threads,
+        preset=preset,
+        video_bitrate=video_bitrate,
     )
-    return cmd
+    return run_ffmpeg(cmd, probe["duration"], on_progress, abort)
 
 
-def run_ffmpeg(cmd: list[str], duration: float, on_progress) -> None:
-    last_percent = -1
-    last_update = 0.0
-    proc = subprocess.Popen(
-        cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1
+def pick_preset(settings, job_id: str) -> str:
+    queue_depth, oldest_wait = queue_stats(settings.sqlite_path)
+    preset = choose_preset(
+        settings.encoder_presets,
+        settings.preset_queue_depths,
+        settings.preset_wait_seconds,
+        queue_depth,
+        oldest_wait,
     )
-    if not proc.stdout:
-        raise RuntimeError("Failed to capture ffmpeg progress")
-
-    for line in proc.stdout:
-        line = line.strip()
-        if "=" not in line:
-            continue
-        key, value = line.split("=", 1)
-        out_time = None
-        if key == "out_time_ms":
-            try:
-                out_time = int(value) / 1_000_000.0
-            except ValueError:
-                out_time = None
-        elif key == "out_time":
-            out_time = parse_timecode(value)
-        elif key == "progress" and value == "end":
-            out_time = duration
-
-        if out_time is not None and duration > 0:
-            percent = min(100, int((out_time / duration) * 100))
-            now = time.monotonic()
-            if percent != last_percent and now - last_update > 0.5:
-                on_progress(percent)
-                last_percent = percent
-                last_update = now
-
-    return_code = proc.wait()
-    if return_code != 0:
-        raise RuntimeError("ffmpeg failed")
-
-
-def notify_telegram(job: dict, settings, output_path: str, output_bytes: int) -> None:
-    if not settings.telegram_bot_token:
-        return
-    if not job.get("chat_id"):
-        return
+    logger.info(
+        f"job_preset preset={preset} queue_depth={queue_depth} oldest_wait={int(oldest_wait)}",
+        extra={"job_id": job_id},
+    )
+    return preset
 
-    async def _send() -> None:
-        bot = Bot(token=settings.telegram_bot_token)
-        if output_bytes <= settings.max_telegram_send_mb * 1024 * 1024:
-            try:
-                with open(output_path, "rb") as handle:
-                    await bot.send_video(
-                        chat_id=job["chat_id"],
-                        video=handle,
-                        supports_streaming=True,
-                        caption=f"Job {job['id']} complete.",
-                    )
-                return
-            except Exception:
-                logger.warning("telegram_send_failed", extra={"job_id": job["id"]})
-
-        download_url = build_download_url(
-            settings.base_url, job["id"], job["download_token"]
+
+def encode_job(
+    job: dict,
+    input_path: str,
+    output_path: str,
+    probe: dict,
+    settings,
+    on_progress,
+    get_preset: Callable[[], str | None],
+    threads: int | None = None,
+    abort: threading.Event | None = None,
+) -> tuple[str, str | None, dict]:
+    job_id = job["id"]
+    duration = probe["duration"]
+    profile = job.get("profile", "balanced")
+    target_bytes = job_target_bytes(job, settings)
+    video_bitrate = None
+    if target_bytes:
+        mode = "encode"
+        video_bitrate = fit_video_bitrate(duration, target_bytes)
+    else:
+        mode = choose_encode_mode(probe, profile)
+    logger.info(
+        f"job_encode_mode mode={mode} video_codec={probe.get('video_codec')} "
+        f"video_bitrate={probe.get('video_bitrate')} audio_codec={probe.get('audio_codec')}",
+        extra={"job_id": job_id},
+    )
+
+    if mode != "encode":
+        cmd = build_copy_cmd(input_path, output_path, profile, copy_audio=mode == "remux")
+        stats = run_ffmpeg(cmd, duration, on_progress, abort)
+        return mode, None, stats
+
+    preset = get_preset()
+    for attempt in range(2):
+        stats = _encode(
+            job_id,
+            input_path,
+            output_path,
+            profile,
+            probe,
+            settings,
+            on_progress,
+            threads,
+            abort,
+            preset,
+            video_bitrate,
         )
-        try:
-            await bot.send_message(
-                chat_id=job["chat_id"],
-                text=f"Your video is ready: {download_url}",
-            )
-        except Exception:
-            logger.warning("telegram_link_failed", extra={"job_id": job["id"]})
+        output_bytes = os.path.getsize(output_path)
+        if not target_bytes or output_bytes <= target_bytes or attempt:
+            break
+        video_bitrate = int(video_bitrate * target_bytes / output_bytes * 0.95)
+        logger.warning(
+            f"job_fit_overshoot bytes={output_bytes} target={target_bytes} "
+            f"retry_bitrate={video_bitrate}",
+            extra={"job_id": job_id},
+        )
+    return mode, preset, stats
 
-    try:
-        asyncio.run(_send())
-    except Exception:
-        logger.warning("telegram_notify_exception", extra={"job_id": job["id"]})
+
+def encode_ladder(
+    job: dict,
+    input_path: str,
+    outputs: dict[str, str],
+    probe: dict,
+    settings,
+    on_progress,
+    get_preset: Callable[[], str | None],
+    threads: int | None = None,
+    abort: threading.Event | None = None,
+) -> tuple[str, str | None, dict]:
+    preset = get_preset()
+    logger.info(f"job_ladder profiles={','.join(outputs)}", extra={"job_id": job["id"]})
+    cmd = build_ladder_cmd(
+        input_path,
+        list(outputs.items()),
+        probe["height"],
+        threads=threads,
+        preset=preset,
+    )
+    return "encode", preset, run_ffmpeg(cmd, probe["duration"], on_progress, abort)
 
 
-def process_job(job: dict, settings) -> None:
+def process_job(
+    job: dict,
+    settings,
+    threads: int | None = None,
+    abort: threading.Event | None = None,
+) -> None:
     job_id = job["id"]
     input_path = job["input_path"]
     output_dir = Path(settings.storage_path) / "outputs"
     ensure_dir(output_dir)
+    ensure_dir(settings.progress_path)
 
     if not os.path.exists(input_path):
-        update_job(
+        update_owned_job(
             settings.sqlite_path,
             job_id,
+            job.get("worker_id") or "local",
             status="error",
             error_message="Input file missing",
         )
         return
 
-    output_path = str(output_dir / f"{job_id}.mp4")
+    outputs = job_output_paths(output_dir, job)
+    output_path = next(iter(outputs.values()))
+    profile = metrics_profile(job)
+    requeued = False
+    status = "error"
+    values = None
+    WORKER_METRICS.start(job_id, profile)
 
     try:
-        probe = run_ffprobe(input_path)
+        cached_duration = restore_job_outputs(job, settings, outputs)
+        if cached_duration is not None:
+            sizes = measure_outputs(outputs)
+            if len(sizes) > 1:
+                save_job_outputs(settings.sqlite_path, job_id, sizes)
+            finished = update_owned_job(
+                settings.sqlite_path,
+                job_id,
+                job.get("worker_id") or "local",
+                status="done",
+                output_path=output_path,
+                output_bytes=sizes[0]["output_bytes"],
+                duration_seconds=cached_duration,
+                progress=100,
+            )
+            if not finished:
+                raise JobAborted("job no longer owned")
+            logger.info("job_cache_hit", extra={"job_id": job_id})
+            status = "cached"
+            _record_metrics(job, settings, {"queue_wait_seconds": queue_wait_seconds(job)})
+            queue_job_delivery(job, settings, sizes[0]["output_bytes"])
+            return
+
+        if job.get("probe_json"):
+            probe = json.loads(job["probe_json"])
+        else:
+            probe = run_ffprobe(input_path)
         duration = probe["duration"]
         if duration <= 0:
             raise RuntimeError("Unable to determine duration")
         if duration > settings.max_duration_seconds:
-            update_job(
+            failed = update_owned_job(
                 settings.sqlite_path,
                 job_id,
+                job.get("worker_id") or "local",
                 status="error",
                 error_message="Duration exceeds limit",
                 duration_seconds=int(duration),
             )
+            if not failed:
+                raise JobAborted("job no longer owned")
             return
 
-        cmd = build_ffmpeg_cmd(
-            input_path,
-            output_path,
-            job.get("profile", "balanced"),
-            probe["width"],
-            probe["height"],
-        )
-
-        def _progress(percent: int) -> None:
-            update_job(settings.sqlite_path, job_id, progress=percent)
+        def _progress(percent: int, stats: dict) -> None:
+            WORKER_METRICS.update(job_id, stats)
+            speed = stats.get("speed") or 0.0
+            eta_seconds = None
+            if speed > 0:
+                eta_seconds = int(duration * (100 - percent) / 100 / speed)
+            publish_progress(
+                settings.progress_path,
+                job_id,
+                percent=percent,
+                fps=stats.get("fps") or 0.0,
+                speed=speed,
+                eta_seconds=eta_seconds,
+            )
 
-        run_ffmpeg(cmd, duration, _progress)
+        encode_started = time.monotonic()
+        if len(outputs) > 1:
+            mode, preset, stats = encode_ladder(
+                job,
+                input_path,
+                outputs,
+                probe,
+                settings,
+                _progress,
+                lambda: pick_preset(settings, job_id),
+                threads=threads,
+                abort=abort,
+            )
+        else:
+            mode, preset, stats = encode_job(
+                job,
+                input_path,
+                output_path,
+                probe,
+                settings,
+                _progress,
+                lambda: pick_preset(settings, job_id),
+                threads=threads,
+                abort=abort,
+            )
+        encode_elapsed = time.monotonic() - encode_started
 
-        output_bytes = os.path.getsize(output_path)
-        update_job(
+        sizes = measure_outputs(outputs)
+        if len(sizes) > 1:
+            save_job_outputs(settings.sqlite_path, job_id, sizes)
+        output_bytes = sizes[0]["output_bytes"]
+        finished = update_owned_job(
             settings.sqlite_path,
             job_id,
+            job.get("worker_id") or "local",
             status="done",
             output_path=output_path,
             output_bytes=output_bytes,
             duration_seconds=int(duration),
             progress=100,
+            encode_mode=mode,
+            encoder_preset=preset,
         )
-
-        if job.get("source") == "telegram":
-            notify_telegram(job, settings, output_path, output_bytes)
+        if not finished:
+            raise JobAborted("job no longer owned")
+        status = "done"
+        values = {
+            "queue_wait_seconds": queue_wait_seconds(job),
+            "probe_seconds": probe.get("probe_seconds"),
+            **encode_metrics(
+                duration,
+                encode_elapsed,
+                stats,
+                sum(size["output_bytes"] for size in sizes),
+            ),
+        }
+        _record_metrics(job, settings, values)
+        _store_cached_output(job, settings, sizes, int(duration))
+
+        queue_job_delivery(job, settings, output_bytes)
+
+    except JobAborted:
+        _remove_outputs(outputs)
+        if release_job(settings.sqlite_path, job_id, job.get("worker_id") or "local"):
+            requeued = True
+            status = "requeued"
+            ring(settings.doorbell_path)
+            logger.warning("job_requeued", extra={"job_id": job_id})
+        elif (get_job(settings.sqlite_path, job_id) or {}).get("status") == "cancelled":
+            status = "cancelled"
+            logger.info("job_cancelled", extra={"job_id": job_id})
+        else:
+            # Another worker may own the job now, so its input stays.
+            requeued = True
+            status = "lost"
+            logger.warning("job_lease_lost", extra={"job_id": job_id})
 
     except Exception as exc:
-        if os.path.exists(output_path):
-            try:
-                os.remove(output_path)
-            except OSError:
-                pass
-        update_job(
+        _remove_outputs(outputs)
+        update_owned_job(
             settings.sqlite_path,
             job_id,
+            job.get("worker_id") or "local",
             status="error",
             error_message=str(exc),
         )
         logger.exception("job_failed", extra={"job_id": job_id})
 
+    finally:
+        WORKER_METRICS.finish(job_id, profile, status, values)
+        clear_progress(settings.progress_path, job_id)
+        if settings.delete_inputs_on_completion and job["input_owned"] and not requeued:
+            _remove_file(input_path)
+
+
+def run_worker(settings, handler, queue=None) -> None:
+    stop = threading.Event()
+    abort = threading.Event()
+
+    def _shutdown(signum, frame) -> None:
+        if stop.is_set():
+            logger.warning("worker_abort_requested")
+            abort.set()
+            return
+        logger.info("worker_stopping")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, _shutdown)
+    signal.signal(signal.SIGINT, _shutdown)
+
+    plan = plan_slots(
+        settings.worker_slots,
+        settings.worker_cpu_budget,
+        settings.worker_cpu_affinity,
+    )
+    metrics_server = start_metrics_server(settings)
+    logger.info("worker_started")
+    try:
+        run_slots(plan, settings, handler, stop, abort, queue)
+    finally:
+        if metrics_server is not None:
+            metrics_server.shutdown()
+    logger.info("worker_stopped")
+
 
 def main() -> None:
     settings = load_settings()
     setup_logging()
     ensure_dir(Path(settings.storage_path) / "uploads")
     ensure_dir(Path(settings.storage_path) / "outputs")
-
-    logger.info("worker_started")
-
-    while True:
-        job = lock_next_job(settings.sqlite_path)
-        if not job:
-            time.sleep(1)
-            continue
-        logger.info("job_locked", extra={"job_id": job["id"]})
-        process_job(job, settings)
+    run_worker(settings, process_job)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,135 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.metrics import PREFIX, Histogram, render_histograms, render_metric
+
+logger = logging.getLogger("worker")
+
+LIVE_GAUGES = {
+    "fps": "Frames per second of the running encode",
+    "speed": "Realtime factor of the running encode",
+    "bitrate_kbps": "Output bitrate of the running encode",
+    "total_size": "Bytes written by the running encode",
+}
+
+
+def encode_metrics(
+    duration: float, elapsed: float, stats: dict, output_bytes: int
+) -> dict:
+    elapsed = max(elapsed, 0.001)
+    return {
+        "encode_seconds": round(elapsed, 3),
+        "encode_speed": round(duration / elapsed, 3),
+        "encode_fps": stats.get("fps") or None,
+        "encode_bitrate_kbps": stats.get("bitrate_kbps")
+        or round(output_bytes * 8 / max(duration, 0.001) / 1000, 1),
+        "output_total_size": stats.get("total_size") or output_bytes,
+    }
+
+
+class WorkerMetrics:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._active: dict[str, dict] = {}
+        self._jobs: dict[tuple[str, str], int] = {}
+        self._histograms = {
+            name: Histogram(name) for name in ("encode_seconds", "encode_speed")
+        }
+
+    def start(self, job_id: str, profile: str) -> None:
+        with self._lock:
+            self._active[job_id] = {
+                "slot": threading.current_thread().name,
+                "profile": profile,
+                "stats": {},
+            }
+
+    def update(self, job_id: str, stats: dict) -> None:
+        with self._lock:
+            active = self._active.get(job_id)
+            if active is not None:
+                active["stats"] = stats
+
+    def finish(
+        self, job_id: str, profile: str, status: str, values: dict | None = None
+    ) -> None:
+        with self._lock:
+            self._active.pop(job_id, None)
+            key = (profile, status)
+            self._jobs[key] = self._jobs.get(key, 0) + 1
+        for name, histogram in self._histograms.items():
+            if values and values.get(name) is not None:
+                histogram.observe(profile, values[name])
+
+    def render(self, slots: int) -> str:
+        with self._lock:
+            active = [dict(entry) for entry in self._active.values()]
+            jobs = dict(self._jobs)
+        lines = render_metric(
+            f"{PREFIX}_worker_slots", "gauge", "Encode slots in this worker", [({}, slots)]
+        )
+        lines += render_metric(
+            f"{PREFIX}_worker_busy_slots",
+            "gauge",
+            "Encode slots running a job",
+            [({}, len(active))],
+        )
+        for key, help_text in LIVE_GAUGES.items():
+            lines += render_metric(
+                f"{PREFIX}_worker_current_{key}",
+                "gauge",
+                help_text,
+                [
+                    (
+                        {"slot": entry["slot"], "profile": entry["profile"]},
+                        entry["stats"].get(key) or 0,
+                    )
+                    for entry in active
+                ],
+            )
+        lines += render_metric(
+            f"{PREFIX}_worker_jobs_total",
+            "counter",
+            "Jobs finished by this worker",
+            [
+                ({"profile": profile, "status": status}, count)
+                for (profile, status), count in sorted(jobs.items())
+            ],
+        )
+        rows = [row for histogram in self._histograms.values() for row in histogram.rows()]
+        lines += render_histograms(rows, prefix=f"{PREFIX}_worker")
+        return "\n".join(lines) + "\n"
+
+
+WORKER_METRICS = WorkerMetrics()
+
+
+def start_metrics_server(
+    settings, metrics: WorkerMetrics = WORKER_METRICS
+) -> ThreadingHTTPServer | None:
+    if not settings.worker_metrics_port:
+        return None
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render(settings.worker_slots).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(
+        (settings.worker_metrics_host, settings.worker_metrics_port), Handler
+    )
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"metrics_listening port={server.server_address[1]}")
+    return server
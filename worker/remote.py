@@ -0,0 +1,266 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from app.config import load_settings
+from app.jobs import job_output_paths, measure_outputs, metrics_profile
+from app.logging import setup_logging
+from app.utils import ensure_dir
+from worker.ffmpeg import JobAborted
+from worker.main import encode_job, encode_ladder, run_worker
+from worker.metrics import WORKER_METRICS, encode_metrics
+
+logger = logging.getLogger("worker")
+
+CHUNK_SIZE = 1024 * 1024
+COMPLETE_RETRY_SECONDS = 1.0
+COMPLETE_RETRY_MAX_SECONDS = 30.0
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+class RemoteQueue:
+    def __init__(self, settings, client: httpx.Client | None = None) -> None:
+        self.settings = settings
+        self.client = client or httpx.Client(
+            base_url=settings.worker_api_url,
+            headers={"Authorization": f"Bearer {settings.worker_api_token}"},
+            timeout=httpx.Timeout(30.0, read=300.0, write=300.0),
+        )
+        self.work_dir = Path(settings.storage_path) / "remote"
+        self._progress: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def claim(self, worker_id: str) -> dict | None:
+        response = self.client.post("/api/worker/claim", json={"worker_id": worker_id})
+        if response.status_code == 204:
+            return None
+        response.raise_for_status()
+        claimed = response.json()
+        return {
+            **claimed["job"],
+            "worker_id": worker_id,
+            "probe": claimed["probe"],
+            "encoder_preset": claimed["encoder_preset"],
+        }
+
+    def renew(self, job: dict, worker_id: str) -> bool:
+        with self._lock:
+            progress = self._progress.get(job["id"])
+        response = self.client.post(
+            f"/api/worker/jobs/{job['id']}/heartbeat",
+            json={"worker_id": worker_id, "progress": progress},
+        )
+        if response.status_code == 409:
+            return False
+        response.raise_for_status()
+        return True
+
+    def owns(self, job: dict, worker_id: str) -> bool:
+        # Only heartbeats reach the server; a cancelled job fails its next one.
+        return True
+
+    def announce(self, worker_id: str, slots: int) -> None:
+        response = self.client.post(
+            "/api/worker/announce", json={"worker_id": worker_id, "slots": slots}
+        )
+        response.raise_for_status()
+
+    def reap(self) -> None:
+        # Leases are reaped by the web API, which owns the database.
+        pass
+
+    def _download(self, job: dict, path: Path, abort: threading.Event | None) -> None:
+        with self.client.stream(
+            "GET",
+            f"/api/worker/jobs/{job['id']}/input",
+            params={"worker_id": job["worker_id"]},
+        ) as response:
+            if response.status_code == 409:
+                raise LeaseLost("Lease lost")
+            response.raise_for_status()
+            with open(path, "wb") as handle:
+                for chunk in response.iter_bytes(CHUNK_SIZE):
+                    if abort is not None and abort.is_set():
+                        raise JobAborted("download aborted")
+                    handle.write(chunk)
+
+    def _upload(self, job: dict, path: str, profile: str | None = None) -> None:
+        def _chunks():
+            with open(path, "rb") as handle:
+                while chunk := handle.read(CHUNK_SIZE):
+                    yield chunk
+
+        params = {"worker_id": job["worker_id"]}
+        if profile:
+            params["profile"] = profile
+        response = self.client.put(
+            f"/api/worker/jobs/{job['id']}/output", params=params, content=_chunks()
+        )
+        if response.status_code == 409:
+            raise LeaseLost("Lease lost")
+        response.raise_for_status()
+
+    def _complete(
+        self,
+        job: dict,
+        status: str,
+        abort: threading.Event | None = None,
+        **fields,
+    ) -> bool:
+        # Transient failures are retried for up to one lease; the lease keeper
+        # goes on renewing meanwhile and sets abort once the lease is lost.
+        stop = abort or threading.Event()
+        deadline = time.monotonic() + self.settings.job_lease_seconds
+        delay = COMPLETE_RETRY_SECONDS
+        while True:
+            try:
+                response = self.client.post(
+                    f"/api/worker/jobs/{job['id']}/complete",
+                    json={"worker_id": job["worker_id"], "status": status, **fields},
+                )
+            except httpx.HTTPError as exc:
+                error = str(exc) or type(exc).__name__
+            else:
+                if response.status_code == 200:
+                    return True
+                if response.status_code < 500 and response.status_code != 429:
+                    logger.warning(
+                        f"job_complete_rejected status={response.status_code}",
+                        extra={"job_id": job["id"]},
+                    )
+                    return False
+                error = f"HTTP {response.status_code}"
+            if time.monotonic() + delay > deadline or stop.wait(delay):
+                logger.warning(
+                    f"job_complete_failed error={error}", extra={"job_id": job["id"]}
+                )
+                return False
+            logger.warning(
+                f"job_complete_retry delay={delay} error={error}",
+                extra={"job_id": job["id"]},
+            )
+            delay = min(delay * 2, COMPLETE_RETRY_MAX_SECONDS)
+
+    def process(
+        self,
+        job: dict,
+        settings,
+        threads: int | None = None,
+        abort: threading.Event | None = None,
+    ) -> None:
+        job_id = job["id"]
+        ensure_dir(self.work_dir)
+        input_path = self.work_dir / f"{job_id}.input"
+        outputs = job_output_paths(self.work_dir, job)
+        duration = job["probe"]["duration"]
+        profile = metrics_profile(job)
+        status = "error"
+        values = None
+        WORKER_METRICS.start(job_id, profile)
+
+        def _progress(percent: int, stats: dict) -> None:
+            WORKER_METRICS.update(job_id, stats)
+            speed = stats.get("speed") or 0.0
+            eta_seconds = None
+            if speed > 0:
+                eta_seconds = int(duration * (100 - percent) / 100 / speed)
+            with self._lock:
+                self._progress[job_id] = {
+                    "percent": percent,
+                    "fps": stats.get("fps") or 0.0,
+                    "speed": speed,
+                    "eta_seconds": eta_seconds,
+                }
+
+        try:
+            self._download(job, input_path, abort)
+            encode_started = time.monotonic()
+            if len(outputs) > 1:
+                mode, preset, stats = encode_ladder(
+                    job,
+                    str(input_path),
+                    outputs,
+                    job["probe"],
+                    settings,
+                    _progress,
+                    lambda: job["encoder_preset"],
+                    threads=threads,
+                    abort=abort,
+                )
+            else:
+                mode, preset, stats = encode_job(
+                    job,
+                    str(input_path),
+                    next(iter(outputs.values())),
+                    job["probe"],
+                    settings,
+                    _progress,
+                    lambda: job["encoder_preset"],
+                    threads=threads,
+                    abort=abort,
+                )
+            sizes = measure_outputs(outputs)
+            values = encode_metrics(
+                duration,
+                time.monotonic() - encode_started,
+                stats,
+                sum(size["output_bytes"] for size in sizes),
+            )
+            for output_profile, output_path in outputs.items():
+                self._upload(
+                    job, output_path, output_profile if len(outputs) > 1 else None
+                )
+            if self._complete(
+                job,
+                "done",
+                abort,
+                encode_mode=mode,
+                encoder_preset=preset,
+                metrics=values,
+            ):
+                status = "done"
+            else:
+                status = "lost"
+                logger.warning("job_lease_lost", extra={"job_id": job_id})
+        except LeaseLost:
+            status = "lost"
+            logger.warning("job_lease_lost", extra={"job_id": job_id})
+        except JobAborted:
+            status = "requeued"
+            self._complete(job, "requeue")
+            logger.warning("job_requeued", extra={"job_id": job_id})
+        except Exception as exc:
+            self._complete(job, "error", error_message=str(exc))
+            logger.exception("job_failed", extra={"job_id": job_id})
+        finally:
+            WORKER_METRICS.finish(job_id, profile, status, values)
+            with self._lock:
+                self._progress.pop(job_id, None)
+            for path in (input_path, *outputs.values()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+
+def main() -> None:
+    settings = load_settings()
+    setup_logging()
+    if not settings.worker_api_url or not settings.worker_api_token:
+        raise RuntimeError("WORKER_API_URL and WORKER_API_TOKEN are required")
+    queue = RemoteQueue(settings)
+    try:
+        run_worker(settings, queue.process, queue)
+    finally:
+        queue.client.close()
+
+
+if __name__ == "__main__":
+    main()
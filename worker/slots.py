@@ -0,0 +1,262 @@
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from app.doorbell import Doorbell, ring
+from app.eta import announce_worker
+from app.jobs import job_owned, lock_next_job, reap_expired_leases, renew_lease
+from app.lifecycle import reap_cancelled_inputs
+from worker.ffmpeg import AnyEvent
+
+logger = logging.getLogger("worker")
+
+POLL_MIN_SECONDS = 0.25
+# How often a running job checks that it was not cancelled or reaped, between
+# lease renewals.
+OWNERSHIP_CHECK_SECONDS = 1.0
+
+
+@dataclass(frozen=True)
+class SlotPlan:
+    index: int
+    threads: int
+    cpus: tuple[int, ...]
+
+
+def plan_slots(
+    slots: int,
+    cpu_budget: int,
+    affinity: bool,
+    available_cpus: list[int] | None = None,
+) -> list[SlotPlan]:
+    slots = max(1, slots)
+    cpu_budget = max(1, cpu_budget)
+    threads = max(1, cpu_budget // slots)
+
+    cpus: list[int] = []
+    if affinity:
+        if available_cpus is None and hasattr(os, "sched_getaffinity"):
+            available_cpus = sorted(os.sched_getaffinity(0))
+        cpus = list(available_cpus or [])[:cpu_budget]
+
+    plans = []
+    for index in range(slots):
+        assigned: tuple[int, ...] = ()
+        if cpus:
+            start = index * threads
+            assigned = tuple(cpus[(start + offset) % len(cpus)] for offset in range(threads))
+            assigned = tuple(sorted(set(assigned)))
+        plans.append(SlotPlan(index=index, threads=threads, cpus=assigned))
+    return plans
+
+
+class LocalQueue:
+    def __init__(self, settings) -> None:
+        self.settings = settings
+
+    def claim(self, worker_id: str) -> dict | None:
+        return lock_next_job(
+            self.settings.sqlite_path, worker_id, self.settings.job_lease_seconds
+        )
+
+    def renew(self, job: dict, worker_id: str) -> bool:
+        return renew_lease(
+            self.settings.sqlite_path,
+            job["id"],
+            worker_id,
+            self.settings.job_lease_seconds,
+        )
+
+    def owns(self, job: dict, worker_id: str) -> bool:
+        return job_owned(self.settings.sqlite_path, job["id"], worker_id)
+
+    def announce(self, worker_id: str, slots: int) -> None:
+        announce_worker(
+            self.settings.sqlite_path,
+            worker_id,
+            slots,
+            self.settings.job_lease_seconds,
+        )
+
+    def reap(self) -> None:
+        reaped = reap_expired_leases(
+            self.settings.sqlite_path, self.settings.job_max_attempts
+        )
+        for job in reaped:
+            logger.warning(
+                f"job_lease_expired status={job['status']} attempts={job['attempts']}",
+                extra={"job_id": job["id"]},
+            )
+        if any(job["status"] == "queued" for job in reaped):
+            ring(self.settings.doorbell_path)
+        reap_cancelled_inputs(
+            self.settings.sqlite_path, self.settings.delete_inputs_on_completion
+        )
+
+
+class LeaseKeeper(threading.Thread):
+    def __init__(self, queue, job: dict, worker_id: str, lease_seconds: float) -> None:
+        super().__init__(name=f"lease-{job['id']}", daemon=True)
+        self.queue = queue
+        self.job = job
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = threading.Event()
+        self.done = threading.Event()
+
+    def run(self) -> None:
+        renew_every = self.lease_seconds / 3
+        renewed_at = time.monotonic()
+        while not self.done.wait(min(OWNERSHIP_CHECK_SECONDS, renew_every)):
+            try:
+                if time.monotonic() - renewed_at >= renew_every:
+                    if not self.queue.renew(self.job, self.worker_id):
+                        break
+                    renewed_at = time.monotonic()
+                elif not self.queue.owns(self.job, self.worker_id):
+                    break
+            except Exception as exc:
+                logger.warning(
+                    f"lease_renew_failed error={exc}", extra={"job_id": self.job["id"]}
+                )
+                if time.monotonic() - renewed_at < self.lease_seconds:
+                    continue
+                break
+        else:
+            return
+        logger.warning("lease_renew_rejected", extra={"job_id": self.job["id"]})
+        self.lost.set()
+
+
+class WorkerSlot(threading.Thread):
+    def __init__(
+        self,
+        plan: SlotPlan,
+        settings,
+        handler: Callable[..., None],
+        stop: threading.Event,
+        abort: threading.Event,
+        queue=None,
+    ) -> None:
+        super().__init__(name=f"slot-{plan.index}", daemon=True)
+        self.plan = plan
+        self.settings = settings
+        self.handler = handler
+        self.stop = stop
+        self.abort = abort
+        self.queue = queue or LocalQueue(settings)
+        self.worker_id = f"{socket.gethostname()}-{os.getpid()}-{plan.index}"
+        self.doorbell: Doorbell | None = None
+        try:
+            self.doorbell = Doorbell(settings.doorbell_path, f"worker-{self.worker_id}")
+        except OSError:
+            logger.warning("doorbell_unavailable")
+
+    def _wait_for_work(self, timeout: float) -> bool:
+        if self.doorbell is None:
+            self.stop.wait(timeout)
+            return False
+        return self.doorbell.wait(timeout)
+
+    def wake(self) -> None:
+        if self.doorbell is not None:
+            self.doorbell.wake()
+
+    def _run_job(self, job: dict) -> None:
+        keeper = LeaseKeeper(
+            self.queue, job, self.worker_id, self.settings.job_lease_seconds
+        )
+        keeper.start()
+        try:
+            self.handler(
+                job,
+                self.settings,
+                threads=self.plan.threads,
+                abort=AnyEvent(self.abort, keeper.lost),
+            )
+        finally:
+            keeper.done.set()
+            keeper.join()
+
+    def run(self) -> None:
+        if self.plan.cpus and hasattr(os, "sched_setaffinity"):
+            # Affinity of the calling thread is inherited by the ffmpeg
+            # processes it spawns.
+            os.sched_setaffinity(0, self.plan.cpus)
+        logger.info(
+            f"slot_started index={self.plan.index} threads={self.plan.threads} "
+            f"cpus={list(self.plan.cpus)}"
+        )
+
+        delay = POLL_MIN_SECONDS
+        while not self.stop.is_set():
+            try:
+                job = self.queue.claim(self.worker_id)
+                if not job:
+                    if self._wait_for_work(delay):
+                        delay = POLL_MIN_SECONDS
+                    else:
+                        delay = min(delay * 2, self.settings.worker_poll_max_seconds)
+                    continue
+                delay = POLL_MIN_SECONDS
+                logger.info("job_locked", extra={"job_id": job["id"]})
+                self._run_job(job)
+            except Exception:
+                logger.exception("slot_error")
+                self.stop.wait(1)
+
+        if self.doorbell is not None:
+            self.doorbell.close()
+        logger.info(f"slot_stopped index={self.plan.index}")
+
+
+def run_slots(
+    plans: list[SlotPlan],
+    settings,
+    handler: Callable[..., None],
+    stop: threading.Event,
+    abort: threading.Event,
+    queue=None,
+) -> None:
+    queue = queue or LocalQueue(settings)
+    slots = [WorkerSlot(plan, settings, handler, stop, abort, queue) for plan in plans]
+    for slot in slots:
+        slot.start()
+
+    # Announced slots let the web API and bot estimate queue wait times.
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    reap_interval = max(1, settings.job_lease_seconds / 2)
+    reaped_at = 0.0
+    while not stop.wait(1):
+        if time.monotonic() - reaped_at < reap_interval:
+            continue
+        reaped_at = time.monotonic()
+        try:
+            queue.announce(worker_id, len(slots))
+        except Exception:
+            logger.exception("worker_announce_failed")
+        try:
+            queue.reap()
+        except Exception:
+            logger.exception("lease_reap_failed")
+    for slot in slots:
+        slot.wake()
+    try:
+        queue.announce(worker_id, 0)
+    except Exception:
+        logger.warning("worker_announce_failed")
+
+    deadline = time.monotonic() + settings.worker_shutdown_grace_seconds
+    while not abort.is_set() and time.monotonic() < deadline:
+        alive = [slot for slot in slots if slot.is_alive()]
+        if not alive:
+            return
+        alive[0].join(1)
+
+    abort.set()
+    for slot in slots:
+        slot.join()